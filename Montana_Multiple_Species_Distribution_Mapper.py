@@ -1,23 +1,55 @@
+import time
+# Reference point for the startup timing report
+STARTUP_T0 = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, StringVar, filedialog, messagebox, Canvas
+import copy
 import os
 from pathlib import Path
-import datetime
 import sys
-import pandas as pd
-import re
-import io
-import zipfile
-import matplotlib as mpl
-import string
-import textwrap
-import matplotlib.text as mtext
-
-def get_screen_geometry():
+import argparse
+import multiprocessing
+import queue
+import threading
+
+# species_map_engine pulls in pandas, NumPy and Matplotlib. It is imported on
+# first use by load_engine() (the startup thread, or the command line) so the
+# splash screen and worker processes do not wait for it.
+engine = None
+
+
+def load_engine():
+    """Import the mapping engine on first use and return it."""
+    global engine
+    if engine is None:
+        import species_map_engine
+        engine = species_map_engine
+    return engine
+
+
+def use_persistent_matplotlib_cache():
+    """
+    Keep Matplotlib's font cache across runs of the frozen executable.
+
+    PyInstaller points MPLCONFIGDIR at a temporary folder that is deleted on
+    exit, so every launch rebuilt the font list. Point it at the cache folder
+    next to the executable instead (MSDM_CACHE_DIR overrides the location).
+    Must run before Matplotlib is imported.
+    """
+    if not getattr(sys, 'frozen', False):
+        return
+    cache_dir = os.environ.get("MSDM_CACHE_DIR") or os.path.join(os.path.dirname(sys.executable), "cache")
+    config_dir = os.path.join(cache_dir, "matplotlib")
+    try:
+        os.makedirs(config_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Warning: Could not create Matplotlib cache folder: {e}")
+        return
+    os.environ["MPLCONFIGDIR"] = config_dir
+
+
+def get_screen_geometry(root):
     """Get the geometry of all available screens"""
-    root = tk.Tk()
-    root.withdraw()  # Hide the temporary window
-    
     # Get primary screen dimensions
     primary_width = root.winfo_screenwidth()
     primary_height = root.winfo_screenheight()
@@ -33,9 +65,56 @@ def get_screen_geometry():
         all_screens_width = primary_width
         all_screens_height = primary_height
     
-    root.destroy()
     return primary_width, primary_height, all_screens_width, all_screens_height
 
+
+class StartupTimer:
+    """
+    Records how long each startup phase takes.
+
+    Phases may run on different threads, so each one keeps its own start
+    offset and duration rather than the time since the previous phase.
+    """
+
+    def __init__(self, t0=STARTUP_T0):
+        self.t0 = t0
+        self.phases = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end=None):
+        """Record a phase that ran from start to end (perf_counter values)."""
+        if end is None:
+            end = time.perf_counter()
+        with self._lock:
+            self.phases.append((name, start - self.t0, end - start, threading.current_thread().name))
+
+    def phase(self, name):
+        """Context manager that records the enclosed block as one phase."""
+        return _TimedPhase(self, name)
+
+    def report(self):
+        """Return the phases, in start order, as a printable table."""
+        lines = ["Startup timing (ms):", f"  {'phase':<30} {'start':>8} {'took':>8}  thread"]
+        for name, start, took, thread in sorted(self.phases, key=lambda p: p[1]):
+            lines.append(f"  {name:<30} {start * 1000:8.0f} {took * 1000:8.0f}  {thread}")
+        lines.append(f"  {'first interactive window':<30} {(time.perf_counter() - self.t0) * 1000:8.0f}")
+        return "\n".join(lines)
+
+
+class _TimedPhase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, self.start)
+        return False
+
+
 class SplashScreen:
     def __init__(self, parent):
         self.root = tk.Toplevel(parent)
@@ -151,6 +230,402 @@ class ToastNotification:
         # Destroy after duration
         toast.after(duration, toast.destroy)
 
+def format_duration(seconds):
+    """Format a duration as e.g. '45 s' or '3 min 20 s'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    return f"{seconds // 60} min {seconds % 60} s"
+
+
+class BackgroundTask:
+    """
+    Runs a long operation on a worker thread behind a progress window.
+
+    work(progress, cancel) runs off the Tk thread. It reports through
+    progress(done, total), which only queues the numbers; the window polls the
+    queue with after() and shows throughput and an ETA. Cancel sets the cancel
+    event, which the engine checks between chunks, species or pages and
+    answers with engine.OperationCancelled. on_success(result), on_error(e)
+    and on_cancel() are then called on the Tk thread. Work that never checks
+    the event is started with cancellable=False, which leaves out the Cancel
+    button and ignores the window's close button.
+
+    An engine.Trace passed as trace is entered around work on the worker
+    thread and saved when work ends, however it ends; on_trace(trace) is
+    then called on the Tk thread before the other callbacks.
+    """
+
+    POLL_MS = 100
+
+    def __init__(self, parent, title, unit, work, on_success, on_error=None, on_cancel=None,
+                 trace=None, on_trace=None, cancellable=True):
+        self.parent = parent
+        self.title = title
+        self.unit = unit
+        self.work = work
+        self.on_success = on_success
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.trace = trace
+        self.on_trace = on_trace
+        self.cancellable = cancellable
+        self.cancel_event = threading.Event()
+        self.updates = queue.Queue()
+        self.started = time.perf_counter()
+        self.build_window()
+        threading.Thread(target=self.run, name=title, daemon=True).start()
+        self.window.after(self.POLL_MS, self.poll)
+
+    def build_window(self):
+        self.window = tk.Toplevel(self.parent)
+        self.window.title(self.title)
+        self.window.transient(self.parent)
+        self.window.resizable(False, False)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel if self.cancellable else lambda: None)
+        
+        frame = ttk.Frame(self.window, padding="20", relief="raised")
+        frame.pack(fill='both', expand=True)
+        
+        self.label = ttk.Label(frame, text=f"{self.title}...\nPlease wait", font=('Helvetica', 10))
+        self.label.pack(pady=10)
+        
+        self.progress = ttk.Progressbar(frame, mode='indeterminate', length=300)
+        self.progress.pack(fill='x', pady=5)
+        self.progress.start(10)
+        
+        self.stats = ttk.Label(frame, text="", font=('Helvetica', 9))
+        self.stats.pack(pady=(0, 10))
+        
+        self.cancel_button = ttk.Button(frame, text="Cancel", command=self.cancel)
+        if self.cancellable:
+            self.cancel_button.pack()
+        
+        # Center on screen
+        self.window.update_idletasks()
+        width = max(self.window.winfo_reqwidth(), 400)
+        height = self.window.winfo_reqheight()
+        x = (self.window.winfo_screenwidth() - width) // 2
+        y = (self.window.winfo_screenheight() - height) // 2
+        self.window.geometry(f"{width}x{height}+{x}+{y}")
+        # Keep a second task from being started meanwhile; X11 refuses a grab
+        # on a window that is not mapped yet
+        self.window.wait_visibility()
+        self.window.grab_set()
+
+    def run(self):
+        try:
+            if self.trace is None:
+                result = self.work(self.report, self.cancel_event)
+            else:
+                try:
+                    with self.trace:
+                        result = self.work(self.report, self.cancel_event)
+                finally:
+                    self.trace.save()
+        except engine.OperationCancelled:
+            self.updates.put(("cancelled", None))
+        except Exception as e:
+            self.updates.put(("error", e))
+        else:
+            self.updates.put(("done", result))
+
+    def report(self, done, total):
+        self.updates.put(("progress", (done, total)))
+
+    def poll(self):
+        """Show the latest progress, or finish once the worker is done."""
+        latest = None
+        while True:
+            try:
+                kind, value = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind != "progress":
+                self.finish(kind, value)
+                return
+            latest = value
+        if latest is not None and not self.cancel_event.is_set():
+            self.show_progress(*latest)
+        self.window.after(self.POLL_MS, self.poll)
+
+    def show_progress(self, done, total):
+        elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if total:
+            if str(self.progress['mode']) != 'determinate':
+                self.progress.stop()
+                self.progress.config(mode='determinate', maximum=total)
+            self.progress['value'] = done
+            text = f"{done:,} of {total:,} {self.unit} • {rate:,.1f} {self.unit}/s"
+            if 0 < done < total and rate > 0:
+                text += f" • about {format_duration((total - done) / rate)} left"
+        else:
+            text = f"{done:,} {self.unit} • {rate:,.1f} {self.unit}/s"
+        self.stats.config(text=text)
+
+    def cancel(self):
+        """Ask the worker to stop at its next check."""
+        self.cancel_event.set()
+        self.cancel_button.config(state='disabled')
+        self.label.config(text="Cancelling...")
+
+    def finish(self, kind, value):
+        self.progress.stop()
+        self.window.grab_release()
+        self.window.destroy()
+        if self.trace is not None and self.on_trace is not None:
+            self.on_trace(self.trace)
+        if kind == "done":
+            self.on_success(value)
+        elif kind == "cancelled":
+            print(f"{self.title} cancelled")
+            if self.on_cancel is not None:
+                self.on_cancel()
+        elif self.on_error is not None:
+            self.on_error(value)
+        else:
+            messagebox.showerror("Error", f"{self.title} failed:\n{str(value)}\n\nPlease try again.")
+
+
+class MapGallery:
+    """
+    Continuously scrolling grid of map previews that only draws what is near the view.
+
+    The canvas's scroll region spans every map, but image items (slots)
+    exist only for the rows on screen plus OVERSCAN_ROWS above and below.
+    As the view scrolls, slots whose map has left that band are moved to a
+    map that has entered it and their Tk image is overwritten in place, so
+    thousands of maps cost the same items and memory as one screenful and
+    nothing is rebuilt. The scroll region ends one screen below the top of
+    the last row, so every row, the last one included, can be scrolled to
+    the top. Images come from render(indices, size), which returns
+    one PIL image per map index; they are filled in on idle, batch_size()
+    maps per tick (None: all), so scrolling stays responsive while previews
+    are rendered. on_view_change(first, last) gets the range of maps on screen.
+
+    When the preview size changes, each map on screen is first shown as a
+    resized copy of its current image. With redraw_on_resize the map is then
+    rendered again at the new size; without it (vector previews, a full
+    figure render each) the copy stays until the map next scrolls into view.
+    """
+
+    COLS = 3
+    PAD = 8
+    MARGIN = 40
+    OVERSCAN_ROWS = 1
+
+    def __init__(self, parent, render, batch_size=None, on_view_change=None, redraw_on_resize=True):
+        self.render = render
+        self.batch_size = batch_size
+        self.on_view_change = on_view_change
+        self.redraw_on_resize = redraw_on_resize
+        self.count = 0
+        self.size = None
+        self.slots = []
+        # PIL image shown for each map on screen, and those of the previous
+        # preview size while a re-layout moves them to new slots
+        self.images = {}
+        self.stand_ins = {}
+        self.pending = set()
+        self.fill_job = None
+        self.update_job = None
+        self.placeholder = None
+
+        frame = ttk.Frame(parent)
+        frame.pack(fill='both', expand=True)
+        self.canvas = tk.Canvas(frame, borderwidth=0, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        frame.grid_rowconfigure(0, weight=1)
+        frame.grid_columnconfigure(0, weight=1)
+        self.empty_text = self.canvas.create_text(
+            20, 20, anchor='nw', text="No maps to display. Please generate maps first.",
+            font=('Helvetica', 12), fill='gray')
+        self.canvas.bind("<Configure>", self.on_configure)
+        # Wheel scrolling over the gallery must not also scroll the control panel
+        self.canvas.bind("<MouseWheel>", self.on_mousewheel)
+
+    def on_configure(self, event):
+        self.update_scrollregion()
+        self.schedule_update()
+
+    def on_mousewheel(self, event):
+        self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        return "break"
+
+    def size_for_width(self, width):
+        """Return the (width, height) of a preview for a canvas width."""
+        width = max(width, 600)
+        img_width = (width - self.MARGIN * 2) // self.COLS
+        return (img_width, int(img_width * 0.75))
+
+    @property
+    def cell(self):
+        return (self.size[0] + 2 * self.PAD, self.size[1] + 2 * self.PAD)
+
+    @property
+    def rows(self):
+        return (self.count + self.COLS - 1) // self.COLS
+
+    @property
+    def scroll_height(self):
+        cell_height = self.cell[1]
+        return self.rows * cell_height + max(0, self.canvas.winfo_height() - cell_height)
+
+    def update_scrollregion(self):
+        """Size the scroll region to the grid, padded so the last row can reach the top of the view."""
+        if self.size:
+            self.canvas.configure(scrollregion=(0, 0, self.cell[0] * self.COLS + self.PAD, self.scroll_height))
+
+    def set_count(self, count):
+        """Show maps 0..count-1 from the top, dropping every image on screen."""
+        self.count = count
+        self.canvas.itemconfigure(self.empty_text, state='normal' if count == 0 else 'hidden')
+        self.relayout(force=True)
+        self.canvas.yview_moveto(0)
+        self.schedule_update()
+
+    def refresh(self):
+        """Fetch the images of the maps on screen again, e.g. after a restyle."""
+        self.pending.update(slot[3] for slot in self.slots if slot[3] is not None)
+        self.schedule_fill()
+
+    def relayout(self, force=False):
+        """Fit the grid to the canvas width; slots are recreated only if the preview size changed."""
+        size = self.size_for_width(self.canvas.winfo_width())
+        if size == self.size and not force:
+            return
+        first = self.first_visible() if self.size else 0
+        for image_item, border_item, _, _ in self.slots:
+            self.canvas.delete(image_item, border_item)
+        self.slots = []
+        self.stand_ins = {} if force else self.images
+        self.images = {}
+        self.pending.clear()
+        self.size = size
+        import PIL.Image
+        self.placeholder = PIL.Image.new("RGB", size, "white")
+        self.update_scrollregion()
+        if first and not force:
+            self.scroll_to(first)
+        self.schedule_update()
+
+    def first_visible(self):
+        """Return the index of the first map in the top row on screen."""
+        if not self.size or not self.count:
+            return 0
+        row = int(self.canvas.canvasy(0) // self.cell[1])
+        return min(row * self.COLS, self.count - 1)
+
+    def scroll_to(self, index):
+        """Scroll so the row holding map index is at the top."""
+        if not self.count:
+            return
+        self.canvas.yview_moveto((index // self.COLS) * self.cell[1] / max(1, self.scroll_height))
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_update()
+
+    def schedule_update(self):
+        if self.update_job is None:
+            self.update_job = self.canvas.after_idle(self.update_slots)
+
+    def update_slots(self):
+        """Move slots to the maps that entered the band around the view."""
+        self.update_job = None
+        if not self.size or not self.count:
+            self.hide_slots()
+            return
+        import PIL.Image
+        cell_width, cell_height = self.cell
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // cell_height) - self.OVERSCAN_ROWS)
+        last_row = min(self.rows - 1, int(bottom // cell_height) + self.OVERSCAN_ROWS)
+        wanted = set(range(first_row * self.COLS, min(self.count, (last_row + 1) * self.COLS)))
+        shown = {slot[3] for slot in self.slots}
+        for index in shown - wanted:
+            self.images.pop(index, None)
+        free = [i for i, slot in enumerate(self.slots) if slot[3] not in wanted]
+        for index in sorted(wanted - shown):
+            if free:
+                slot_number = free.pop()
+            else:
+                slot_number = len(self.slots)
+                self.slots.append(self.new_slot())
+            image_item, border_item, photo, _ = self.slots[slot_number]
+            row, col = divmod(index, self.COLS)
+            x = col * cell_width + self.PAD
+            y = row * cell_height + self.PAD
+            self.canvas.coords(image_item, x, y)
+            self.canvas.coords(border_item, x - 1, y - 1, x + self.size[0], y + self.size[1])
+            self.canvas.itemconfigure(image_item, state='normal')
+            self.canvas.itemconfigure(border_item, state='normal')
+            self.slots[slot_number] = (image_item, border_item, photo, index)
+            stand_in = self.stand_ins.get(index)
+            if stand_in is None:
+                photo.paste(self.placeholder)
+                self.pending.add(index)
+                continue
+            stand_in = stand_in.resize(self.size, PIL.Image.Resampling.LANCZOS)
+            photo.paste(stand_in)
+            self.images[index] = stand_in
+            if self.redraw_on_resize:
+                self.pending.add(index)
+        self.stand_ins = {}
+        for slot_number in free:
+            image_item, border_item, photo, _ = self.slots[slot_number]
+            self.canvas.itemconfigure(image_item, state='hidden')
+            self.canvas.itemconfigure(border_item, state='hidden')
+            self.slots[slot_number] = (image_item, border_item, photo, None)
+        self.pending &= wanted
+        self.schedule_fill()
+        if self.on_view_change is not None:
+            visible_first = min(self.count - 1, int(top // cell_height) * self.COLS)
+            visible_last = min(self.count - 1, (int(bottom // cell_height) + 1) * self.COLS - 1)
+            self.on_view_change(visible_first, visible_last)
+
+    def hide_slots(self):
+        for image_item, border_item, _, _ in self.slots:
+            self.canvas.itemconfigure(image_item, state='hidden')
+            self.canvas.itemconfigure(border_item, state='hidden')
+        self.slots = [(image_item, border_item, photo, None) for image_item, border_item, photo, _ in self.slots]
+        self.images.clear()
+        self.pending.clear()
+
+    def new_slot(self):
+        import PIL.ImageTk
+        photo = PIL.ImageTk.PhotoImage("RGB", self.size)
+        border_item = self.canvas.create_rectangle(0, 0, 0, 0, outline='#b0b0b0')
+        image_item = self.canvas.create_image(0, 0, anchor='nw', image=photo)
+        return (image_item, border_item, photo, None)
+
+    def schedule_fill(self):
+        if self.pending and self.fill_job is None:
+            self.fill_job = self.canvas.after(1, self.fill)
+
+    def fill(self):
+        """Give the next batch of slots on screen their images."""
+        self.fill_job = None
+        waiting = sorted((slot[3], slot) for slot in self.slots if slot[3] in self.pending)
+        batch_size = self.batch_size() if self.batch_size else None
+        if batch_size:
+            waiting = waiting[:batch_size]
+        if not waiting:
+            self.pending.clear()
+            return
+        images = self.render([index for index, _ in waiting], self.size)
+        for (index, slot), img in zip(waiting, images):
+            slot[2].paste(img)
+            self.images[index] = img
+            self.pending.discard(index)
+        self.schedule_fill()
+
+
 class MainApplication:
     def __init__(self):
         # Set Windows taskbar icon early (before creating the root window)
@@ -176,13 +651,15 @@ class MainApplication:
                 print(f"Warning: Could not set taskbar icon: {e}")
         
         # Create and hide the root window
-        self.root = tk.Tk()
+        self.startup_timer = StartupTimer()
+        with self.startup_timer.phase("Tk root window"):
+            self.root = tk.Tk()
         
         # Set the application icon
         self.set_windows_icon(self.root)
         
         # Get screen information
-        self.primary_width, self.primary_height, self.all_screens_width, self.all_screens_height = get_screen_geometry()
+        self.primary_width, self.primary_height, self.all_screens_width, self.all_screens_height = get_screen_geometry(self.root)
         
         # Allow the window to be moved to any screen
         self.root.attributes('-alpha', 1.0)  # Ensure window is visible
@@ -193,65 +670,72 @@ class MainApplication:
         
         # Initialize variables
         self.gdf = None
+        self.county_template = None
         self.pd = None
-        self.gpd = None
-        self.plt = None
-        self.FigureCanvasTkAgg = None
+        self.mpl = None
         
         # Show splash screen
-        self.splash = SplashScreen(self.root)
+        with self.startup_timer.phase("splash screen"):
+            self.splash = SplashScreen(self.root)
         
-        # Start loading sequence
-        self.root.after(100, self.load_step_1)
+        # Load everything else in the background; the splash polls for progress
+        self.load_queue = queue.Queue()
+        threading.Thread(target=self.load_in_background, name="startup", daemon=True).start()
+        self.root.after(50, self.poll_loading)
         
         # Start the event loop
         self.root.mainloop()
     
-    def load_step_1(self):
-        """Load pandas"""
-        try:
-            self.splash.update_status("From Billings to Bozeman...")
-            import pandas as pd
-            self.pd = pd
-            self.root.after(100, self.load_step_2)
-        except Exception as e:
-            self.show_error(f"Error loading pandas: {str(e)}")
+    def import_pandas(self):
+        import pandas as pd
+        self.pd = pd
     
-    def load_step_2(self):
-        """Load geopandas"""
-        try:
-            self.splash.update_status("Spanning the Big Sky Country...")
-            import geopandas as gpd
-            self.gpd = gpd
-            self.root.after(100, self.load_step_3)
-        except Exception as e:
-            self.show_error(f"Error loading geopandas: {str(e)}")
+    def import_matplotlib(self):
+        use_persistent_matplotlib_cache()
+        import matplotlib as mpl
+        self.mpl = mpl
     
-    def load_step_3(self):
-        """Load matplotlib"""
-        try:
-            self.splash.update_status("Mapping Montana's vast landscapes...")
-            import matplotlib.pyplot as plt
-            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-            self.plt = plt
-            self.FigureCanvasTkAgg = FigureCanvasTkAgg
-            self.root.after(100, self.load_step_4)
-        except Exception as e:
-            self.show_error(f"Error loading matplotlib: {str(e)}")
+    def load_in_background(self):
+        """Import pandas, Matplotlib and the engine and load the counties off the Tk thread."""
+        steps = [
+            ("From Billings to Bozeman...", "pandas", self.import_pandas),
+            ("Spanning the Big Sky Country...", "matplotlib", self.import_matplotlib),
+            ("Mapping Montana's vast landscapes...", "the mapping engine", load_engine),
+            ("Connecting all 56 counties...", "shapefile", self.load_shapefile),
+        ]
+        for status, what, step in steps:
+            self.load_queue.put(("status", status))
+            try:
+                with self.startup_timer.phase(f"load {what}"):
+                    step()
+            except Exception as e:
+                self.load_queue.put(("error", f"Error loading {what}: {str(e)}"))
+                return
+        self.load_queue.put(("done", None))
     
-    def load_step_4(self):
-        """Load shapefile"""
+    def poll_loading(self):
+        """Show background loading progress on the splash until it finishes."""
         try:
-            self.splash.update_status("Connecting all 56 counties...")
-            self.load_shapefile()
-            self.root.after(100, self.show_analysis_screen)
-        except Exception as e:
-            self.show_error(f"Error loading shapefile: {str(e)}")
+            while True:
+                kind, value = self.load_queue.get_nowait()
+                if kind == "status":
+                    self.splash.update_status(value)
+                elif kind == "error":
+                    self.show_error(value)
+                    return
+                else:
+                    self.show_analysis_screen()
+                    return
+        except queue.Empty:
+            self.root.after(50, self.poll_loading)
     
     def show_analysis_screen(self):
         """Show the analysis screen after splash"""
         self.splash.destroy()
-        AnalysisScreen(self.root, self)
+        with self.startup_timer.phase("analysis screen"):
+            AnalysisScreen(self.root, self)
+            self.root.update_idletasks()
+        print(self.startup_timer.report())
     
     def show_error(self, message):
         """Show error message and exit"""
@@ -320,28 +804,9 @@ class MainApplication:
                 print(f"MEIPASS directory: {sys._MEIPASS}")
 
     def load_shapefile(self):
-        try:
-            # Get the application's base directory
-            if getattr(sys, 'frozen', False):
-                base_dir = sys._MEIPASS
-            else:
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-            
-            shapefile_path = os.path.join(base_dir, "MontanaCounties_shp", "County.shp")
-            
-            if not os.path.exists(shapefile_path):
-                raise FileNotFoundError(
-                    f"Shapefile not found at:\n{shapefile_path}\n\n"
-                    "Please ensure the MontanaCounties_shp folder is in the correct location."
-                )
-                
-            self.gdf = self.gpd.read_file(shapefile_path)
-            self.gdf.columns = self.gdf.columns.str.strip()
-            self.gdf["County"] = self.gdf["NAME"].str.strip().str.lower()
-            self.gdf["Color"] = "white"
-            
-        except Exception as e:
-            raise Exception(f"Error loading shapefile:\n{str(e)}\n\nPlease ensure the shapefile is not corrupted and try again.")
+        # Read from the binary geometry cache after the first run, then convert
+        # county geometry to Matplotlib paths once for every map
+        self.gdf, self.county_template = engine.load_county_geometry()
 
 class AnalysisScreen:
     def __init__(self, parent, main_app):
@@ -357,8 +822,6 @@ class AnalysisScreen:
         
         # Get dependencies from main_app
         self.pd = main_app.pd
-        self.plt = main_app.plt
-        self.FigureCanvasTkAgg = main_app.FigureCanvasTkAgg
         
         # Set window icon
         main_app.set_windows_icon(self.root)
@@ -374,10 +837,6 @@ class AnalysisScreen:
         self.root.resizable(True, True)
         self.root.minsize(800, 600)
         
-        # Initialize variables
-        self.map_canvas = None
-        self.current_fig = None
-        
         # Initialize StringVar variables
         self.selected_family = StringVar(self.root)
         self.selected_genus = StringVar(self.root)
@@ -395,18 +854,42 @@ class AnalysisScreen:
         self.single_color_var.set("grey")
         self.split_year_var.set("")
         self.selected_file_var.set("No file selected")
+        # Timing summary of the last operation, shown in the status bar
+        self.status_var = StringVar(self.root)
         
         # Create toast notification instance
         self.toast = ToastNotification(self.root)
         
         # Initialize pandas DataFrame
         self.df = self.pd.DataFrame()
+        # Family -> genus -> species row index of self.df, built on load
+        self.taxonomy = None
         
         # Get the shapefile data from parent
         self.gdf = main_app.gdf.copy()
+        self.county_template = main_app.county_template
+        # Render processes shared by previews and downloads; the template is sent to them once
+        self.render_pool = engine.RenderPool(self.county_template)
         
         # Add attributes for pagination and storing generated maps
-        self.generated_maps = []  # List of (species, fig) tuples
+        self.generated_maps = []  # engine.SpeciesMap per generated map; images are rendered on demand
+        self.generated_family = ""
+        self.generated_genus = ""
+        self.generated_colors = None
+        self.generated_show_subgenus = True
+        # Species x county summary behind generated_maps, for restyling without a rerun
+        self.generated_matrix = None
+        # Pending restyle after color or split-year edits (see schedule_restyle)
+        self.restyle_job = None
+        # Pending re-layout after the window is resized (see on_window_resize)
+        self.resize_job = None
+        self.last_window_size = None
+        # Rendered previews, so scrolling back to a map does not render it again
+        self.thumbnail_cache = engine.default_thumbnail_cache()
+        # Trace of the previews rendered for generated_maps (see render_gallery_maps)
+        self.gallery_trace = None
+        # Normalized frames of files loaded before, keyed by file content
+        self.ingest_cache = engine.default_ingest_cache()
         self.current_page = 0
         self.maps_per_page = 15
         
@@ -415,278 +898,234 @@ class AnalysisScreen:
         
         # Bind window state change
         self.root.bind("<Configure>", self.on_window_resize)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        """Stop the render processes and end the application."""
+        self.save_gallery_trace()
+        self.render_pool.shutdown()
+        self.root.destroy()
+        self.main_app.root.quit()
 
     def standardize_county_names(self, county_series):
-        """
-        Standardize county names by:
-        1. Converting '&' to 'and'
-        2. Stripping whitespace
-        3. Converting to lowercase
-        """
-        return county_series.str.strip().str.lower().str.replace('&', 'and')
+        """Standardize county names (see species_map_engine.standardize_county_names)."""
+        return engine.standardize_county_names(county_series)
 
     def get_figure_number(self, map_index):
+        """Return the caption figure number, e.g. "Figure 1A." for the first map."""
+        return engine.get_figure_number(map_index)
+
+    def report_trace(self, trace):
+        """Show an operation's timing summary in the status bar and the console."""
+        summary = trace.summary()
+        profile_paths = trace.meta.get("profile")
+        if profile_paths:
+            summary += f" • profile saved as {os.path.basename(profile_paths[0])} in Downloads"
+        self.status_var.set(summary)
+        print(f"⏱ {summary}")
+
+    def profiled(self, operation, work, trace):
         """
-        Calculate figure number based on map index.
-        Maps 1-26: Figure 1A, 1B, 1C, ..., 1Z
-        Maps 27-52: Figure 2A, 2B, 2C, ..., 2Z
-        Maps 53-78: Figure 3A, 3B, 3C, ..., 3Z
-        And so on...
+        Wrap work(progress, cancel) in an engine.Profiler when profiling is on.
+
+        Profiling is switched on with MSDM_PROFILE=1 or by starting the
+        program with --profile. The .pstats and collapsed-stack files go to
+        the Downloads folder, where exports are saved, and their paths are
+        recorded in the trace so report_trace() can point to them.
         """
-        # Calculate which group of 26 this map belongs to (1-based)
-        group_number = (map_index // 26) + 1
-        
-        # Calculate position within the group (0-25)
-        position_in_group = map_index % 26
-        
-        # Convert position to letter (A-Z)
-        letter = string.ascii_uppercase[position_in_group]
-        
-        return f"Figure {group_number}{letter}."
+        if not engine.profiling_enabled():
+            return work
+
+        def run(progress, cancel):
+            profiler = engine.Profiler(operation, str(Path.home() / "Downloads"))
+            try:
+                with profiler:
+                    return work(progress, cancel)
+            finally:
+                trace.meta["profile"] = profiler.save()
+
+        return run
 
     def load_excel(self):
-        path = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx")])
+        path = filedialog.askopenfilename(filetypes=[
+            ("Occurrence Files", " ".join(f"*{ext}" for ext in engine.INPUT_FORMATS)),
+            ("Excel Files", "*.xlsx"),
+            ("CSV/TSV Files", "*.csv *.tsv"),
+            ("Parquet Files", "*.parquet *.pq"),
+            ("Arrow/Feather Files", "*.feather *.arrow *.ipc"),
+        ])
         if not path:
             return
         
-        # Show loading dialog
-        loading_window = tk.Tk()
-        loading_window.title("Loading")
-        screen_width = loading_window.winfo_screenwidth()
-        screen_height = loading_window.winfo_screenheight()
-        window_width = 300
-        window_height = 100
-        x = (screen_width - window_width) // 2
-        y = (screen_height - window_height) // 2
-        loading_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        loading_window.overrideredirect(True)
-        
-        frame = ttk.Frame(loading_window, padding="20", relief="raised")
-        frame.pack(fill='both', expand=True)
-        
-        loading_label = ttk.Label(frame, text="Loading file...\nPlease wait", font=('Helvetica', 10))
-        loading_label.pack(pady=10)
-        
-        progress = ttk.Progressbar(frame, mode='indeterminate')
-        progress.pack(fill='x', pady=5)
-        progress.start(10)
+        # Get just the filename from the path
+        filename = os.path.basename(path)
+        valid_counties = engine.valid_county_names(self.gdf)
+        
+        def work(progress, cancel):
+            # Read, validate and normalize the file, keeping only Montana records
+            montana_records = engine.load_occurrences(path, valid_counties, progress=progress,
+                                                      cache=self.ingest_cache, cancel=cancel)
+            # Index and summarize here too, off the Tk thread
+            with engine.span("index"):
+                taxonomy = engine.TaxonomyIndex(montana_records)
+                stats = engine.summarize_occurrences(montana_records)
+            return montana_records, taxonomy, stats
+        
+        trace = engine.Trace("Load file", file=filename, bytes=os.path.getsize(path))
+        BackgroundTask(
+            self.root, "Loading file", "rows", self.profiled("Load file", work, trace),
+            on_success=lambda result: self.on_file_loaded(filename, *result),
+            on_error=self.on_file_load_error,
+            on_cancel=lambda: self.toast.show_toast("Loading cancelled"),
+            trace=trace,
+            on_trace=self.report_trace,
+        )
+    
+    def on_file_loaded(self, filename, montana_records, taxonomy, stats):
+        """Show a newly loaded file's records in the dropdowns and summary."""
+        self.df = montana_records
+        self.taxonomy = taxonomy
+
+        # Debug print: show first few rows to confirm subgenus column is present and correct
+        print('Loaded DataFrame sample:')
+        print(self.df.head())
+        
+        year_info = f"\n• Records with Year Data: {stats['with_years']:,}"
+        
+        # Get valid families (non-empty/non-null values)
+        family_values = [f.title() for f in self.taxonomy.families()]
+        self.family_dropdown["values"] = family_values
+        self.family_dropdown.set("")  # No default selection
+        # Clear Genus dropdown
+        self.genus_dropdown["values"] = []
+        self.genus_dropdown.set("")
         
-        loading_window.update()
+        # Update file info display
+        self.selected_file_var.set(f"✓ {filename}\n{stats['records']:,} Montana records loaded")
+        
+        # Show success message with detailed statistics
+        messagebox.showinfo("Success", 
+            f"File loaded successfully!\n\n"
+            f"Montana Dataset Summary:\n"
+            f"• Total Records: {stats['records']:,}\n"
+            f"• Unique Families: {stats['families']}\n"
+            f"• Unique Genera: {stats['genera']}\n"
+            f"• Unique Species: {stats['species']}\n"
+            f"• Counties Covered: {stats['counties']}\n"
+            f"{year_info}\n\n"
+            "Please select a Family to continue."
+        )
         
-        try:
-            # Load the Excel file
-            self.df = self.pd.read_excel(path, sheet_name=0)
-            
-            # Now continue with column processing
-            self.df.columns = self.df.columns.str.strip()
-            
-            # Get just the filename from the path
-            filename = path.split('/')[-1]
-            
-            # Validate required columns
-            required_columns = ["county", "family", "genus", "species"]
-            missing_columns = [col for col in required_columns if col not in self.df.columns]
-            
-            if missing_columns:
-                progress.stop()
-                loading_window.destroy()
-                self.selected_file_var.set("No file selected")
-                messagebox.showerror("Error", 
-                    f"Missing required columns: {', '.join(missing_columns)}\n\n"
-                    "The following columns are required:\n"
-                    "- county: for mapping locations\n"
-                    "- family: for taxonomic classification\n"
-                    "- genus: for taxonomic classification\n"
-                    "- species: for taxonomic classification\n\n"
-                    "Please check your Excel file and try again."
-                )
-                return
-            
-            # Process the data
-            # First standardize county names
-            self.df["county"] = self.standardize_county_names(self.df["county"])
-            
-            # Process other columns
-            for col in ["family", "genus", "species"]:
-                self.df[col] = self.df[col].astype(str).str.strip().str.lower()
-            
-            # Process year column if it exists
-            if "year" in self.df.columns:
-                # Convert year to numeric, invalid values become NaN
-                self.df["year"] = pd.to_numeric(self.df["year"], errors='coerce')
-                # Count records with valid years
-                valid_years = self.df["year"].notna().sum()
-                print(f"Found {valid_years} records with valid years out of {len(self.df)} total records")
-            else:
-                # Create empty year column if it doesn't exist
-                self.df["year"] = pd.NA
-                print("No 'year' column found in data. Year-based coloring will use single color.")
-            
-            # Get valid Montana counties from shapefile
-            valid_counties = set(self.standardize_county_names(self.gdf["County"]))
-            
-            # Filter DataFrame to only include valid Montana counties
-            montana_records = self.df[self.df["county"].isin(valid_counties)]
-            
-            if len(montana_records) == 0:
-                progress.stop()
-                loading_window.destroy()
-                self.selected_file_var.set("No file selected")
-                messagebox.showerror("Error", 
-                    "No valid Montana county records found in the Excel file.\n\n"
-                    "Please check that your data contains Montana county records."
-                )
-                return
-            
-            # Replace the main DataFrame with only Montana records
-            self.df = montana_records
-
-            # Debug print: show first few rows to confirm subgenus column is present and correct
-            print('Loaded DataFrame sample:')
-            print(self.df.head())
-            
-            # Calculate statistics using Montana records
-            num_records = len(montana_records)
-            num_families = len(montana_records["family"].unique())
-            num_genera = len(montana_records["genus"].unique())
-            num_species = len(montana_records["species"].unique())
-            num_counties = len(montana_records["county"].unique())
-            
-            # Count records with valid years
-            if "year" in montana_records.columns:
-                num_with_years = montana_records["year"].notna().sum()
-                year_info = f"\n• Records with Year Data: {num_with_years:,}"
-            else:
-                year_info = "\n• Year Data: Not available"
-            
-            # Get valid families (non-empty/non-null values)
-            valid_families = sorted(montana_records["family"].dropna().unique())
-            valid_families = [f for f in valid_families if str(f).strip() and str(f).lower() != 'nan']
-            family_values = [f.title() for f in valid_families]
-            self.family_dropdown["values"] = family_values
-            self.family_dropdown.set("")  # No default selection
-            # Clear Genus dropdown
-            self.genus_dropdown["values"] = []
-            self.genus_dropdown.set("")
-            
-            # Update file info display
-            self.selected_file_var.set(f"✓ {filename}\n{num_records:,} Montana records loaded")
-            
-            # Stop progress bar and close loading window
-            progress.stop()
-            loading_window.destroy()
-            
-            # Show success message with detailed statistics
-            messagebox.showinfo("Success", 
-                f"File loaded successfully!\n\n"
-                f"Montana Dataset Summary:\n"
-                f"• Total Records: {num_records:,}\n"
-                f"• Unique Families: {num_families}\n"
-                f"• Unique Genera: {num_genera}\n"
-                f"• Unique Species: {num_species}\n"
-                f"• Counties Covered: {num_counties}\n"
-                f"{year_info}\n\n"
-                "Please select a Family to continue."
-            )
-            
-            print("✅ Excel file loaded successfully!")
-            
-        except Exception as e:
-            progress.stop()
-            loading_window.destroy()
-            self.selected_file_var.set("No file selected")
-            error_message = str(e)
-            if "No sheet named" in error_message:
-                error_message = "Invalid Excel file format. Please ensure your data is in the first sheet."
-            elif "Invalid file" in error_message:
-                error_message = "Invalid file format. Please ensure you're uploading a valid Excel (.xlsx) file."
-            
-            messagebox.showerror("Error", 
-                f"Error loading file:\n{error_message}\n\n"
-                "Please check your Excel file format and try again."
-            )
+        print("✅ Data file loaded successfully!")
+    
+    def on_file_load_error(self, e):
+        """Report a file that could not be loaded."""
+        self.selected_file_var.set("No file selected")
+        if isinstance(e, engine.DataValidationError):
+            messagebox.showerror("Error", str(e))
+            return
+        error_message = str(e)
+        if "No sheet named" in error_message:
+            error_message = "Invalid Excel file format. Please ensure your data is in the first sheet."
+        elif "Invalid file" in error_message:
+            error_message = "Invalid file format. Please ensure you're uploading a valid Excel, CSV, TSV, Parquet or Arrow file."
+        
+        messagebox.showerror("Error", 
+            f"Error loading file:\n{error_message}\n\n"
+            "Please check your file format and try again."
+        )
+    
+    def clear_ingest_cache(self):
+        """Delete the cached copies of previously loaded data files."""
+        if self.ingest_cache is None:
+            self.toast.show_toast("The data cache is disabled")
+            return
+        freed = self.ingest_cache.clear()
+        self.toast.show_toast(f"Data cache cleared ({freed / (1024 * 1024):.1f} MB freed)")
     
     def update_genus_dropdown(self, event=None):
         family = self.selected_family.get().strip()
         
-        if not family:
+        if not family or self.taxonomy is None:
             self.genus_dropdown["values"] = []
             self.genus_dropdown.set("")
             return
         
-        filtered = self.df[self.df["family"].str.title() == family]
-        valid_genera = sorted(filtered["genus"].dropna().unique())
-        valid_genera = [g for g in valid_genera if str(g).strip() and str(g).lower() != 'nan']
-        genus_values = [g.title() for g in valid_genera]
+        genus_values = [g.title() for g in self.taxonomy.genera(family)]
         self.genus_dropdown["values"] = genus_values
         self.genus_dropdown.set("")
     
-    def is_valid_color(self, color):
-        """Validate if a color string is a valid matplotlib color"""
-        try:
-            # Convert color to RGB
-            self.plt.matplotlib.colors.to_rgb(color)
-            return True
-        except ValueError:
-            return False
-
+    def get_color_settings(self):
+        """Return the current year-based color settings for the engine."""
+        return engine.ColorSettings(
+            pre_year_color=self.pre_year_color_var.get(),
+            post_year_color=self.post_year_color_var.get(),
+            single_color=self.single_color_var.get(),
+            split_year=self.split_year_var.get(),
+        )
+    
     def validate_colors(self):
         """Validate selected colors"""
-        colors_to_validate = [
-            ("Pre-Year Color", self.pre_year_color_var.get()),
-            ("Post-Year Color", self.post_year_color_var.get()),
-            ("Single Color", self.single_color_var.get())
-        ]
-        
-        for color_name, color_value in colors_to_validate:
-            if not self.is_valid_color(color_value):
-                error_msg = f"Invalid {color_name}: '{color_value}'"
-                self.toast.show_toast(error_msg, duration=5000, error=True)
-                return False
+        for color_name, color_value in self.get_color_settings().invalid_colors():
+            error_msg = f"Invalid {color_name}: '{color_value}'"
+            self.toast.show_toast(error_msg, duration=5000, error=True)
+            return False
         return True
 
     def on_color_change(self, event=None):
-        """Validate colors when they change"""
-        self.validate_colors()
+        """Validate colors when they change and restyle generated maps"""
+        if self.validate_colors():
+            self.schedule_restyle()
+
+    def schedule_restyle(self, delay=400):
+        """Restyle generated maps once the color or split-year edits pause."""
+        if self.restyle_job is not None:
+            self.root.after_cancel(self.restyle_job)
+        self.restyle_job = self.root.after(delay, self.restyle_maps)
+
+    def flush_restyle(self):
+        """Apply a pending restyle now, so an export started meanwhile gets the colors just entered."""
+        if self.restyle_job is not None:
+            self.root.after_cancel(self.restyle_job)
+            self.restyle_maps()
 
-    def get_color_for_record(self, record_year):
+    def export_snapshot(self, species_maps):
         """
-        Determine the appropriate color for a record based on year logic.
-        
-        Args:
-            record_year: The year from the record (can be None, NaN, or a number)
-            
-        Returns:
-            str: The color to use for this record
+        Return copies of species_maps for a background export.
+
+        restyle_maps() gives the generated maps new color codes while an
+        export may still be running; the copies keep the codes the export
+        started with, matching the colors and legend it was given.
         """
-        split_year_str = self.split_year_var.get().strip()
-        
-        # If no split year is specified, use single color
-        if not split_year_str:
-            return self.single_color_var.get()
-        
-        # Try to convert split year to integer
-        try:
-            split_year = int(split_year_str)
-        except ValueError:
-            # If split year is invalid, use single color
-            return self.single_color_var.get()
-        
-        # If record has no year or invalid year, use single color
-        if record_year is None or pd.isna(record_year):
-            return self.single_color_var.get()
-        
+        return [copy.copy(species_map) for species_map in species_maps]
+
+    def restyle_maps(self):
+        """
+        Apply new colors or a new split year to the generated maps.
+
+        Color codes are recomputed from the stored species x county matrix
+        and only previews whose picture changed are rendered again; the
+        records are not filtered or summarized again.
+        """
+        self.restyle_job = None
+        if not self.generated_maps:
+            return
+        colors = self.get_color_settings()
+        old = self.generated_colors
+        if (old is not None and colors.palette() == old.palette()
+                and colors.split_year_value() == old.split_year_value()):
+            return
+        changed = engine.restyle_species_maps(self.generated_maps, self.generated_matrix, colors)
+        self.generated_colors = colors
+        print(f"Restyled maps ({changed} with new county colors)")
+        self.gallery.refresh()
+
+    def get_render_workers(self):
+        """Return the number of map render processes chosen in the GUI."""
         try:
-            record_year_int = int(record_year)
-        except (ValueError, TypeError):
-            # If record year is invalid, use single color
-            return self.single_color_var.get()
-        
-        # Apply year-based logic
-        if record_year_int <= split_year:
-            return self.pre_year_color_var.get()
-        else:
-            return self.post_year_color_var.get()
+            return max(1, int(self.render_workers_var.get()))
+        except (ValueError, tk.TclError):
+            return 1
 
     def get_legend_text(self):
         """
@@ -695,20 +1134,9 @@ class AnalysisScreen:
         Returns:
             str: The legend text to display
         """
-        split_year_str = self.split_year_var.get().strip()
-        
-        if not split_year_str:
-            return f"Color Used: {self.single_color_var.get().title()}"
-        
-        try:
-            split_year = int(split_year_str)
-            return f"Before or equal to {split_year} → {self.pre_year_color_var.get().title()}\nAfter {split_year} → {self.post_year_color_var.get().title()}"
-        except ValueError:
-            return f"Color Used: {self.single_color_var.get().title()}"
+        return self.get_color_settings().legend_text()
 
     def generate_map(self):
-        if self.map_canvas:
-            self.map_canvas.get_tk_widget().destroy()
         # Validate colors first
         if not self.validate_colors():
             return
@@ -717,506 +1145,186 @@ class AnalysisScreen:
         if not fam or fam == "Select Family" or not gen or gen == "Select Genus":
             messagebox.showerror("Missing Input", "Please select Family and Genus.")
             return
-        # Show loading dialog
-        loading_window = tk.Tk()
-        loading_window.title("Generating Maps")
-        screen_width = loading_window.winfo_screenwidth()
-        screen_height = loading_window.winfo_screenheight()
-        window_width = 400
-        window_height = 150
-        x = (screen_width - window_width) // 2
-        y = (screen_height - window_height) // 2
-        loading_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        loading_window.overrideredirect(True)
-        frame = ttk.Frame(loading_window, padding="20", relief="raised")
-        frame.pack(fill='both', expand=True)
-        loading_label = ttk.Label(frame, text="Generating maps for all species...\nPlease wait", font=('Helvetica', 10))
-        loading_label.pack(pady=10)
-        progress = ttk.Progressbar(frame, mode='indeterminate')
-        progress.pack(fill='x', pady=5)
-        progress.start(10)
-        loading_window.update()
-        try:
-            # Start with base DataFrame
-            filtered = self.df
-            # Apply family filter
-            if fam == "All":
-                filtered = filtered[filtered["family"].notna() & (filtered["family"].str.strip() != "")]
-            elif fam == "Not Specified":
-                filtered = filtered[filtered["family"].isna() | (filtered["family"].str.strip() == "")]
-            else:
-                filtered = filtered[filtered["family"].str.lower() == fam.lower()]
-            # Apply genus filter
-            if gen == "All":
-                filtered = filtered[filtered["genus"].notna() & (filtered["genus"].str.strip() != "")]
-            elif gen == "Not Specified":
-                filtered = filtered[filtered["genus"].isna() | (filtered["genus"].str.strip() == "")]
-            else:
-                filtered = filtered[filtered["genus"].str.lower() == gen.lower()]
-            # Get unique species
-            unique_species = filtered["species"].dropna().unique()
-            unique_species = [sp for sp in unique_species if str(sp).strip() and str(sp).lower() != 'nan']
-            unique_species = sorted(unique_species, key=lambda x: str(x).lower())
-            if len(unique_species) == 0:
-                progress.stop()
-                loading_window.destroy()
-                messagebox.showerror("No Data", "No species found for the selected Family and Genus combination.")
-                return
-            # Clear previous maps
-            self.generated_maps = []
-            self.current_page = 0
-            # Create a set of valid county names from the shapefile for quick lookup
-            valid_counties = set(self.standardize_county_names(self.gdf["County"]))
-            # Track unmatched counties to report to user
-            unmatched_counties = set()
-            # Generate map for each species
-            for i, species in enumerate(unique_species):
-                # Update loading message
-                loading_label.config(text=f"Generating map {i+1} of {len(unique_species)}...\nSpecies: {species}")
-                loading_window.update()
-                # Filter data for this species
-                species_data = filtered[filtered["species"].str.lower() == species.lower()]
-                if len(species_data) == 0:
-                    continue
-                # Create map for this species
-                gdf_copy = self.gdf.copy()
-                gdf_copy["Color"] = "white"
-                # Mark counties with records for this species
-                for county in species_data["county"].unique():
-                    county_lower = self.standardize_county_names(pd.Series([county])).iloc[0]
-                    if county_lower in valid_counties:
-                        mask = self.standardize_county_names(gdf_copy["County"]) == county_lower
-                        # Get all records for this county and species
-                        county_records = species_data[species_data["county"] == county]
-                        
-                        # Determine color based on year logic
-                        # If any record has a year that falls in the post-year category, use post-year color
-                        # Otherwise, use pre-year color or single color
-                        split_year_str = self.split_year_var.get().strip()
-                        if split_year_str:
-                            try:
-                                split_year = int(split_year_str)
-                                has_post_year_record = False
-                                has_pre_year_record = False
-                                
-                                for _, record in county_records.iterrows():
-                                    record_year = record.get('year')
-                                    if record_year is not None and not pd.isna(record_year):
-                                        try:
-                                            record_year_int = int(record_year)
-                                            if record_year_int > split_year:
-                                                has_post_year_record = True
-                                            else:
-                                                has_pre_year_record = True
-                                        except (ValueError, TypeError):
-                                            pass
-                                
-                                # Determine final color for this county
-                                if has_pre_year_record:
-                                    color = self.pre_year_color_var.get()  # PRE-YEAR COLOR (HIGHEST PRIORITY)
-                                elif has_post_year_record:
-                                    color = self.post_year_color_var.get()  # POST-YEAR COLOR (LOWER PRIORITY)
-                                else:
-                                    color = self.single_color_var.get()  # SINGLE COLOR
-                            except ValueError:
-                                color = self.single_color_var.get()
-                        else:
-                            color = self.single_color_var.get()
-                        
-                        gdf_copy.loc[mask, "Color"] = color
-                    else:
-                        unmatched_counties.add(county)
-                # Create figure for this species
-                fig = self.plt.figure(figsize=(8, 6))
-                # Create main map axis
-                ax = fig.add_axes([0.1, 0.2, 0.8, 0.6])
-                gdf_copy.boundary.plot(ax=ax, linewidth=0.5, edgecolor="black")
-                gdf_copy.plot(ax=ax, color=gdf_copy["Color"], alpha=0.6)
-                # Add title
-                title = f"{fam.title()} > {gen.title()} > {species.title()}"
-                ax.set_title(title, fontsize=10, pad=15, wrap=True)
-                ax.axis("off")
-                
-                
-                
-                # Add caption below the map
-                rec = species_data.iloc[0]
-                genus = str(rec.get('genus', '')).strip().title()
-                sp_epithet = str(rec.get('species', '')).strip().lower()
-                subgenus = str(rec.get('subgenus', '')).strip().title() if 'subgenus' in rec else ''
-                fig_number = self.get_figure_number(i)
-                # Figure number (normal)
-                ax.text(0.15, -0.10, f"{fig_number}", ha='center', va='bottom', fontsize=11, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-                
-                # Use the complex caption rendering method
-                self.render_complex_caption(ax, genus, subgenus, sp_epithet, x=0.21, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-
-                # specimen summary
-                num_specimens = len(species_data)
-                num_counties = species_data['county'].nunique()
-                summary = f"{num_specimens} specimen{'s' if num_specimens != 1 else ''} in {num_counties} count{'ies' if num_counties != 1 else 'y'}."
-                ax.text(0.25, -0.16, summary, ha='center', va='bottom', fontsize=11, fontname='Times New Roman', transform=ax.transAxes)
-                
-                
-                
-                
-                # Adjust layout
-                fig.subplots_adjust(bottom=0.15, top=0.85)
-                # Store the map with subgenus
-                self.generated_maps.append((species, subgenus, fig))
-                self.plt.close(fig)
-            # Report any unmatched counties
-            if unmatched_counties:
-                print("\nWarning: The following counties in your Excel file don't match the shapefile counties:")
-                print("-------------------------------------------------------------------------")
-                for county in sorted(unmatched_counties):
-                    print(f"• {county}")
-                print("\nValid Montana county names:")
-                print("--------------------------------")
-                for county in sorted(valid_counties):
-                    print(f"• {county}")
-                print("-------------------------------------------------------------------------\n")
-                messagebox.showwarning("County Name Mismatch",
-                    f"Some counties in your Excel file don't match the shapefile counties.\n\n"
-                    f"Number of unmatched counties: {len(unmatched_counties)}\n\n"
-                    f"Please check the console output for details and ensure county names match exactly."
-                )
-            # Stop progress and close loading window
-            progress.stop()
-            loading_window.destroy()
-            # Show success message
-            messagebox.showinfo("Success", 
-                f"Generated {len(self.generated_maps)} maps for {len(unique_species)} species!\n\n"
-                f"Family: {fam.title()}\n"
-                f"Genus: {gen.title()}\n"
-                f"Species Count: {len(unique_species)}"
-            )
-            # Display the first page
-            self.show_current_page()
-            # Enable download buttons
-            self.download_current_button.config(state="normal")
-            self.download_all_button.config(state="normal")
-            # Enable pagination buttons if there are more than 15 maps
-            if len(self.generated_maps) > self.maps_per_page:
-                self.next_button.config(state="normal")
-            print(f"✅ Generated {len(self.generated_maps)} maps successfully!")
-        except Exception as e:
-            progress.stop()
-            loading_window.destroy()
-            messagebox.showerror("Error", 
+        unique_species = self.taxonomy.species(fam, gen)
+        if len(unique_species) == 0:
+            messagebox.showerror("No Data", "No species found for the selected Family and Genus combination.")
+            return
+        colors = self.get_color_settings()
+        show_subgenus = self.show_subgenus_var.get()
+        county_names = self.county_template.county_names
+
+        def work(progress, cancel):
+            # Compute county colors and caption data for every species in one pass
+            with engine.span("filter"):
+                filtered = self.taxonomy.filter(fam, gen)
+            with engine.span("matrix", records=len(filtered)):
+                matrix, unmatched_counties = engine.build_species_matrix(filtered, county_names)
+            with engine.span("species_maps", species=len(matrix.species)):
+                species_maps = engine.species_maps_from_matrix(
+                    matrix, colors, progress=lambda i, total: progress(i + 1, total), cancel=cancel)
+            return matrix, species_maps, unmatched_counties
+
+        trace = engine.Trace("Generate maps", family=fam, genus=gen, species=len(unique_species))
+        BackgroundTask(
+            self.root, "Generating maps", "species", self.profiled("Generate maps", work, trace),
+            on_success=lambda result: self.on_maps_generated(fam, gen, colors, show_subgenus, *result),
+            on_error=lambda e: messagebox.showerror("Error", 
                 f"Error generating maps:\n{str(e)}\n\n"
                 "Please try again."
+            ),
+            on_cancel=lambda: self.toast.show_toast("Map generation cancelled"),
+            trace=trace,
+            on_trace=self.report_trace,
+        )
+
+    def on_maps_generated(self, fam, gen, colors, show_subgenus, matrix, species_maps, unmatched_counties):
+        """Show newly generated maps from the top of the gallery."""
+        self.current_page = 0
+        self.generated_matrix = matrix
+        self.generated_maps = species_maps
+        self.generated_family = fam
+        self.generated_genus = gen
+        self.generated_colors = colors
+        self.generated_show_subgenus = show_subgenus
+        # Previews of the previous run can never be shown again
+        self.thumbnail_cache.clear()
+        self.save_gallery_trace()
+        # Report any unmatched counties
+        if unmatched_counties:
+            print("\nWarning: The following counties in your Excel file don't match the shapefile counties:")
+            print("-------------------------------------------------------------------------")
+            for county in sorted(unmatched_counties):
+                print(f"• {county}")
+            print("\nValid Montana county names:")
+            print("--------------------------------")
+            for county in sorted(engine.valid_county_names(self.gdf)):
+                print(f"• {county}")
+            print("-------------------------------------------------------------------------\n")
+            messagebox.showwarning("County Name Mismatch",
+                f"Some counties in your Excel file don't match the shapefile counties.\n\n"
+                f"Number of unmatched counties: {len(unmatched_counties)}\n\n"
+                f"Please check the console output for details and ensure county names match exactly."
             )
+        # Show success message
+        messagebox.showinfo("Success", 
+            f"Generated {len(self.generated_maps)} maps for {len(matrix.species)} species!\n\n"
+            f"Family: {fam.title()}\n"
+            f"Genus: {gen.title()}\n"
+            f"Species Count: {len(matrix.species)}"
+        )
+        # Display the maps from the top; the page buttons follow the scroll position
+        self.gallery.set_count(len(self.generated_maps))
+        # Enable download buttons
+        self.download_current_button.config(state="normal")
+        self.download_all_button.config(state="normal")
+        print(f"✅ Generated {len(self.generated_maps)} maps successfully!")
     
     def download_current_page(self):
-        import datetime
-        from pathlib import Path
-        import re
-        import string
+        self.flush_restyle()
         # Get maps for current page
-        start = self.current_page * self.maps_per_page
-        end = self.current_page * self.maps_per_page + self.maps_per_page
-        maps_to_save = self.generated_maps[start:end]
+        maps_to_save = self.export_snapshot(engine.page_maps(self.generated_maps, self.current_page,
+                                                             self.maps_per_page))
         if not maps_to_save:
             return
         downloads_path = str(Path.home() / "Downloads")
-        fam = self.selected_family.get().strip().title()
-        gen = self.selected_genus.get().strip().title()
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
-        page_num = self.current_page + 1
-        filename = f"{fam}-{gen}-{timestamp}_page{page_num}.{self.export_format_var.get()}"
+        fam = self.generated_family.title()
+        gen = self.generated_genus.title()
+        fmt = self.export_format_var.get()
+        page = self.current_page
+        colors, show_subgenus = self.generated_colors, self.generated_show_subgenus
+        filename = engine.page_filename(fam, gen, engine.export_timestamp(), page, fmt)
         file_path = os.path.join(downloads_path, filename)
-        try:
-            mpl.rcParams['font.family'] = 'serif'
-            mpl.rcParams['font.serif'] = ['Times New Roman', 'Times', 'DejaVu Serif', 'serif']
-            fig = self.plt.figure(figsize=(13.2, 19))
-            fig.suptitle(f"{fam} > {gen}", fontsize=18, fontweight='bold', y=0.99)
-            
-            # Add legend text below the main title
-            legend_text = self.get_legend_text()
-            fig.text(0.5, 0.95, legend_text, ha='center', va='top', fontsize=12, 
-                    fontname='Times New Roman', transform=fig.transFigure)
-            
-            cols = 3
-            rows = 5
-            for idx in range(rows * cols):
-                ax = fig.add_subplot(rows, cols, idx + 1)
-                if idx < len(maps_to_save):
-                    species, subgenus, species_fig = maps_to_save[idx]
-                    fam_val = self.selected_family.get().strip()
-                    gen_val = self.selected_genus.get().strip()
-                    filtered = self.df
-                    if fam_val == "All":
-                        filtered = filtered[filtered["family"].notna() & (filtered["family"].str.strip() != "")]
-                    elif fam_val == "Not Specified":
-                        filtered = filtered[filtered["family"].isna() | (filtered["family"].str.strip() == "")]
-                    else:
-                        filtered = filtered[filtered["family"].str.lower() == fam_val.lower()]
-                    if gen_val == "All":
-                        filtered = filtered[filtered["genus"].notna() & (filtered["genus"].str.strip() != "")]
-                    elif gen_val == "Not Specified":
-                        filtered = filtered[filtered["genus"].isna() | (filtered["genus"].str.strip() == "")]
-                    else:
-                        filtered = filtered[filtered["genus"].str.lower() == gen_val.lower()]
-                    species_data = filtered[filtered["species"].str.lower() == species.lower()]
-                    gdf_copy = self.gdf.copy()
-                    gdf_copy["Color"] = "white"
-                    valid_counties = set(self.standardize_county_names(gdf_copy["County"]))
-                    for county in species_data["county"].unique():
-                        county_lower = self.standardize_county_names(pd.Series([county])).iloc[0]
-                        if county_lower in valid_counties:
-                            mask = self.standardize_county_names(gdf_copy["County"]) == county_lower
-                            # Get all records for this county and species
-                            county_records = species_data[species_data["county"] == county]
-                            
-                            # Determine color based on year logic
-                            # If any record has a year that falls in the post-year category, use post-year color
-                            # Otherwise, use pre-year color or single color
-                            split_year_str = self.split_year_var.get().strip()
-                            if split_year_str:
-                                try:
-                                    split_year = int(split_year_str)
-                                    has_post_year_record = False
-                                    has_pre_year_record = False
-                                    
-                                    for _, record in county_records.iterrows():
-                                        record_year = record.get('year')
-                                        if record_year is not None and not pd.isna(record_year):
-                                            try:
-                                                record_year_int = int(record_year)
-                                                if record_year_int > split_year:
-                                                    has_post_year_record = True
-                                                else:
-                                                    has_pre_year_record = True
-                                            except (ValueError, TypeError):
-                                                pass
-                                    
-                                    # Determine final color for this county
-                                    if has_pre_year_record:
-                                        color = self.pre_year_color_var.get()  # PRE-YEAR COLOR (HIGHEST PRIORITY)
-                                    elif has_post_year_record:
-                                        color = self.post_year_color_var.get()  # POST-YEAR COLOR (LOWER PRIORITY)
-                                    else:
-                                        color = self.single_color_var.get()  # SINGLE COLOR
-                                except ValueError:
-                                    color = self.single_color_var.get()
-                            else:
-                                color = self.single_color_var.get()
-                            
-                            gdf_copy.loc[mask, "Color"] = color
-                    gdf_copy.boundary.plot(ax=ax, linewidth=0.7, edgecolor="black")
-                    gdf_copy.plot(ax=ax, color=gdf_copy["Color"], alpha=0.6)
-                    ax.axis("off")
-                    
-                    
-                    # --- Caption formatting ---
-                    global_index = self.current_page * self.maps_per_page + idx
-                    fig_number = self.get_figure_number(global_index)
-                    rec = species_data.iloc[0]
-                    genus = str(rec.get('genus', '')).strip().title()
-                    sp_epithet = str(rec.get('species', '')).strip().lower()
-                    subgenus = str(rec.get('subgenus', '')).strip().title() if 'subgenus' in rec else ''
-                    
-                    # Figure number (normal)
-                    ax.text(0.15, -0.10, f"{fig_number}", ha='center', va='bottom', fontsize=11, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-                    
-                    # Use the complex caption rendering method based on export format
-                    if self.export_format_var.get() == "svg":
-                        self.render_complex_caption_for_download_svg(ax, genus, subgenus, sp_epithet, x=0.235, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-                    elif self.export_format_var.get() == "tiff":
-                        self.render_complex_caption_for_download_tiff(ax, genus, subgenus, sp_epithet, x=0.235, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-                    elif self.export_format_var.get() == "jpg":
-                        self.render_complex_caption_for_download_jpg(ax, genus, subgenus, sp_epithet, x=0.235, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-                    
-                    
-                    
-                    num_specimens = len(species_data)
-                    num_counties = species_data['county'].nunique()
-                    summary = f"{num_specimens} specimen{'s' if num_specimens != 1 else ''} in {num_counties} count{'ies' if num_counties != 1 else 'y'}."
-                    
-                    
-                    
-                    ax.text(0.29, -0.16, summary, ha='center', va='bottom', fontsize=11, fontname='Times New Roman', transform=ax.transAxes)
-                else:
-                    ax.axis("off")
-            fig.tight_layout(pad=0.01)
-            fig.subplots_adjust(hspace=-0.4, wspace=0.0, bottom=0.04, top=0.98)
-            # Configure matplotlib to preserve text as editable elements in SVG
-            mpl.rcParams['svg.fonttype'] = 'none'
-            fig.savefig(file_path, format=self.export_format_var.get(), bbox_inches='tight')
-            self.plt.close(fig)
+
+        def work(progress, cancel):
+            engine.export_page(file_path, maps_to_save, page, self.county_template, fam, gen, colors, fmt, show_subgenus)
+
+        def on_saved(result):
             self.toast.show_toast(f'Current page saved as {filename} in Downloads!')
-            print(f"✅ Current page saved as {self.export_format_var.get()} file: {file_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving current page:\n{str(e)}\n\nPlease try again.")
+            print(f"✅ Current page saved as {fmt} file: {file_path}")
+
+        trace = engine.Trace("Download page", format=fmt, page=page, maps=len(maps_to_save))
+        BackgroundTask(
+            self.root, "Saving page", "pages", self.profiled("Download page", work, trace), on_success=on_saved,
+            on_error=lambda e: messagebox.showerror("Error", f"Error saving current page:\n{str(e)}\n\nPlease try again."),
+            trace=trace,
+            on_trace=self.report_trace,
+            # A single page is written in one call that cannot stop part way
+            cancellable=False,
+        )
 
     def download_all_maps(self):
-        import datetime
-        from pathlib import Path
-        import zipfile
-        import re
-        import string
         if not self.generated_maps:
             return
+        self.flush_restyle()
         downloads_path = str(Path.home() / "Downloads")
-        fam = self.selected_family.get().strip().title()
-        gen = self.selected_genus.get().strip().title()
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+        fam = self.generated_family.title()
+        gen = self.generated_genus.title()
+        timestamp = engine.export_timestamp()
         zip_filename = f"{fam}-{gen}-{timestamp}.zip"
         zip_path = os.path.join(downloads_path, zip_filename)
-        try:
-            mpl.rcParams['font.family'] = 'serif'
-            mpl.rcParams['font.serif'] = ['Times New Roman', 'Times', 'DejaVu Serif', 'serif']
-            # Configure matplotlib to preserve text as editable elements in SVG
-            mpl.rcParams['svg.fonttype'] = 'none'
-            svgs = []
-            total_maps = len(self.generated_maps)
-            pages = (total_maps + self.maps_per_page - 1) // self.maps_per_page
-            for page in range(pages):
-                start = page * self.maps_per_page
-                end = min(start + self.maps_per_page, total_maps)
-                maps_to_save = self.generated_maps[start:end]
-                fig = self.plt.figure(figsize=(13.2, 19))
-                fig.suptitle(f"{fam} > {gen}", fontsize=18, fontweight='bold', y=0.99)
-                
-                # Add legend text below the main title
-                legend_text = self.get_legend_text()
-                fig.text(0.5, 0.95, legend_text, ha='center', va='top', fontsize=12, 
-                        fontname='Times New Roman', transform=fig.transFigure)
-                
-                cols = 3
-                rows = 5
-                for idx in range(rows * cols):
-                    ax = fig.add_subplot(rows, cols, idx + 1)
-                    if idx < len(maps_to_save):
-                        species, subgenus, species_fig = maps_to_save[idx]
-                        fam_val = self.selected_family.get().strip()
-                        gen_val = self.selected_genus.get().strip()
-                        filtered = self.df
-                        if fam_val == "All":
-                            filtered = filtered[filtered["family"].notna() & (filtered["family"].str.strip() != "")]
-                        elif fam_val == "Not Specified":
-                            filtered = filtered[filtered["family"].isna() | (filtered["family"].str.strip() == "")]
-                        else:
-                            filtered = filtered[filtered["family"].str.lower() == fam_val.lower()]
-                        if gen_val == "All":
-                            filtered = filtered[filtered["genus"].notna() & (filtered["genus"].str.strip() != "")]
-                        elif gen_val == "Not Specified":
-                            filtered = filtered[filtered["genus"].isna() | (filtered["genus"].str.strip() == "")]
-                        else:
-                            filtered = filtered[filtered["genus"].str.lower() == gen_val.lower()]
-                        species_data = filtered[filtered["species"].str.lower() == species.lower()]
-                        gdf_copy = self.gdf.copy()
-                        gdf_copy["Color"] = "white"
-                        valid_counties = set(self.standardize_county_names(gdf_copy["County"]))
-                        for county in species_data["county"].unique():
-                            county_lower = self.standardize_county_names(pd.Series([county])).iloc[0]
-                            if county_lower in valid_counties:
-                                mask = self.standardize_county_names(gdf_copy["County"]) == county_lower
-                                # Get all records for this county and species
-                                county_records = species_data[species_data["county"] == county]
-                                
-                                # Determine color based on year logic
-                                # If any record has a year that falls in the post-year category, use post-year color
-                                # Otherwise, use pre-year color or single color
-                                split_year_str = self.split_year_var.get().strip()
-                                if split_year_str:
-                                    try:
-                                        split_year = int(split_year_str)
-                                        has_post_year_record = False
-                                        has_pre_year_record = False
-                                        
-                                        for _, record in county_records.iterrows():
-                                            record_year = record.get('year')
-                                            if record_year is not None and not pd.isna(record_year):
-                                                try:
-                                                    record_year_int = int(record_year)
-                                                    if record_year_int > split_year:
-                                                        has_post_year_record = True
-                                                    else:
-                                                        has_pre_year_record = True
-                                                except (ValueError, TypeError):
-                                                    pass
-                                        
-                                        # Determine final color for this county
-                                        if has_pre_year_record:
-                                            color = self.pre_year_color_var.get()  # PRE-YEAR COLOR (HIGHEST PRIORITY)
-                                        elif has_post_year_record:
-                                            color = self.post_year_color_var.get()  # POST-YEAR COLOR (LOWER PRIORITY)
-                                        else:
-                                            color = self.single_color_var.get()  # SINGLE COLOR
-                                    except ValueError:
-                                        color = self.single_color_var.get()
-                                else:
-                                    color = self.single_color_var.get()
-                                
-                                gdf_copy.loc[mask, "Color"] = color
-                        gdf_copy.boundary.plot(ax=ax, linewidth=0.7, edgecolor="black")
-                        gdf_copy.plot(ax=ax, color=gdf_copy["Color"], alpha=0.6)
-                        ax.axis("off")
-                        # --- Caption formatting ---
-                        global_index = page * self.maps_per_page + idx
-                        fig_number = self.get_figure_number(global_index)
-                        rec = species_data.iloc[0]
-                        genus = str(rec.get('genus', '')).strip().title()
-                        sp_epithet = str(rec.get('species', '')).strip().lower()
-                        subgenus = str(rec.get('subgenus', '')).strip().title() if 'subgenus' in rec else ''
-                        # Figure number (normal)
-                        ax.text(0.15, -0.10, f"{fig_number}", ha='center', va='bottom', fontsize=11, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-                        # Use the complex caption rendering method based on export format
-                        if self.export_format_var.get() == "svg":
-                            self.render_complex_caption_for_download_svg(ax, genus, subgenus, sp_epithet, x=0.235, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-                        elif self.export_format_var.get() == "tiff":
-                            self.render_complex_caption_for_download_tiff(ax, genus, subgenus, sp_epithet, x=0.235, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-                        elif self.export_format_var.get() == "jpg":
-                            self.render_complex_caption_for_download_jpg(ax, genus, subgenus, sp_epithet, x=0.235, y=-0.10, show_subgenus=self.show_subgenus_var.get())
-                        num_specimens = len(species_data)
-                        num_counties = species_data['county'].nunique()
-                        summary = f"{num_specimens} specimen{'s' if num_specimens != 1 else ''} in {num_counties} count{'ies' if num_counties != 1 else 'y'}."
-                        ax.text(0.29, -0.16, summary, ha='center', va='bottom', fontsize=11, fontname='Times New Roman', transform=ax.transAxes)
-                    else:
-                        ax.axis("off")
-                fig.tight_layout(pad=0.01)
-                fig.subplots_adjust(hspace=-0.4, wspace=0.0, bottom=0.04, top=0.98)
-                buf = io.BytesIO()
-                svg_name = f"{fam}-{gen}-{timestamp}_page{page+1}.{self.export_format_var.get()}"
-                fig.savefig(buf, format=self.export_format_var.get(), bbox_inches='tight')
-                self.plt.close(fig)
-                buf.seek(0)
-                svgs.append((svg_name, buf.read()))
-            with zipfile.ZipFile(zip_path, 'w') as zf:
-                for svg_name, svg_bytes in svgs:
-                    zf.writestr(svg_name, svg_bytes)
+        species_maps = self.export_snapshot(self.generated_maps)
+        colors, show_subgenus = self.generated_colors, self.generated_show_subgenus
+        fmt = self.export_format_var.get()
+        compression = self.zip_compression_var.get()
+        workers = self.get_render_workers()
+
+        def work(progress, cancel):
+            engine.export_all_zip(
+                zip_path, species_maps, self.county_template, fam, gen, colors, fmt, show_subgenus,
+                timestamp=timestamp, progress=lambda page, total: progress(page + 1, total),
+                compression=compression, workers=workers, cancel=cancel, pool=self.render_pool
+            )
+
+        def on_saved(result):
             self.toast.show_toast(f'All maps saved as {zip_filename} in Downloads!')
             print(f"✅ All maps saved as ZIP: {zip_path}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Error saving all maps:\n{str(e)}\n\nPlease try again.")
 
-    def on_window_resize(self, event=None):
+        trace = engine.Trace("Download all maps", format=fmt, maps=len(species_maps), compression=compression,
+                             workers=workers)
+        BackgroundTask(
+            self.root, "Saving maps", "pages", self.profiled("Download all maps", work, trace), on_success=on_saved,
+            on_error=lambda e: messagebox.showerror("Error", f"Error saving all maps:\n{str(e)}\n\nPlease try again."),
+            on_cancel=lambda: self.toast.show_toast("Download cancelled; no archive was saved"),
+            trace=trace,
+            on_trace=self.report_trace,
+        )
+
+    def on_window_resize(self, event=None, delay=150):
+        """
+        Re-lay out the window once a resize pauses.
+
+        <Configure> fires for every widget in the window and many times a
+        second while an edge is dragged; only size changes of the window
+        itself are kept, and they are coalesced into one deferred
+        apply_resize().
+        """
+        if event is not None and event.widget is not self.root:
+            return
+        size = (self.root.winfo_width(), self.root.winfo_height())
+        # Only process if we have valid dimensions that changed
+        if size[0] <= 1 or size[1] <= 1 or size == self.last_window_size:
+            return
+        self.last_window_size = size
+        if self.resize_job is not None:
+            self.root.after_cancel(self.resize_job)
+        self.resize_job = self.root.after(delay, self.apply_resize)
+
+    def apply_resize(self):
+        """Resize the side panel and fit the gallery to the new width."""
+        self.resize_job = None
         try:
-            # Get current window dimensions
-            current_width = self.root.winfo_width()
-            current_height = self.root.winfo_height()
-            
-            # Only process if we have valid dimensions
-            if current_width <= 1 or current_height <= 1:
-                return
-                
             # Store current dimensions for restoring from maximize
             if not hasattr(self, 'last_valid_size'):
                 self.last_valid_size = {
-                    'width': current_width,
-                    'height': current_height,
+                    'width': self.root.winfo_width(),
+                    'height': self.root.winfo_height(),
                     'x': self.root.winfo_x(),
                     'y': self.root.winfo_y()
                 }
-            
-            # Update panels if needed
             self.update_panel_sizes()
-                
+            self.gallery.relayout()
         except Exception as e:
             print(f"Warning: Resize handling error: {str(e)}")  # For debugging
-            pass  # Silently handle any errors during resize
 
     def update_panel_sizes(self):
         try:
@@ -1242,16 +1350,6 @@ class AnalysisScreen:
                 except tk.TclError:
                     pass  # Handle case where canvas is being destroyed
             
-            # Redraw map if it exists
-            if hasattr(self, 'map_canvas') and self.map_canvas:
-                try:
-                    self.map_canvas.draw()
-                except Exception:
-                    pass  # Handle any drawing errors silently
-                    
-            # Force geometry update
-            self.root.update_idletasks()
-                
         except Exception as e:
             print(f"Warning: Panel update error: {str(e)}")  # For debugging
             pass  # Silently handle any errors
@@ -1268,6 +1366,11 @@ class AnalysisScreen:
                        font=('Helvetica', 10, 'bold'),
                        padding=8)
         
+        # Status bar with the timing of the last operation (see report_trace)
+        status_bar = ttk.Label(self.root, textvariable=self.status_var, font=('Helvetica', 9),
+                               foreground='gray', anchor='w', padding=(20, 2))
+        status_bar.pack(side='bottom', fill='x')
+        
         # Create main container with padding
         main_container = ttk.Frame(self.root, padding="20")
         main_container.pack(fill='both', expand=True)
@@ -1326,7 +1429,7 @@ class AnalysisScreen:
         # Load button
         load_button = ttk.Button(
             file_info_frame, 
-            text="Load Excel File", 
+            text="Load Data File", 
             command=self.load_excel, 
             style='TButton'
         )
@@ -1341,6 +1444,15 @@ class AnalysisScreen:
         )
         file_label.pack(fill='x')
         
+        # Clear cached copies of previously loaded files
+        clear_cache_button = ttk.Button(
+            file_info_frame,
+            text="Clear Data Cache",
+            command=self.clear_ingest_cache,
+            style='TButton'
+        )
+        clear_cache_button.pack(fill='x', pady=(5, 0))
+        
         # Configure style for file info
         style.configure('FileInfo.TLabel', 
                        font=('Helvetica', 9),
@@ -1437,6 +1549,17 @@ class AnalysisScreen:
         self.show_subgenus_var = tk.BooleanVar(value=True)
         subgenus_checkbox = ttk.Checkbutton(export_frame, text='Show Subgenus in Captions', variable=self.show_subgenus_var, command=self.regenerate_maps_with_new_subgenus_setting)
         subgenus_checkbox.pack(fill='x', pady=(5, 0))
+        # Compression used for "Download All Maps (ZIP)"
+        ttk.Label(export_frame, text="ZIP compression:", style='TLabel').pack(fill='x', pady=(5, 0))
+        self.zip_compression_var = StringVar(self.root, value="stored")
+        zip_compression_combo = ttk.Combobox(export_frame, textvariable=self.zip_compression_var,
+                                             values=list(engine.ZIP_COMPRESSION), state="readonly")
+        zip_compression_combo.pack(fill='x', pady=(0, 0))
+        # Number of processes used to render species maps
+        ttk.Label(export_frame, text="Parallel rendering (processes):", style='TLabel').pack(fill='x', pady=(5, 0))
+        self.render_workers_var = tk.StringVar(self.root, value="1")
+        workers_spinbox = ttk.Spinbox(export_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.render_workers_var, width=5)
+        workers_spinbox.pack(fill='x', pady=(0, 0))
         
         # Button Section
         button_frame = ttk.Frame(left_panel)
@@ -1484,6 +1607,12 @@ class AnalysisScreen:
         # Create right panel for map display with dynamic width
         self.right_panel = ttk.Frame(main_container)
         self.right_panel.pack(side='left', fill='both', expand=True)
+        self.page_info = ttk.Label(self.right_panel, text="", font=('Helvetica', 10), foreground='gray')
+        self.page_info.pack(side='bottom', pady=5)
+        # Raster previews are redrawn on resize in milliseconds; vector ones are rescaled until shown again
+        self.gallery = MapGallery(self.right_panel, self.render_gallery_maps, batch_size=self.gallery_batch_size,
+                                  on_view_change=self.on_gallery_scroll,
+                                  redraw_on_resize=engine.PREVIEW_RENDERER == "raster")
         
         # Bind resize event to the main update function
         self.root.bind('<Configure>', self.on_window_resize)
@@ -1512,271 +1641,212 @@ class AnalysisScreen:
         self.family_dropdown.bind("<<ComboboxSelected>>", self.update_genus_dropdown)
         # self.genus_dropdown.bind("<<ComboboxSelected>>", self.update_genus_dropdown)
 
-    def show_current_page(self):
-        # Remove previous map display
-        for widget in self.right_panel.winfo_children():
-            widget.destroy()
-        # Get maps for current page
-        start = self.current_page * self.maps_per_page
-        end = self.current_page * self.maps_per_page + self.maps_per_page
-        maps_to_show = self.generated_maps[start:end]
-        if not maps_to_show:
-            no_maps_label = ttk.Label(self.right_panel, text="No maps to display. Please generate maps first.", 
-                                    font=('Helvetica', 12), foreground='gray')
-            no_maps_label.pack(expand=True)
-            return
-        # Create a frame to hold canvas and scrollbars
-        canvas_frame = ttk.Frame(self.right_panel)
-        canvas_frame.pack(fill='both', expand=True)
-        # Create canvas and scrollbars
-        canvas = tk.Canvas(canvas_frame, borderwidth=0, highlightthickness=0)
-        vscrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview)
-        hscrollbar = ttk.Scrollbar(canvas_frame, orient="horizontal", command=canvas.xview)
-        canvas.configure(yscrollcommand=vscrollbar.set, xscrollcommand=hscrollbar.set)
-        # Grid placement
-        canvas.grid(row=0, column=0, sticky='nsew')
-        vscrollbar.grid(row=0, column=1, sticky='ns')
-        hscrollbar.grid(row=1, column=0, sticky='ew')
-        canvas_frame.grid_rowconfigure(0, weight=1)
-        canvas_frame.grid_columnconfigure(0, weight=1)
-        # Responsive grid: always 3 columns, shrink/grow images to fit
-        cols = 3
-        rows = (len(maps_to_show) + cols - 1) // cols
-        panel_width = self.right_panel.winfo_width()
-        if panel_width < 600:
-            panel_width = 600
-        margin = 40
-        img_width = (panel_width - margin * 2) // cols
-        img_height = int(img_width * 0.75)
-        grid_frame = ttk.Frame(canvas)
-        grid_window = canvas.create_window((0, 0), window=grid_frame, anchor="nw")
-        for idx, (species, subgenus, fig) in enumerate(maps_to_show):
-            row = idx // cols
-            col = idx % cols
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png', dpi=100, bbox_inches='tight')
-            buf.seek(0)
-            import PIL.Image, PIL.ImageTk
-            img = PIL.Image.open(buf)
-            img = img.resize((img_width, img_height), PIL.Image.Resampling.LANCZOS)
-            tk_img = PIL.ImageTk.PhotoImage(img)
-            map_frame = ttk.Frame(grid_frame, relief='raised', borderwidth=1)
-            map_frame.grid(row=row*2, column=col, padx=8, pady=8, sticky='nsew')
-            map_label = ttk.Label(map_frame, image=tk_img)
-            map_label.image = tk_img
-            map_label.pack(pady=(5, 0))
-            # Remove the extra caption label below the map
-            # (No cap_label here)
-        for i in range(cols):
-            grid_frame.grid_columnconfigure(i, weight=1)
-        # Update navigation buttons
+    def render_gallery_maps(self, indices, size):
+        """
+        Return the previews the gallery asks for, tracing the ones that were not cached.
+
+        Every fill of the same generated maps adds to one "Show maps" trace,
+        whose running totals are shown in the status bar; it is saved once,
+        by save_gallery_trace(), so scrolling does not push the load and
+        generate traces out of the kept history.
+
+        Args:
+            indices: Positions of the maps in generated_maps
+            size: (width, height) of each preview in pixels
+
+        Returns:
+            list: One PIL image per index
+        """
+        thumbnails = [self.thumbnail_cache.get(self.thumbnail_key(idx, size)) for idx in indices]
+        missing = [idx for idx, img in zip(indices, thumbnails) if img is None]
+        if not missing:
+            return thumbnails
+        if self.gallery_trace is None:
+            self.gallery_trace = engine.Trace("Show maps", maps=0)
+        with self.gallery_trace:
+            rendered = dict(zip(missing, self.render_thumbnails(missing, size)))
+        self.gallery_trace.meta["maps"] += len(missing)
+        self.report_trace(self.gallery_trace)
+        return [img if img is not None else rendered[idx] for idx, img in zip(indices, thumbnails)]
+
+    def save_gallery_trace(self):
+        """Save the trace of the previews shown for the current maps, if any were rendered."""
+        if self.gallery_trace is not None:
+            self.gallery_trace.save()
+            self.gallery_trace = None
+
+    def gallery_batch_size(self):
+        """
+        Return how many previews the gallery renders per idle tick.
+
+        Raster previews take milliseconds, so every slot on screen is filled
+        at once, as are vector previews spread over worker processes;
+        in-process vector rendering fills one row per tick so scrolling
+        stays responsive.
+        """
+        if engine.PREVIEW_RENDERER != "raster" and self.get_render_workers() <= 1:
+            return MapGallery.COLS
+        return None
+
+    def on_gallery_scroll(self, first, last):
+        """Follow the gallery's scroll position in the page buttons, page info and current page."""
+        total = len(self.generated_maps)
+        total_pages = (total - 1) // self.maps_per_page
+        # "Download Current Page" saves the page at the top of the view
+        self.current_page = first // self.maps_per_page
         self.prev_button.config(state='normal' if self.current_page > 0 else 'disabled')
-        total_pages = (len(self.generated_maps) - 1) // self.maps_per_page
         self.next_button.config(state='normal' if self.current_page < total_pages else 'disabled')
-        # Add page info
-        if self.generated_maps:
-            page_info = ttk.Label(self.right_panel, 
-                                text=f"Page {self.current_page + 1} of {total_pages + 1} ({len(maps_to_show)} of {len(self.generated_maps)} maps)",
-                                font=('Helvetica', 10), foreground='gray')
-            page_info.pack(side='bottom', pady=5)
-        # Configure scrolling region and dynamic width
-        def on_configure(event=None):
-            canvas.configure(scrollregion=canvas.bbox('all'))
-            new_width = self.right_panel.winfo_width()
-            if new_width < 600:
-                new_width = 600
-            canvas.itemconfig(grid_window, width=new_width)
-        grid_frame.bind('<Configure>', on_configure)
+        self.page_info.config(text=f"Maps {first + 1}-{last + 1} of {total} (page {self.current_page + 1} "
+                                   f"of {total_pages + 1})")
+
+    def thumbnail_key(self, idx, size):
+        """Return the thumbnail cache key of the preview of generated_maps[idx] at size."""
+        return engine.thumbnail_key(self.generated_maps[idx], idx, self.generated_family, self.generated_genus,
+                                    self.generated_colors, self.generated_show_subgenus, size)
+
+    def render_thumbnails(self, indices, size):
+        """
+        Render the preview images of the maps at indices, size pixels each, and cache them.
+
+        Previews are drawn straight at size: from the county label image with
+        the raster preview renderer (the default, see engine.PREVIEW_RENDERER),
+        or as full figures on Agg, handed over as the canvas's RGBA buffer
+        (in worker processes if requested), with the vector renderer.
+        """
+        family, genus = self.generated_family, self.generated_genus
+        colors, show_subgenus = self.generated_colors, self.generated_show_subgenus
+        if engine.PREVIEW_RENDERER == "raster":
+            images = [engine.render_species_thumbnail(self.generated_maps[idx], self.county_template, family, genus,
+                                                      colors, idx, show_subgenus, size)
+                      for idx in indices]
+        else:
+            # map_indices keeps each map's figure number
+            images = engine.render_species_images(
+                [self.generated_maps[idx] for idx in indices], self.county_template, family, genus, colors,
+                show_subgenus, size, workers=self.get_render_workers(), map_indices=indices, pool=self.render_pool
+            )
+        for idx, img in zip(indices, images):
+            self.thumbnail_cache.put(self.thumbnail_key(idx, size), img)
+        return images
 
     def show_next_page(self):
         total_pages = (len(self.generated_maps) - 1) // self.maps_per_page
         if self.current_page < total_pages:
-            self.current_page += 1
-            self.show_current_page()
+            self.gallery.scroll_to((self.current_page + 1) * self.maps_per_page)
 
     def show_prev_page(self):
         if self.current_page > 0:
-            self.current_page -= 1
-            self.show_current_page()
-
-    def get_caption(self, genus, subgenus, species):
-        """Return formatted caption string based on subgenus toggle."""
-        if self.show_subgenus_var.get() and subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan':
-            return f"{genus} ({subgenus}) {species}"
-        else:
-            return f"{genus} {species}"
+            self.gallery.scroll_to((self.current_page - 1) * self.maps_per_page)
 
     def regenerate_maps_with_new_subgenus_setting(self):
-        """Regenerate maps when subgenus checkbox is toggled."""
-        if self.generated_maps:  # Only regenerate if maps already exist
-            # Store current page
-            current_page = self.current_page
-            # Regenerate maps
-            self.generate_map()
-            # Restore current page
-            self.current_page = current_page
-            # Show current page
-            self.show_current_page()
-
-    def render_complex_caption(self, ax, genus, subgenus, species, x, y, show_subgenus, font_size=11):
-        """Render caption with complex styling (italic genus, italic subgenus in parentheses, italic species)."""
-        # Draw the canvas to get the renderer
-        ax.figure.canvas.draw()
-        renderer = ax.figure.canvas.get_renderer()
-
-        def get_text_width(text, fontstyle='normal', fontname='Times New Roman', fontsize=font_size):
-            t = ax.text(0, 0, text, fontname=fontname, fontstyle=fontstyle, fontsize=fontsize, transform=ax.transAxes)
-            bb = t.get_window_extent(renderer=renderer)
-            inv = ax.transAxes.inverted()
-            bb_axes = inv.transform([(bb.x0, bb.y0), (bb.x1, bb.y1)])
-            width = bb_axes[1][0] - bb_axes[0][0]
-            t.remove()
-            return width
-
-        # Start at the specified x position
-        cur_x = x
-        # Genus (italic)
-        ax.text(cur_x, y, f"{genus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        cur_x += get_text_width(f"{genus}", fontstyle='italic')
-        # Subgenus (optional)
-        if show_subgenus and subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan':
-            ax.text(cur_x, y, " (", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += get_text_width(" (", fontstyle='normal')
-            ax.text(cur_x, y, f"{subgenus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-            cur_x += get_text_width(f"{subgenus}", fontstyle='italic')
-            ax.text(cur_x, y, ")", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += get_text_width(")", fontstyle='normal')
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        else:
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-            
-    # def render_complex_caption_for_download(self, ax, genus, subgenus, species, x, y, show_subgenus, font_size=11):
-    #     """Render caption with complex styling (italic genus, italic subgenus in parentheses, italic species)."""
-    #     # Draw the canvas to get the renderer
-    #     ax.figure.canvas.draw()
-    #     renderer = ax.figure.canvas.get_renderer()
-
-    #     def get_text_width(text, fontstyle='normal', fontname='Times New Roman', fontsize=font_size):
-    #         t = ax.text(0, 0, text, fontname=fontname, fontstyle=fontstyle, fontsize=fontsize, transform=ax.transAxes)
-    #         bb = t.get_window_extent(renderer=renderer)
-    #         inv = ax.transAxes.inverted()
-    #         bb_axes = inv.transform([(bb.x0, bb.y0), (bb.x1, bb.y1)])
-    #         width = bb_axes[1][0] - bb_axes[0][0]
-    #         t.remove()
-    #         return width
-
-    #     # Start at the specified x position
-    #     cur_x = x
-    #     # Genus (italic)
-    #     ax.text(cur_x, y, f"{genus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-    #     cur_x += (get_text_width(f"{genus}", fontstyle='italic') * 0.716)
-    #     # Subgenus (optional)
-    #     if show_subgenus and subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan':
-    #         ax.text(cur_x, y, " (", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-    #         cur_x += (get_text_width(" (", fontstyle='normal') - 0.01)
-    #         ax.text(cur_x, y, f"{subgenus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-    #         cur_x += (get_text_width(f"{subgenus}", fontstyle='italic') * 0.67)
-    #         ax.text(cur_x, y, ")", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-    #         cur_x += get_text_width(")", fontstyle='normal')
-    #         ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-    #     else:
-    #         ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-
-    def render_complex_caption_for_download_svg(self, ax, genus, subgenus, species, x, y, show_subgenus, font_size=11):
-        """Render caption with complex styling for SVG format (italic genus, italic subgenus in parentheses, italic species)."""
-        # Draw the canvas to get the renderer
-        ax.figure.canvas.draw()
-        renderer = ax.figure.canvas.get_renderer()
-
-        def get_text_width(text, fontstyle='normal', fontname='Times New Roman', fontsize=font_size):
-            t = ax.text(0, 0, text, fontname=fontname, fontstyle=fontstyle, fontsize=fontsize, transform=ax.transAxes)
-            bb = t.get_window_extent(renderer=renderer)
-            inv = ax.transAxes.inverted()
-            bb_axes = inv.transform([(bb.x0, bb.y0), (bb.x1, bb.y1)])
-            width = bb_axes[1][0] - bb_axes[0][0]
-            t.remove()
-            return width
-
-        # Start at the specified x position
-        cur_x = x
-        # Genus (italic)
-        ax.text(cur_x, y, f"{genus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        cur_x += (get_text_width(f"{genus}", fontstyle='italic') * 0.716)
-        # Subgenus (optional)
-        if show_subgenus and subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan':
-            ax.text(cur_x, y, " (", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += (get_text_width(" (", fontstyle='normal') - 0.021)
-            ax.text(cur_x, y, f"{subgenus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-            cur_x += (get_text_width(f"{subgenus}", fontstyle='italic') * 0.67)
-            ax.text(cur_x, y, ")", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += get_text_width(")", fontstyle='normal')
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        else:
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-
-    def render_complex_caption_for_download_tiff(self, ax, genus, subgenus, species, x, y, show_subgenus, font_size=11):
-        """Render caption with complex styling for TIFF format (italic genus, italic subgenus in parentheses, italic species)."""
-        # Draw the canvas to get the renderer
-        ax.figure.canvas.draw()
-        renderer = ax.figure.canvas.get_renderer()
-
-        def get_text_width(text, fontstyle='normal', fontname='Times New Roman', fontsize=font_size):
-            t = ax.text(0, 0, text, fontname=fontname, fontstyle=fontstyle, fontsize=fontsize, transform=ax.transAxes)
-            bb = t.get_window_extent(renderer=renderer)
-            inv = ax.transAxes.inverted()
-            bb_axes = inv.transform([(bb.x0, bb.y0), (bb.x1, bb.y1)])
-            width = bb_axes[1][0] - bb_axes[0][0]
-            t.remove()
-            return width
-
-        # Start at the specified x position
-        cur_x = x
-        # Genus (italic)
-        ax.text(cur_x, y, f"{genus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        cur_x += (get_text_width(f"{genus}", fontstyle='italic') * 0.716)
-        # Subgenus (optional)
-        if show_subgenus and subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan':
-            ax.text(cur_x, y, " (", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += (get_text_width(" (", fontstyle='normal') - 0.01)
-            ax.text(cur_x, y, f"{subgenus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-            cur_x += (get_text_width(f"{subgenus}", fontstyle='italic') * 0.67)
-            ax.text(cur_x, y, ")", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += get_text_width(")", fontstyle='normal')
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        else:
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-
-    def render_complex_caption_for_download_jpg(self, ax, genus, subgenus, species, x, y, show_subgenus, font_size=11):
-        """Render caption with complex styling for JPG format (italic genus, italic subgenus in parentheses, italic species)."""
-        # Draw the canvas to get the renderer
-        ax.figure.canvas.draw()
-        renderer = ax.figure.canvas.get_renderer()
-
-        def get_text_width(text, fontstyle='normal', fontname='Times New Roman', fontsize=font_size):
-            t = ax.text(0, 0, text, fontname=fontname, fontstyle=fontstyle, fontsize=fontsize, transform=ax.transAxes)
-            bb = t.get_window_extent(renderer=renderer)
-            inv = ax.transAxes.inverted()
-            bb_axes = inv.transform([(bb.x0, bb.y0), (bb.x1, bb.y1)])
-            width = bb_axes[1][0] - bb_axes[0][0]
-            t.remove()
-            return width
-
-        # Start at the specified x position
-        cur_x = x
-        # Genus (italic)
-        ax.text(cur_x, y, f"{genus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        cur_x += (get_text_width(f"{genus}", fontstyle='italic') * 0.716)
-        # Subgenus (optional)
-        if show_subgenus and subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan':
-            ax.text(cur_x, y, " (", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += (get_text_width(" (", fontstyle='normal') - 0.01)
-            ax.text(cur_x, y, f"{subgenus}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-            cur_x += (get_text_width(f"{subgenus}", fontstyle='italic') * 0.67)
-            ax.text(cur_x, y, ")", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='normal', transform=ax.transAxes)
-            cur_x += get_text_width(")", fontstyle='normal')
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
-        else:
-            ax.text(cur_x, y, f" {species}", ha='left', va='bottom', fontsize=font_size, fontname='Times New Roman', fontstyle='italic', transform=ax.transAxes)
+        """Re-lay out captions when the subgenus checkbox is toggled."""
+        if self.generated_maps:  # Only restyle if maps already exist
+            # Only captions change; previews of species without a subgenus stay cached
+            self.generated_show_subgenus = self.show_subgenus_var.get()
+            self.gallery.refresh()
+
+def parse_args(argv):
+    """Parse command-line arguments for headless map generation."""
+    load_engine()
+    parser = argparse.ArgumentParser(
+        description="Generate Montana species distribution map pages without the GUI."
+    )
+    parser.add_argument("input", help="Occurrence file (.xlsx, .csv, .tsv, .parquet or .feather/.arrow)")
+    parser.add_argument("--family", default="All", help='Family to map, or "All" (default: All)')
+    parser.add_argument("--genus", default="All", help='Genus to map, or "All" (default: All)')
+    parser.add_argument("--format", choices=engine.EXPORT_FORMATS, default="tiff", help="Page format (default: tiff)")
+    parser.add_argument("--output", default=".", help="Output directory (default: current directory)")
+    parser.add_argument("--zip", action="store_true", help="Write all pages into a single ZIP archive")
+    parser.add_argument("--zip-compression", choices=list(engine.ZIP_COMPRESSION), default="stored",
+                        help="Compression for --zip archives (default: stored)")
+    parser.add_argument("--workers", type=int, default=1, help="Pages rendered in parallel processes (default: 1)")
+    parser.add_argument("--split-year", default="", help="Split records by collection year")
+    parser.add_argument("--pre-year-color", default="green")
+    parser.add_argument("--post-year-color", default="red")
+    parser.add_argument("--single-color", default="grey")
+    parser.add_argument("--no-subgenus", action="store_true", help="Leave subgenus out of captions")
+    parser.add_argument("--shapefile", default=None, help="County shapefile (default: bundled County.shp)")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the ingest cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the ingest cache before loading")
+    parser.add_argument("--profile", action="store_true",
+                        help="Save a .pstats profile and collapsed stacks of the run to the output directory "
+                             "(also set by MSDM_PROFILE=1)")
+    return parser.parse_args(argv)
+
+
+def run_cli(argv):
+    """Run the ingest -> filter -> render -> export pipeline on the Agg backend."""
+    import matplotlib
+    matplotlib.use("Agg")
+    args = parse_args(argv)
+    if not (args.profile or engine.profiling_enabled()):
+        return run_pipeline(args)
+    profiler = engine.Profiler("cli", args.output)
+    try:
+        with profiler:
+            return run_pipeline(args)
+    finally:
+        profiler.save()
+
+
+def run_pipeline(args):
+    """Load, filter, render and export as set by the parsed command-line arguments."""
+    colors = engine.ColorSettings(args.pre_year_color, args.post_year_color, args.single_color, args.split_year)
+    for color_name, color_value in colors.invalid_colors():
+        print(f"Invalid {color_name}: '{color_value}'", file=sys.stderr)
+        return 2
+
+    gdf, template = engine.load_county_geometry(args.shapefile)
+
+    def on_rows_read(rows_read, total_rows):
+        print(f"Read {rows_read:,} rows")
+
+    ingest_cache = None if args.no_cache else engine.default_ingest_cache()
+    if args.clear_cache and ingest_cache is not None:
+        freed = ingest_cache.clear()
+        print(f"Cleared ingest cache ({freed / (1024 * 1024):.1f} MB)")
+    try:
+        df = engine.load_occurrences(args.input, engine.valid_county_names(gdf), progress=on_rows_read,
+                                     cache=ingest_cache)
+    except engine.DataValidationError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    filtered = engine.TaxonomyIndex(df).filter(args.family, args.genus)
+    species_maps, _ = engine.build_species_maps(filtered, gdf, colors)
+    if not species_maps:
+        print("No species found for the selected Family and Genus combination.", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    fam = args.family.strip().title()
+    gen = args.genus.strip().title()
+    timestamp = engine.export_timestamp()
+    show_subgenus = not args.no_subgenus
+    pages = engine.page_count(len(species_maps))
+
+    def on_progress(page, total):
+        print(f"Saved page {page + 1} of {total}")
+
+    if args.zip:
+        zip_path = os.path.join(args.output, f"{fam}-{gen}-{timestamp}.zip")
+        engine.export_all_zip(zip_path, species_maps, template, fam, gen, colors, args.format,
+                              show_subgenus, timestamp=timestamp, progress=on_progress,
+                              compression=args.zip_compression, workers=args.workers)
+        print(f"✅ {len(species_maps)} maps on {pages} pages saved as ZIP: {zip_path}")
+    else:
+        engine.export_pages(args.output, species_maps, template, fam, gen, colors, args.format,
+                            show_subgenus, timestamp=timestamp, progress=on_progress, workers=args.workers)
+        print(f"✅ {len(species_maps)} maps on {pages} pages saved to {args.output}")
+    return 0
+
 
 if __name__ == "__main__":
+    # Needed for render worker processes in the frozen Windows build
+    multiprocessing.freeze_support()
+    if sys.argv[1:] == ["--profile"]:
+        # Start the GUI with every load, generation and download profiled
+        os.environ["MSDM_PROFILE"] = "1"
+    elif len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     app = MainApplication()
\ No newline at end of file
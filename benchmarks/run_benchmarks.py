@@ -0,0 +1,235 @@
+"""
+Headless benchmarks of the mapping pipeline.
+
+A synthetic dataset (see synthetic_occurrences.py) is written once, then each
+stage the GUI runs is timed on the Agg backend:
+
+    geometry        load_county_geometry, from the shapefile and from the cache
+    load            load_occurrences as "Load Data File" runs it, uncached and cached
+    generate        Family/Genus filter, species x county matrix and map specs ("Generate Maps")
+    thumbnails      draw the previews of the first page from the label raster (the map gallery)
+    thumbnails_vector   render them as full figures at size (MSDM_PREVIEW_RENDERER=vector)
+    download_page   the first page in each format ("Download Current Page")
+    download_all    every page in each format into a ZIP ("Download All Maps")
+
+Results are written as JSON with the dataset, library versions and every
+timing, so runs can be compared with --compare.
+
+Example:
+    python benchmarks/run_benchmarks.py --records 50000 --species 200 --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+from synthetic_occurrences import add_dataset_arguments, dataset_options, generate_occurrences, write_occurrences
+
+import species_map_engine as engine
+
+
+RESULTS_SCHEMA = 1
+# Preview size at the GUI's smallest panel width (see MapGallery.size_for_width)
+THUMBNAIL_SIZE = (173, 129)
+
+
+def library_versions():
+    """Return the versions of the libraries the timings depend on."""
+    versions = {"python": platform.python_version()}
+    for name in ("numpy", "pandas", "geopandas", "shapely", "matplotlib", "PIL", "pyarrow", "openpyxl"):
+        try:
+            module = __import__(name)
+        except ImportError:
+            versions[name] = None
+            continue
+        versions[name] = getattr(module, "__version__", None)
+    return versions
+
+
+class Benchmark:
+    """Times named stages and collects the results."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def time(self, stage, func, fmt=None, items=None, repeat=None):
+        """
+        Run func repeat times and record the wall-clock seconds of each run.
+
+        Args:
+            stage: Stage name
+            func: Callable taking no arguments; setup belongs outside it
+            fmt: Export format the stage ran in, if any
+            items: Number of records, maps or pages processed per run
+            repeat: Number of runs (default: the benchmark's repeat)
+
+        Returns:
+            The last run's return value
+        """
+        seconds = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            result = func()
+            seconds.append(time.perf_counter() - start)
+        entry = {
+            "stage": stage,
+            "format": fmt,
+            "items": items,
+            "seconds": seconds,
+            "min": min(seconds),
+            "median": statistics.median(seconds),
+        }
+        self.results.append(entry)
+        label = stage if fmt is None else f"{stage} [{fmt}]"
+        print(f"{label:<28} min {entry['min']:8.3f} s   median {entry['median']:8.3f} s")
+        return result
+
+
+def raster_thumbnails(species_maps, template, family, genus, colors, show_subgenus, size=THUMBNAIL_SIZE):
+    """Draw one page of previews the way AnalysisScreen.render_thumbnails does with the raster renderer."""
+    return [engine.render_species_thumbnail(species_map, template, family, genus, colors, i, show_subgenus, size)
+            for i, species_map in enumerate(species_maps)]
+
+
+def vector_thumbnails(species_maps, template, family, genus, colors, show_subgenus, size=THUMBNAIL_SIZE):
+    """Render one page of previews the way AnalysisScreen.render_thumbnails does with the vector renderer."""
+    return engine.render_species_images(species_maps, template, family, genus, colors, show_subgenus, size)
+
+
+def run(args, work_dir):
+    options = dataset_options(args)
+    print(f"Generating {args.records:,} records of {args.species} species...")
+    df = generate_occurrences(**options)
+    data_path = write_occurrences(df, os.path.join(work_dir, f"records{args.input_format}"))
+    bench = Benchmark(args.repeat)
+
+    geometry_cache = os.path.join(work_dir, "geometry")
+
+    def load_geometry_uncached():
+        # Each run starts without a cache, so every run builds it
+        for path in engine._geometry_cache_paths(geometry_cache):
+            if os.path.exists(path):
+                os.remove(path)
+        return engine.load_county_geometry(cache_dir=geometry_cache)
+
+    bench.time("geometry", load_geometry_uncached, repeat=1)
+    gdf, template = bench.time("geometry_cached", lambda: engine.load_county_geometry(cache_dir=geometry_cache))
+    valid_counties = engine.valid_county_names(gdf)
+
+    records = bench.time("load", lambda: engine.load_occurrences(data_path, valid_counties), items=len(df))
+    ingest_cache = engine.IngestCache(os.path.join(work_dir, "ingest"))
+    engine.load_occurrences(data_path, valid_counties, cache=ingest_cache)
+    bench.time("load_cached", lambda: engine.load_occurrences(data_path, valid_counties, cache=ingest_cache),
+               items=len(df))
+
+    colors = engine.ColorSettings(split_year=args.split_year)
+    family, genus = "All", "All"
+
+    def generate():
+        taxonomy = engine.TaxonomyIndex(records)
+        matrix, _ = engine.build_species_matrix(taxonomy.filter(family, genus), template.county_names)
+        return engine.species_maps_from_matrix(matrix, colors)
+
+    species_maps = bench.time("generate", generate, items=df["species"].nunique())
+    show_subgenus = True
+    first_page = engine.page_maps(species_maps, 0)
+    bench.time("thumbnails", lambda: raster_thumbnails(first_page, template, family, genus, colors, show_subgenus),
+               items=len(first_page))
+    bench.time("thumbnails_vector",
+               lambda: vector_thumbnails(first_page, template, family, genus, colors, show_subgenus),
+               items=len(first_page))
+
+    pages = engine.page_count(len(species_maps))
+    out_dir = os.path.join(work_dir, "out")
+    os.makedirs(out_dir)
+    for fmt in args.formats:
+        page_path = os.path.join(out_dir, engine.page_filename(family, genus, "bench", 0, fmt))
+        bench.time("download_page", lambda: engine.export_page(
+            page_path, first_page, 0, template, family, genus, colors, fmt, show_subgenus), fmt=fmt, items=1)
+        zip_path = os.path.join(out_dir, f"all-{fmt}.zip")
+        bench.time("download_all", lambda: engine.export_all_zip(
+            zip_path, species_maps, template, family, genus, colors, fmt, show_subgenus,
+            timestamp="bench", workers=args.workers), fmt=fmt, items=pages, repeat=args.export_repeat)
+
+    return {
+        "schema": RESULTS_SCHEMA,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": library_versions(),
+        "dataset": dict(options, input_format=args.input_format, species_maps=len(species_maps), pages=pages),
+        "settings": {"repeat": args.repeat, "export_repeat": args.export_repeat, "workers": args.workers,
+                     "split_year": args.split_year},
+        "results": bench.results,
+    }
+
+
+def compare(baseline_path, current):
+    """Print each stage's median against the same stage in a saved run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    before = {(r["stage"], r["format"]): r for r in baseline["results"]}
+    if baseline["dataset"] != current["dataset"]:
+        print("Warning: the baseline was run on a different dataset; ratios are not comparable")
+    print(f"\n{'stage':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in current["results"]:
+        old = before.get((result["stage"], result["format"]))
+        label = result["stage"] if result["format"] is None else f"{result['stage']} [{result['format']}]"
+        if old is None:
+            print(f"{label:<28} {'-':>10} {result['median']:10.3f}")
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else float("inf")
+        print(f"{label:<28} {old['median']:10.3f} {result['median']:10.3f} {ratio:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the mapping pipeline on a synthetic dataset.")
+    add_dataset_arguments(parser)
+    parser.add_argument("--input-format", choices=sorted(engine.INPUT_FORMATS), default=".xlsx",
+                        help="File type the dataset is loaded from (default: .xlsx)")
+    parser.add_argument("--formats", nargs="+", choices=engine.EXPORT_FORMATS, default=list(engine.EXPORT_FORMATS),
+                        help="Export formats to time (default: all)")
+    parser.add_argument("--split-year", default="2000", help="Split year for the colors (default: 2000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (default: 3)")
+    parser.add_argument("--export-repeat", type=int, default=1, help="Runs of each full export (default: 1)")
+    parser.add_argument("--workers", type=int, default=1, help="Render processes for full exports (default: 1)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against the results in this JSON file")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated data and exports")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="msdm_bench_")
+    try:
+        results = run(args, work_dir)
+    finally:
+        if args.keep:
+            print(f"Data and exports kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results saved to {args.output}")
+    if args.compare:
+        compare(args.compare, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
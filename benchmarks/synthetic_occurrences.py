@@ -0,0 +1,166 @@
+"""
+Synthetic occurrence datasets for the benchmarks.
+
+Records use the real county names from County.shp, so every record survives
+the Montana filter unless asked otherwise. A fixed seed makes every dataset
+reproducible: the same arguments always write the same records.
+
+Example:
+    python benchmarks/synthetic_occurrences.py records.xlsx --records 50000 --species 300
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import species_map_engine as engine
+
+
+DEFAULT_SEED = 20240301
+
+
+def county_names(shapefile_path=None):
+    """Return the county names as spelled in the shapefile's NAME column."""
+    gdf = engine.load_counties(shapefile_path)
+    return sorted(gdf["NAME"].str.strip())
+
+
+def generate_occurrences(records=10000, species=100, counties=56, families=4, genera=12,
+                         year_coverage=0.8, year_range=(1900, 2024), subgenus=0.5,
+                         foreign=0.0, seed=DEFAULT_SEED, shapefile_path=None):
+    """
+    Return a DataFrame of synthetic occurrence records.
+
+    Species frequencies follow a Zipf-like curve and each species is found in
+    its own random subset of the counties, which gives the long tail of rare
+    species and patchy ranges seen in real collections.
+
+    Args:
+        records: Number of rows
+        species: Number of distinct species
+        counties: Number of Montana counties the records are spread over (1-56)
+        families: Number of families; genera are spread over them
+        genera: Number of genera; species are spread over them
+        year_coverage: Fraction of records with a collection year
+        year_range: (first, last) collection year
+        subgenus: Fraction of genera whose species carry a subgenus
+        foreign: Fraction of records in counties outside Montana (dropped at load)
+        seed: Random seed
+
+    Returns:
+        DataFrame: county, family, genus, subgenus, species and year columns
+    """
+    rng = np.random.default_rng(seed)
+    names = county_names(shapefile_path)
+    if not 1 <= counties <= len(names):
+        raise ValueError(f"counties must be between 1 and {len(names)}")
+    names = list(rng.choice(names, size=counties, replace=False))
+    genera = max(1, min(genera, species))
+    families = max(1, min(families, genera))
+
+    family_names = [f"Familia{i + 1:03d}idae" for i in range(families)]
+    genus_family = rng.integers(0, families, size=genera)
+    genus_family[:families] = np.arange(families)  # every family has a genus
+    genus_names = [f"Genus{i + 1:03d}" for i in range(genera)]
+    genus_has_subgenus = rng.random(genera) < subgenus
+    species_genus = rng.integers(0, genera, size=species)
+    species_genus[:genera] = np.arange(genera)  # every genus has a species
+    species_names = [f"epithet{i + 1:04d}" for i in range(species)]
+    species_subgenus = [
+        f"Subgenus{species_genus[i] + 1:03d}{'ab'[i % 2]}" if genus_has_subgenus[species_genus[i]] else None
+        for i in range(species)
+    ]
+
+    # Zipf-like species frequencies; every species gets at least one record
+    weights = 1.0 / np.arange(1, species + 1) ** 0.8
+    weights /= weights.sum()
+    species_idx = rng.choice(species, size=records, p=weights)
+    species_idx[:min(records, species)] = np.arange(min(records, species))
+
+    # Each species lives in a random share of the counties
+    range_size = rng.integers(1, counties + 1, size=species)
+    county_idx = np.floor(rng.random(records) * range_size[species_idx]).astype(int)
+    county_order = np.argsort(rng.random((species, counties)), axis=1)
+    county_idx = county_order[species_idx, county_idx]
+    county_col = np.array(names, dtype=object)[county_idx]
+    if foreign > 0:
+        county_col[rng.random(records) < foreign] = "Outside County"
+
+    years = rng.integers(year_range[0], year_range[1] + 1, size=records).astype(float)
+    years[rng.random(records) >= year_coverage] = np.nan
+
+    genus_idx = species_genus[species_idx]
+    return pd.DataFrame({
+        "county": county_col,
+        "family": np.array(family_names, dtype=object)[genus_family[genus_idx]],
+        "genus": np.array(genus_names, dtype=object)[genus_idx],
+        "subgenus": np.array(species_subgenus, dtype=object)[species_idx],
+        "species": np.array(species_names, dtype=object)[species_idx],
+        "year": pd.array(years, dtype="Int64"),
+    })
+
+
+def write_occurrences(df, path):
+    """Write records in the format given by the path's extension (see engine.INPUT_FORMATS)."""
+    kind = engine.INPUT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if kind == "excel":
+        df.to_excel(path, index=False)
+    elif kind == "csv":
+        df.to_csv(path, index=False)
+    elif kind == "tsv":
+        df.to_csv(path, index=False, sep="\t")
+    elif kind == "parquet":
+        df.to_parquet(path, index=False)
+    elif kind == "arrow":
+        df.to_feather(path)
+    else:
+        raise ValueError(f"Unsupported file type: {path}")
+    return path
+
+
+def add_dataset_arguments(parser):
+    """Add the dataset shape options shared with run_benchmarks.py."""
+    parser.add_argument("--records", type=int, default=10000, help="Number of records (default: 10000)")
+    parser.add_argument("--species", type=int, default=100, help="Number of species (default: 100)")
+    parser.add_argument("--counties", type=int, default=56, help="Counties the records cover, 1-56 (default: 56)")
+    parser.add_argument("--families", type=int, default=4, help="Number of families (default: 4)")
+    parser.add_argument("--genera", type=int, default=12, help="Number of genera (default: 12)")
+    parser.add_argument("--year-coverage", type=float, default=0.8,
+                        help="Fraction of records with a year (default: 0.8)")
+    parser.add_argument("--subgenus", type=float, default=0.5,
+                        help="Fraction of genera with subgenera (default: 0.5)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Random seed")
+
+
+def dataset_options(args):
+    """Return the generate_occurrences() keyword arguments given on the command line."""
+    return {
+        "records": args.records,
+        "species": args.species,
+        "counties": args.counties,
+        "families": args.families,
+        "genera": args.genera,
+        "year_coverage": args.year_coverage,
+        "subgenus": args.subgenus,
+        "seed": args.seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic occurrence file.")
+    parser.add_argument("output", help="Output file (.xlsx, .csv, .tsv, .parquet or .feather/.arrow)")
+    add_dataset_arguments(parser)
+    args = parser.parse_args(argv)
+    df = generate_occurrences(**dataset_options(args))
+    write_occurrences(df, args.output)
+    print(f"✅ Wrote {len(df):,} records of {df['species'].nunique()} species to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
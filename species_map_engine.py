@@ -0,0 +1,2229 @@
+"""
+Headless mapping engine for the Montana Multiple Species Distribution Mapper.
+
+Everything needed to go from a spreadsheet of occurrence records to finished
+map pages lives here, without any Tk dependency:
+
+    ingest -> filter -> per-species color vectors -> render -> export
+
+The desktop application (Montana_Multiple_Species_Distribution_Mapper.py) and
+its command-line mode both call into this module. Only the Agg canvas is used,
+so it runs on machines without a display.
+"""
+import atexit
+import collections
+import contextlib
+import datetime
+import functools
+import hashlib
+import io
+import json
+import os
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib as mpl
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PathCollection
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties, findfont
+from matplotlib.path import Path
+from matplotlib.textpath import text_to_path
+from matplotlib.transforms import ScaledTranslation
+
+REQUIRED_COLUMNS = ["county", "family", "genus", "species"]
+# Columns read from occurrence files; everything else in the sheet is skipped
+INGEST_COLUMNS = REQUIRED_COLUMNS + ["year", "subgenus"]
+# Columns stored as categoricals and indexed by TaxonomyIndex
+TAXONOMY_COLUMNS = ("family", "genus", "species")
+# Rows per chunk when streaming an input file
+INGEST_CHUNK_ROWS = 50000
+# Supported occurrence file types by extension
+INPUT_FORMATS = {
+    ".xlsx": "excel",
+    ".csv": "csv",
+    ".tsv": "tsv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "arrow",
+    ".arrow": "arrow",
+    ".ipc": "arrow",
+}
+EXPORT_FORMATS = ("tiff", "svg", "jpg")
+MAPS_PER_PAGE = 15
+PAGE_ROWS = 5
+PAGE_COLS = 3
+PAGE_FIGSIZE = (13.2, 19)
+SPECIES_FIGSIZE = (8, 6)
+THUMBNAIL_DPI = 100
+
+# Simplification tolerances for the county geometry levels of detail, as a
+# fraction of the state's width. Level 0 is the full-resolution shapefile.
+LOD_TOLERANCES = (0.0, 1 / 5000, 1 / 2000, 1 / 800)
+# Largest simplification error allowed on output, in pixels
+LOD_MAX_PIXEL_ERROR = 0.5
+# Output DPI each export format is drawn for; None keeps full detail for print
+EXPORT_LOD_DPI = {'tiff': None, 'svg': 300, 'jpg': 100}
+# Default memory cap of the preview thumbnail cache, overridable with the
+# MSDM_THUMBNAIL_CACHE_MB environment variable
+THUMBNAIL_CACHE_BYTES = int(float(os.environ.get("MSDM_THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024)
+CAPTION_FONT = 'Times New Roman'
+# Bump when the layout of the on-disk county geometry cache changes
+GEOMETRY_CACHE_VERSION = 1
+# Bump when ingest normalization or parsing changes, so older cached frames are not reused
+INGEST_CACHE_VERSION = 3
+# Default size cap of the on-disk ingest cache, overridable with the
+# MSDM_INGEST_CACHE_MB environment variable
+INGEST_CACHE_BYTES = int(float(os.environ.get("MSDM_INGEST_CACHE_MB", "512")) * 1024 * 1024)
+# Operation traces kept on disk (0 keeps none) and how often their memory is sampled
+TRACE_KEEP = int(os.environ.get("MSDM_TRACE_KEEP", "50"))
+TRACE_SAMPLE_SECONDS = 0.02
+TRACE_SCHEMA = 1
+# Stack sampling interval of Profiler
+PROFILE_SAMPLE_SECONDS = 0.005
+# "raster" draws previews from a county label image (see LabelRaster); "vector" renders full figures
+PREVIEW_RENDERER = os.environ.get("MSDM_PREVIEW_RENDERER", "raster")
+# Label images kept per CountyTemplate, one per preview size
+LABEL_RASTER_SIZES = 8
+# Shapefile parts whose size and modification time validate the geometry cache
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# Compression modes offered for "Download All" archives
+ZIP_COMPRESSION = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# County color codes used in species x county color matrices
+COLOR_NONE = 0
+COLOR_SINGLE = 1
+COLOR_PRE = 2
+COLOR_POST = 3
+
+# Settings applied while composing export pages. Text stays editable in SVG.
+EXPORT_RC = {
+    'font.family': 'serif',
+    'font.serif': ['Times New Roman', 'Times', 'DejaVu Serif', 'serif'],
+    'svg.fonttype': 'none',
+}
+
+# Held around every Matplotlib figure build and draw in this process. Pages are
+# exported on a worker thread while the Tk thread draws previews, and
+# rcParams, which rc_context() changes and restores, are shared by both.
+_mpl_lock = threading.RLock()
+
+class DataValidationError(Exception):
+    """Raised when an input workbook cannot be used for mapping."""
+
+
+class OperationCancelled(Exception):
+    """Raised when a long-running operation is cancelled between steps."""
+
+
+def check_cancelled(cancel):
+    """Raise OperationCancelled if the cancel event (threading.Event or None) is set."""
+    if cancel is not None and cancel.is_set():
+        raise OperationCancelled()
+
+
+@functools.lru_cache(maxsize=None)
+def _windows_memory_reader():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")
+        ]
+
+    get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+
+    def read():
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        if not get_info(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+
+    return read
+
+
+def process_memory():
+    """Return this process's resident memory in bytes, or None where it cannot be read."""
+    if sys.platform == "win32":
+        return _windows_memory_reader()()
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Trace that span() records into, per thread (see Trace)
+_trace_state = threading.local()
+
+
+def span(name, **meta):
+    """
+    Time a stage in the current thread's active Trace.
+
+    Without an active trace this returns a shared no-op context manager, so
+    spans left in hot paths cost next to nothing when nobody is tracing.
+    """
+    trace = getattr(_trace_state, "trace", None)
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, meta)
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def _mb(nbytes):
+    return None if nbytes is None else round(nbytes / (1024 * 1024), 1)
+
+
+class _Span:
+    def __init__(self, trace, name, meta):
+        self.trace = trace
+        self.record = {"name": name, **meta}
+
+    def __enter__(self):
+        trace = self.trace
+        rss = process_memory()
+        with trace._lock:
+            self.record.update(start=time.perf_counter() - trace._t0, depth=len(trace._open),
+                               thread=threading.current_thread().name, rss_start=rss, peak_rss=rss)
+            trace.spans.append(self.record)
+            trace._open.append(self.record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        trace = self.trace
+        self.record["seconds"] = time.perf_counter() - trace._t0 - self.record["start"]
+        rss = process_memory()
+        trace._record_memory(rss)
+        with trace._lock:
+            self.record["rss_end"] = rss
+            trace._open.remove(self.record)
+        return False
+
+
+class Trace:
+    """
+    Wall time and memory of the stages of one operation (load, generate, export).
+
+    Entering a trace makes it the active trace of the current thread, and
+    every span() entered on that thread meanwhile is recorded with its start
+    offset, duration, nesting depth and resident memory at start, at end and
+    at its peak. A sampler thread reads the memory every TRACE_SAMPLE_SECONDS
+    while the trace is open. Work done in render worker processes is not
+    broken down; the parent's span around it covers it. A trace can be
+    entered again to add more work to it, e.g. every preview fill of one
+    gallery: spans keep their offsets from the first entry, and seconds is
+    the time spent inside the trace over all entries.
+
+    Args:
+        operation: Name of the operation, e.g. "Generate maps"
+        **meta: Details saved with the trace (file name, species count, ...)
+    """
+
+    def __init__(self, operation, **meta):
+        self.operation = operation
+        self.meta = meta
+        self.spans = []
+        self.outcome = None
+        self.started_at = None
+        self.seconds = None
+        self.peak_rss = None
+        self._t0 = None
+        self._entered = None
+        self._open = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._previous = None
+
+    def __enter__(self):
+        self._entered = time.perf_counter()
+        if self.started_at is None:
+            self.started_at = datetime.datetime.now()
+            self._t0 = self._entered
+        self._previous = getattr(_trace_state, "trace", None)
+        _trace_state.trace = self
+        self._stop.clear()
+        self._record_memory(process_memory())
+        if self.peak_rss is not None:
+            self._sampler = threading.Thread(target=self._sample, name="trace-memory", daemon=True)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _trace_state.trace = self._previous
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self._record_memory(process_memory())
+        self.seconds = (self.seconds or 0.0) + time.perf_counter() - self._entered
+        if exc_type is None:
+            self.outcome = "ok"
+        elif issubclass(exc_type, OperationCancelled):
+            self.outcome = "cancelled"
+        else:
+            self.outcome = f"error: {exc}"
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(TRACE_SAMPLE_SECONDS):
+            self._record_memory(process_memory())
+
+    def _record_memory(self, rss):
+        if rss is None:
+            return
+        with self._lock:
+            if self.peak_rss is None or rss > self.peak_rss:
+                self.peak_rss = rss
+            for record in self._open:
+                if record["peak_rss"] is None or rss > record["peak_rss"]:
+                    record["peak_rss"] = rss
+
+    def stage_totals(self):
+        """Return [(name, count, seconds)] of the finished spans, slowest total first."""
+        totals = {}
+        for record in self.spans:
+            if "seconds" not in record:
+                continue
+            count, seconds = totals.get(record["name"], (0, 0.0))
+            totals[record["name"]] = (count + 1, seconds + record["seconds"])
+        return sorted(((name, count, seconds) for name, (count, seconds) in totals.items()),
+                      key=lambda item: item[2], reverse=True)
+
+    def summary(self, stages=3):
+        """Return a one-line summary: total time, peak memory and the slowest stages."""
+        text = f"{self.operation}: {self.seconds:.2f} s"
+        if self.outcome not in (None, "ok"):
+            text += f" ({self.outcome.split(':')[0]})"
+        if self.peak_rss is not None:
+            text += f", peak {_mb(self.peak_rss):,.0f} MB"
+        slowest = [f"{name} {seconds:.2f} s" for name, count, seconds in self.stage_totals()[:stages]]
+        if slowest:
+            text += " • " + ", ".join(slowest)
+        return text
+
+    def to_dict(self):
+        """Return the trace as JSON-serializable data; memory is in MB."""
+        spans = []
+        for record in self.spans:
+            record = dict(record)
+            for field in ("rss_start", "rss_end", "peak_rss"):
+                record[field] = _mb(record.get(field))
+            spans.append(record)
+        return {
+            "schema": TRACE_SCHEMA,
+            "operation": self.operation,
+            "meta": self.meta,
+            "started": self.started_at.isoformat(timespec="milliseconds") if self.started_at else None,
+            "seconds": self.seconds,
+            "outcome": self.outcome,
+            "peak_rss_mb": _mb(self.peak_rss),
+            "stages": [{"name": name, "count": count, "seconds": seconds}
+                       for name, count, seconds in self.stage_totals()],
+            "spans": spans,
+        }
+
+    def save(self, trace_dir=None, keep=TRACE_KEEP):
+        """
+        Write the trace as JSON to trace_dir (default: get_trace_dir()).
+
+        Only the newest keep traces are kept. Tracing never fails the traced
+        operation: a trace that cannot be written is reported and skipped.
+
+        Returns:
+            str: The path written, or None
+        """
+        if keep <= 0 or self.started_at is None:
+            return None
+        if trace_dir is None:
+            trace_dir = get_trace_dir()
+        slug = "".join(c if c.isalnum() else "-" for c in self.operation.lower())
+        path = os.path.join(trace_dir, f"{self.started_at:%Y%m%d-%H%M%S-%f}-{slug}.json")
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=1, default=str)
+            traces = sorted(name for name in os.listdir(trace_dir) if name.endswith(".json"))
+            for name in traces[:-keep]:
+                os.remove(os.path.join(trace_dir, name))
+        except OSError as e:
+            print(f"Warning: could not save trace: {e}")
+            return None
+        return path
+
+
+def profiling_enabled():
+    """Return True when MSDM_PROFILE is set to anything but 0/false/no."""
+    return os.environ.get("MSDM_PROFILE", "").strip().lower() not in ("", "0", "false", "no")
+
+
+def _frame_label(code):
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """
+    Profile of one operation, for attaching to a report of a slow run.
+
+    While entered, the calling thread runs under cProfile, and a sampler
+    thread records that thread's Python stack every PROFILE_SAMPLE_SECONDS.
+    save() writes the cProfile statistics as .pstats (for pstats or
+    snakeviz) and the samples as collapsed stacks, one "root;...;leaf count"
+    line per distinct stack (for flamegraph.pl or speedscope). Work done in
+    render worker processes is not profiled; the parent waiting on it is.
+
+    Args:
+        operation: Name of the operation; used in the file names
+        output_dir: Folder the files are saved in
+    """
+
+    def __init__(self, operation, output_dir, interval=PROFILE_SAMPLE_SECONDS):
+        self.operation = operation
+        self.output_dir = output_dir
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.started_at = None
+        self._profile = None
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        import cProfile
+        self.started_at = datetime.datetime.now()
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._sampler.start()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self):
+        """
+        Write the .pstats and collapsed-stack files to output_dir.
+
+        Returns:
+            list: The paths written; empty if the files could not be written
+        """
+        slug = "".join(c if c.isalnum() else "-" for c in self.operation.lower())
+        base = os.path.join(self.output_dir, f"profile-{slug}-{self.started_at:%Y%m%d-%H%M%S}")
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._profile.dump_stats(base + ".pstats")
+            with open(base + "-stacks.txt", "w", encoding="utf-8") as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        except OSError as e:
+            print(f"Warning: could not save profile: {e}")
+            return []
+        print(f"✅ Profile saved to {base}.pstats and {base}-stacks.txt")
+        return [base + ".pstats", base + "-stacks.txt"]
+
+
+def get_base_dir():
+    """Return the directory bundled data files are read from (script or exe)."""
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_cache_dir():
+    """
+    Return the folder for on-disk caches.
+
+    The folder sits next to the executable (or the script when not frozen);
+    set MSDM_CACHE_DIR to put it elsewhere.
+    """
+    if os.environ.get("MSDM_CACHE_DIR"):
+        return os.environ["MSDM_CACHE_DIR"]
+    if getattr(sys, 'frozen', False):
+        return os.path.join(os.path.dirname(sys.executable), "cache")
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+
+def get_trace_dir():
+    """Return the folder operation traces are saved in (MSDM_TRACE_DIR, or traces in the cache folder)."""
+    return os.environ.get("MSDM_TRACE_DIR") or os.path.join(get_cache_dir(), "traces")
+
+
+def get_shapefile_path():
+    """Return the path of the Montana county shapefile."""
+    return os.path.join(get_base_dir(), "MontanaCounties_shp", "County.shp")
+
+
+def standardize_county_names(county_series):
+    """
+    Standardize county names by:
+    1. Converting '&' to 'and'
+    2. Stripping whitespace
+    3. Converting to lowercase
+    """
+    return county_series.str.strip().str.lower().str.replace('&', 'and')
+
+
+def get_figure_number(map_index):
+    """
+    Calculate figure number based on map index.
+    Maps 1-26: Figure 1A, 1B, 1C, ..., 1Z
+    Maps 27-52: Figure 2A, 2B, 2C, ..., 2Z
+    And so on...
+    """
+    group_number = (map_index // 26) + 1
+    letter = string.ascii_uppercase[map_index % 26]
+    return f"Figure {group_number}{letter}."
+
+
+def load_counties(shapefile_path=None):
+    """
+    Read the county shapefile and add the normalized "County" name column.
+
+    Returns:
+        GeoDataFrame: One row per Montana county
+    """
+    import geopandas as gpd
+
+    if shapefile_path is None:
+        shapefile_path = get_shapefile_path()
+    if not os.path.exists(shapefile_path):
+        raise FileNotFoundError(
+            f"Shapefile not found at:\n{shapefile_path}\n\n"
+            "Please ensure the MontanaCounties_shp folder is in the correct location."
+        )
+    try:
+        gdf = gpd.read_file(shapefile_path)
+        gdf.columns = gdf.columns.str.strip()
+        gdf["County"] = gdf["NAME"].str.strip().str.lower()
+        gdf["Color"] = "white"
+    except Exception as e:
+        raise Exception(f"Error loading shapefile:\n{str(e)}\n\nPlease ensure the shapefile is not corrupted and try again.")
+    return gdf
+
+
+def valid_county_names(gdf):
+    """Return the set of standardized county names in the shapefile."""
+    return set(standardize_county_names(gdf["County"]))
+
+
+def _check_columns(columns):
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise DataValidationError(
+            f"Missing required columns: {', '.join(missing_columns)}\n\n"
+            "The following columns are required:\n"
+            "- county: for mapping locations\n"
+            "- family: for taxonomic classification\n"
+            "- genus: for taxonomic classification\n"
+            "- species: for taxonomic classification\n\n"
+            "Please check your file and try again."
+        )
+
+
+def _normalize_occurrences(df):
+    """Standardize county names, taxonomy columns and the year column in place."""
+    df["county"] = standardize_county_names(df["county"].astype(str))
+    for col in ["family", "genus", "species"]:
+        # Blank cells arrive as None from openpyxl and pyarrow; astype(str) would
+        # turn them into the name "none" under pandas 2, so they stay missing
+        values = df[col]
+        df[col] = values.astype(str).str.strip().str.lower().where(values.notna())
+    if "year" in df.columns:
+        # Invalid values become NaN
+        df["year"] = pd.to_numeric(df["year"], errors='coerce')
+    else:
+        df["year"] = float('nan')
+    return df
+
+
+def _iter_workbook_chunks(path, chunk_rows=INGEST_CHUNK_ROWS, progress=None):
+    """
+    Stream the first sheet of a workbook as DataFrames of the INGEST_COLUMNS.
+
+    The workbook is opened read-only, so only the current chunk of rows is
+    held in memory, and cells outside the wanted columns are never converted.
+    The size the sheet records (its <dimension>) is often stale, so every
+    row is read whatever it says, as read_excel does.
+
+    Args:
+        path: Path to the .xlsx file
+        chunk_rows: Rows per yielded DataFrame
+        progress: Optional callback(rows_read, total_rows); total_rows is
+            the row count the sheet records, which is only an estimate, or
+            None when it is missing or already exceeded
+
+    Yields:
+        DataFrame: The next chunk, indexed by row number like read_excel
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total_rows = sheet.max_row - 1 if sheet.max_row else None
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else "" for name in next(rows, ())]
+        _check_columns(header)
+
+        # First occurrence of each wanted column
+        positions = {}
+        for position, name in enumerate(header):
+            if name in INGEST_COLUMNS and name not in positions:
+                positions[name] = position
+        columns = list(positions)
+        indices = list(positions.values())
+        width = max(indices) + 1
+
+        def pick(row):
+            # Read-only rows stop at the last filled cell
+            if len(row) >= width:
+                return [row[i] for i in indices]
+            return [row[i] if i < len(row) else None for i in indices]
+
+        rows_read = 0
+        buffer = []
+        for row in rows:
+            buffer.append(pick(row))
+            if len(buffer) == chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns, index=pd.RangeIndex(rows_read, rows_read + len(buffer)))
+                rows_read += len(buffer)
+                buffer = []
+                if progress:
+                    progress(rows_read, total_rows if total_rows and total_rows >= rows_read else None)
+        if buffer or rows_read == 0:
+            yield pd.DataFrame(buffer, columns=columns, index=pd.RangeIndex(rows_read, rows_read + len(buffer)))
+            rows_read += len(buffer)
+            if progress:
+                progress(rows_read, rows_read)
+    finally:
+        workbook.close()
+
+
+def _ingest_column_map(names):
+    """Map each wanted column (stripped name) to its first header as written in the file."""
+    _check_columns([str(name).strip() for name in names])
+    columns = {}
+    for name in names:
+        stripped = str(name).strip()
+        if stripped in INGEST_COLUMNS and stripped not in columns:
+            columns[stripped] = name
+    return columns
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _require_pyarrow(kind):
+    if not _has_pyarrow():
+        raise DataValidationError(
+            f"Reading {kind} files requires the pyarrow package.\n\n"
+            "Install it with: pip install pyarrow"
+        )
+
+
+def _iter_delimited_chunks(path, sep, chunk_rows=INGEST_CHUNK_ROWS, progress=None):
+    """
+    Read the INGEST_COLUMNS of a CSV or TSV file.
+
+    With pyarrow installed the file is parsed by its multithreaded reader in
+    one pass; otherwise pandas' C parser streams it in chunks.
+
+    Yields:
+        DataFrame: The file, or the next chunk of it
+    """
+    header = pd.read_csv(path, sep=sep, nrows=0).columns
+    columns = _ingest_column_map(header)
+    rename = {original: stripped for stripped, original in columns.items()}
+    if _has_pyarrow():
+        df = pd.read_csv(path, sep=sep, usecols=list(columns.values()), engine="pyarrow")
+        if progress:
+            progress(len(df), len(df))
+        yield df.rename(columns=rename)
+        return
+    rows_read = 0
+    for chunk in pd.read_csv(path, sep=sep, usecols=list(columns.values()), chunksize=chunk_rows):
+        rows_read += len(chunk)
+        if progress:
+            progress(rows_read, None)
+        yield chunk.rename(columns=rename)
+
+
+def _iter_parquet_chunks(path, chunk_rows=INGEST_CHUNK_ROWS, progress=None):
+    """
+    Stream the INGEST_COLUMNS of a Parquet file in record batches.
+
+    Only the wanted column chunks are decoded.
+
+    Yields:
+        DataFrame: The next batch, indexed by row number
+    """
+    _require_pyarrow("Parquet")
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    columns = _ingest_column_map(parquet_file.schema_arrow.names)
+    total_rows = parquet_file.metadata.num_rows
+    rows_read = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=list(columns.values()), use_threads=True):
+        chunk = batch.to_pandas()
+        chunk.columns = list(columns)
+        chunk.index = pd.RangeIndex(rows_read, rows_read + len(chunk))
+        rows_read += len(chunk)
+        if progress:
+            progress(rows_read, total_rows)
+        yield chunk
+    if rows_read == 0:
+        yield pd.DataFrame(columns=list(columns))
+
+
+def _iter_arrow_chunks(path, progress=None):
+    """
+    Read the INGEST_COLUMNS of an Arrow IPC (Feather v2) file.
+
+    The file is memory-mapped, so columns that are not wanted are never read.
+
+    Yields:
+        DataFrame: The selected columns
+    """
+    _require_pyarrow("Arrow/Feather")
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    with pa.memory_map(path) as source:
+        names = pa.ipc.open_file(source).schema.names
+    columns = _ingest_column_map(names)
+    table = feather.read_table(path, columns=list(columns.values()), memory_map=True)
+    df = table.to_pandas()
+    df.columns = list(columns)
+    if progress:
+        progress(len(df), len(df))
+    yield df
+
+
+def _iter_occurrence_chunks(path, streaming=True, progress=None):
+    """Return an iterable of INGEST_COLUMNS DataFrames for any supported file type."""
+    kind = INPUT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise DataValidationError(
+            f"Unsupported file type: {os.path.basename(path)}\n\n"
+            f"Supported types: {', '.join(sorted(INPUT_FORMATS))}"
+        )
+    if kind == "csv":
+        return _iter_delimited_chunks(path, ",", progress=progress)
+    if kind == "tsv":
+        return _iter_delimited_chunks(path, "\t", progress=progress)
+    if kind == "parquet":
+        return _iter_parquet_chunks(path, progress=progress)
+    if kind == "arrow":
+        return _iter_arrow_chunks(path, progress=progress)
+    if streaming:
+        return _iter_workbook_chunks(path, progress=progress)
+    df = pd.read_excel(path, sheet_name=0, usecols=lambda name: str(name).strip() in INGEST_COLUMNS)
+    df.columns = df.columns.str.strip()
+    _check_columns(df.columns)
+    return [df]
+
+
+def load_occurrences(path, valid_counties, streaming=True, progress=None, cache=None, cancel=None):
+    """
+    Read an occurrence file and keep only records in valid Montana counties.
+
+    Excel (.xlsx), CSV, TSV, Parquet and Arrow/Feather files are accepted
+    (see INPUT_FORMATS) and only the INGEST_COLUMNS are read. County names
+    are standardized, taxonomy columns are stripped, lowercased and stored as
+    categoricals, and the year column is converted to numbers (NaN when
+    missing).
+
+    Args:
+        path: Path to the occurrence file
+        valid_counties: Set of standardized county names from the shapefile
+        streaming: Read an Excel sheet in chunks and drop non-Montana rows as
+            they arrive, so memory follows the kept records rather than the
+            sheet; False reads the pruned sheet in one pass with pandas
+        progress: Optional callback(rows_read, total_rows); total_rows is
+            None when it is not known ahead of time
+        cache: Optional IngestCache; a file loaded before is read back from
+            it without parsing the file again
+        cancel: Optional threading.Event; reading stops with
+            OperationCancelled between chunks once it is set
+
+    Returns:
+        DataFrame: The normalized Montana records
+    """
+    key = None
+    if cache is not None:
+        with span("cache_read"):
+            key = cache.key_for(path, valid_counties)
+            cached = cache.get(key)
+        if cached is not None:
+            print(f"✅ Loaded {len(cached)} records from the ingest cache")
+            return cached
+
+    # A list when the workbook is read in one pass; next() needs an iterator
+    chunks = iter(_iter_occurrence_chunks(path, streaming, progress))
+    has_year = None
+    total_records = 0
+    records_with_years = 0
+    kept = []
+    while True:
+        with span("parse"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        check_cancelled(cancel)
+        if has_year is None:
+            has_year = "year" in chunk.columns
+        with span("normalize", rows=len(chunk)):
+            chunk = _normalize_occurrences(chunk)
+            total_records += len(chunk)
+            records_with_years += int(chunk["year"].notna().sum())
+            kept.append(chunk[chunk["county"].isin(valid_counties)])
+
+    if has_year:
+        print(f"Found {records_with_years} records with valid years out of {total_records} total records")
+    else:
+        print("No 'year' column found in data. Year-based coloring will use single color.")
+
+    with span("categorize"):
+        montana_records = pd.concat(kept) if len(kept) > 1 else kept[0]
+        # Repeated names are stored once; TaxonomyIndex works from the codes
+        montana_records = montana_records.astype({col: "category" for col in TAXONOMY_COLUMNS})
+    if len(montana_records) == 0:
+        raise DataValidationError(
+            "No valid Montana county records found in the file.\n\n"
+            "Please check that your data contains Montana county records."
+        )
+    if key is not None:
+        with span("cache_write"):
+            cache.put(key, montana_records)
+    return montana_records
+
+
+class IngestCache:
+    """
+    On-disk cache of normalized, Montana-filtered occurrence frames.
+
+    Entries are Parquet files keyed by the SHA-256 of the input file's
+    content, the county list it was filtered against and
+    INGEST_CACHE_VERSION, so an edited file or a changed normalization never
+    reuses a stale frame. Reading an entry refreshes its modification time,
+    and the least recently used entries are deleted once the folder grows
+    past max_bytes. Without pyarrow the cache stays empty.
+    """
+
+    def __init__(self, cache_dir, max_bytes=INGEST_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key_for(path, valid_counties):
+        """Return the cache key of an input file and county list."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        digest.update(f"|{INGEST_CACHE_VERSION}|".encode())
+        digest.update("\n".join(sorted(valid_counties)).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        """Return the cached frame for key, or None."""
+        path = self._path(key)
+        if not os.path.exists(path) or not _has_pyarrow():
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except Exception as e:
+            print(f"Warning: Dropping unreadable ingest cache entry: {e}")
+            self._remove(path)
+            return None
+        # Mark as recently used for eviction
+        os.utime(path)
+        return df
+
+    def put(self, key, df):
+        """Store a frame and evict the least recently used entries over the cap."""
+        if not _has_pyarrow():
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(path + ".tmp", engine="pyarrow")
+            os.replace(path + ".tmp", path)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"Warning: Could not save ingest cache entry: {e}")
+            self._remove(path + ".tmp")
+            return
+        self.evict(keep=path)
+
+    def entries(self):
+        """Return (mtime, size, path) for each cached entry, oldest first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".parquet"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """Delete the least recently used entries until the cache fits max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        """Delete every cached entry; returns the number of bytes freed."""
+        freed = 0
+        for _, size, path in self.entries():
+            self._remove(path)
+            freed += size
+        return freed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def default_ingest_cache():
+    """
+    Return the IngestCache in the cache folder (see get_cache_dir()).
+
+    MSDM_INGEST_CACHE_MB sets the size cap; 0 disables the cache.
+    """
+    if INGEST_CACHE_BYTES <= 0:
+        return None
+    return IngestCache(os.path.join(get_cache_dir(), "ingest"))
+
+
+def summarize_occurrences(df):
+    """Return the dataset counts shown after a file is loaded."""
+    return {
+        "records": len(df),
+        "families": df["family"].nunique(),
+        "genera": df["genus"].nunique(),
+        "species": df["species"].nunique(),
+        "counties": df["county"].nunique(),
+        "with_years": int(df["year"].notna().sum()),
+    }
+
+
+def _clean_names(values):
+    values = [v for v in values if v is not None and str(v).strip() and str(v).lower() != 'nan']
+    return sorted(values, key=lambda x: str(x).lower())
+
+
+def _is_specified(name):
+    return name is not None and name != ""
+
+
+class TaxonomyIndex:
+    """
+    Family -> genus -> species index of record row positions.
+
+    Built once per loaded file from the categorical codes of the taxonomy
+    columns, so dropdown lists are dictionary lookups and filtering by
+    family and genus gathers precomputed row positions instead of comparing
+    strings over every record.
+
+    Names are the normalized (lowercase) values; records without a value are
+    filed under None.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        columns = []
+        for col in TAXONOMY_COLUMNS:
+            values = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype("category")
+            categories = values.cat.categories
+            codes = values.cat.codes.to_numpy()
+            columns.append((codes, [str(name) if _is_specified(name) else None for name in categories]))
+
+        # Sort the rows by (family, genus, species) code and split them into runs
+        (fam_codes, fam_names), (gen_codes, gen_names), (sp_codes, sp_names) = columns
+        order = np.lexsort((sp_codes, gen_codes, fam_codes))
+        keys = np.stack([fam_codes[order], gen_codes[order], sp_codes[order]])
+        starts = np.flatnonzero(np.r_[True, (keys[:, 1:] != keys[:, :-1]).any(axis=0)])
+        ends = np.r_[starts[1:], len(order)]
+
+        def name(names, code):
+            return names[code] if code >= 0 else None
+
+        self.tree = {}
+        for start, end in zip(starts, ends):
+            fam, gen, sp = keys[:, start]
+            genera = self.tree.setdefault(name(fam_names, fam), {})
+            species = genera.setdefault(name(gen_names, gen), {})
+            # Codes of blank and missing names both map to None
+            rows = order[start:end]
+            key = name(sp_names, sp)
+            species[key] = np.concatenate([species[key], rows]) if key in species else rows
+
+    @staticmethod
+    def _match(level, value):
+        """
+        Return the keys of one index level selected by a dropdown value.
+
+        "All" keeps every key with a value, "Not Specified" keeps records
+        without one, anything else is matched case-insensitively.
+        """
+        if value == "All":
+            return [key for key in level if _is_specified(key)]
+        if value == "Not Specified":
+            return [None] if None in level else []
+        value = value.strip().lower()
+        return [value] if value in level else []
+
+    def families(self):
+        """Return the sorted family names present in the data."""
+        return _clean_names(self.tree)
+
+    def genera(self, family):
+        """Return the sorted genus names recorded for a family."""
+        return _clean_names(self.tree.get(family.strip().lower(), {}))
+
+    def _species_levels(self, family, genus):
+        for fam in self._match(self.tree, family):
+            genera = self.tree[fam]
+            for gen in self._match(genera, genus):
+                yield genera[gen]
+
+    def species(self, family, genus):
+        """Return the sorted species names for a family and genus selection."""
+        names = set()
+        for species in self._species_levels(family, genus):
+            names.update(species)
+        return _clean_names(names)
+
+    def rows(self, family, genus):
+        """Return the sorted row positions of the records matching family and genus."""
+        parts = [rows for species in self._species_levels(family, genus) for rows in species.values()]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(parts))
+
+    def filter(self, family, genus):
+        """
+        Return the records matching a family and genus selection, in file order.
+
+        Values follow the dropdowns: "All", "Not Specified" or a name.
+        """
+        return self.df.iloc[self.rows(family, genus)]
+
+
+def list_species(filtered):
+    """Return the sorted species names in a filtered frame."""
+    return _clean_names(filtered["species"].dropna().unique())
+
+
+class ColorSettings:
+    """Year-based county color settings."""
+
+    def __init__(self, pre_year_color="green", post_year_color="red", single_color="grey", split_year=None):
+        self.pre_year_color = pre_year_color
+        self.post_year_color = post_year_color
+        self.single_color = single_color
+        self.split_year = split_year
+
+    def split_year_value(self):
+        """Return the split year as an int, or None when unset or invalid."""
+        split_year_str = str(self.split_year).strip() if self.split_year is not None else ""
+        if not split_year_str:
+            return None
+        try:
+            return int(split_year_str)
+        except ValueError:
+            return None
+
+    def invalid_colors(self):
+        """Return (label, value) pairs for colors matplotlib cannot parse."""
+        invalid = []
+        for label, value in (("Pre-Year Color", self.pre_year_color),
+                             ("Post-Year Color", self.post_year_color),
+                             ("Single Color", self.single_color)):
+            try:
+                mpl.colors.to_rgb(value)
+            except ValueError:
+                invalid.append((label, value))
+        return invalid
+
+    def legend_text(self):
+        """Return the legend text shown on export pages."""
+        split_year = self.split_year_value()
+        if split_year is None:
+            return f"Color Used: {self.single_color.title()}"
+        return f"Before or equal to {split_year} → {self.pre_year_color.title()}\nAfter {split_year} → {self.post_year_color.title()}"
+
+    def palette(self):
+        """Return the colors indexed by the COLOR_* codes."""
+        return ["white", self.single_color, self.pre_year_color, self.post_year_color]
+
+    def code_colors(self, codes):
+        """Translate a row of COLOR_* codes into matplotlib colors."""
+        palette = self.palette()
+        return [palette[code] for code in codes]
+
+
+class SpeciesCountyMatrix:
+    """
+    Species x county summary of a filtered record set.
+
+    Rows follow the sorted species list and columns follow the county order
+    of the shapefile. Each cell keeps whether the species was recorded in the
+    county and the earliest and latest valid (truncated) record year, which is
+    all the split-year coloring rule needs.
+    """
+
+    def __init__(self, species, counties, present, min_year, max_year, num_specimens, captions):
+        self.species = species
+        self.counties = counties
+        self.present = present
+        self.min_year = min_year
+        self.max_year = max_year
+        self.num_specimens = num_specimens
+        self.num_counties = present.sum(axis=1)
+        self.captions = captions
+
+    def color_codes(self, split_year):
+        """
+        Return the S x C matrix of COLOR_* codes for a split year.
+
+        Pre-year records have the highest priority, then post-year records;
+        recorded counties without any valid year use the single color.
+        """
+        codes = np.where(self.present, COLOR_SINGLE, COLOR_NONE).astype(np.int8)
+        if split_year is None:
+            return codes
+        with np.errstate(invalid='ignore'):
+            has_post = self.max_year > split_year
+            has_pre = self.min_year <= split_year
+        codes[has_post] = COLOR_POST
+        codes[has_pre] = COLOR_PRE
+        return codes
+
+
+def build_species_matrix(filtered, county_names):
+    """
+    Summarize filtered records into a SpeciesCountyMatrix in one grouped pass.
+
+    Args:
+        filtered: Records already filtered by family and genus
+        county_names: Standardized county names in shapefile order
+
+    Returns:
+        tuple: (SpeciesCountyMatrix, set of unmatched county names)
+    """
+    species_names = list_species(filtered)
+    # Position of each record's species and county; -1 for names not in the list
+    species_codes = pd.Index(species_names).get_indexer(filtered["species"])
+    county_codes = pd.Index(county_names).get_indexer(filtered["county"])
+    in_species = species_codes >= 0
+    matched = in_species & (county_codes >= 0)
+    unmatched_counties = set(filtered["county"][in_species & (county_codes < 0)])
+
+    n_species, n_counties = len(species_names), len(county_names)
+    cell = species_codes[matched].astype(np.int64) * n_counties + county_codes[matched]
+    present = np.bincount(cell, minlength=n_species * n_counties).reshape(n_species, n_counties) > 0
+
+    # Earliest and latest whole year per cell; cells without a valid year stay NaN
+    years = np.trunc(pd.to_numeric(filtered["year"], errors='coerce').to_numpy(dtype=float)[matched])
+    has_year = ~np.isnan(years)
+    year_range = pd.Series(years[has_year]).groupby(cell[has_year]).agg(["min", "max"])
+    min_year = np.full(n_species * n_counties, np.nan)
+    max_year = np.full(n_species * n_counties, np.nan)
+    year_cells = year_range.index.to_numpy(dtype=np.int64)
+    min_year[year_cells] = year_range["min"].to_numpy()
+    max_year[year_cells] = year_range["max"].to_numpy()
+
+    num_specimens = np.bincount(species_codes[in_species], minlength=n_species)
+
+    # Caption parts come from the first record of each species
+    first = filtered[in_species].drop_duplicates(subset="species")
+    first = first.set_index("species").reindex(species_names)
+    subgenus = first["subgenus"].fillna("").astype(str).str.strip().str.title() if "subgenus" in first.columns else pd.Series("", index=first.index)
+    captions = list(zip(first["genus"].astype(str).str.strip().str.title(),
+                        first.index.astype(str).str.strip().str.lower(),
+                        subgenus))
+
+    matrix = SpeciesCountyMatrix(
+        species_names, county_names, present,
+        min_year.reshape(n_species, n_counties), max_year.reshape(n_species, n_counties),
+        num_specimens, captions,
+    )
+    return matrix, unmatched_counties
+
+
+class SpeciesMap:
+    """Everything needed to draw one species map: color codes, caption and counts."""
+
+    def __init__(self, species, genus, sp_epithet, subgenus, color_codes, num_specimens, num_counties):
+        self.species = species
+        self.genus = genus
+        self.sp_epithet = sp_epithet
+        self.subgenus = subgenus
+        self.color_codes = color_codes
+        self.num_specimens = num_specimens
+        self.num_counties = num_counties
+
+    def summary(self):
+        """Return the "N specimens in M counties." caption line."""
+        return (f"{self.num_specimens} specimen{'s' if self.num_specimens != 1 else ''} "
+                f"in {self.num_counties} count{'ies' if self.num_counties != 1 else 'y'}.")
+
+
+def build_species_maps(filtered, gdf, colors):
+    """
+    Compute the county color codes and caption data for every species.
+
+    Args:
+        filtered: Records already filtered by family and genus
+        gdf: County GeoDataFrame; color codes follow its row order
+        colors: ColorSettings
+
+    Returns:
+        tuple: (list of SpeciesMap, set of unmatched county names)
+    """
+    county_names = list(standardize_county_names(gdf["County"]))
+    matrix, unmatched_counties = build_species_matrix(filtered, county_names)
+    return species_maps_from_matrix(matrix, colors), unmatched_counties
+
+
+def species_maps_from_matrix(matrix, colors, progress=None, cancel=None):
+    """
+    Return one SpeciesMap per matrix row, colored for the settings' split year.
+
+    Args:
+        progress: Optional callable(index, total) called after each species
+        cancel: Optional threading.Event checked between species
+    """
+    codes = matrix.color_codes(colors.split_year_value())
+    species_maps = []
+    for i, species in enumerate(matrix.species):
+        check_cancelled(cancel)
+        genus, sp_epithet, subgenus = matrix.captions[i]
+        species_maps.append(SpeciesMap(
+            species, genus, sp_epithet, subgenus, codes[i],
+            int(matrix.num_specimens[i]), int(matrix.num_counties[i]),
+        ))
+        if progress is not None:
+            progress(i, len(matrix.species))
+    return species_maps
+
+
+def restyle_species_maps(species_maps, matrix, colors):
+    """
+    Update the color codes of existing maps for new color settings.
+
+    Only the split year changes the codes; they are recomputed from the
+    matrix's per-cell year range without touching the records. Palette
+    changes need nothing here, since colors are looked up at draw time.
+
+    Returns:
+        int: Number of maps whose color codes changed
+    """
+    codes = matrix.color_codes(colors.split_year_value())
+    changed = 0
+    for species_map, row in zip(species_maps, codes):
+        if not np.array_equal(species_map.color_codes, row):
+            species_map.color_codes = row
+            changed += 1
+    return changed
+
+
+def new_figure(figsize):
+    """Create a pyplot-free figure backed by an Agg canvas."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def has_subgenus(subgenus):
+    """Return True when a subgenus value should be printed."""
+    return bool(subgenus and str(subgenus).strip() and str(subgenus).lower() != 'nan')
+
+
+@functools.lru_cache(maxsize=None)
+def _fragment_width(text, font_path, fontstyle, font_size):
+    prop = FontProperties(fname=font_path, style=fontstyle, size=font_size)
+    width, _, _ = text_to_path.get_text_width_height_descent(text, prop, ismath=False)
+    return width
+
+
+class CaptionLayout:
+    """
+    Lays out captions that mix italic and roman text fragments.
+
+    Fragment widths are measured in points from the font's own metrics and
+    memoized per (text, font, style, size), so no canvas draw or temporary
+    Text artist is needed. Each fragment is then offset from the caption
+    anchor by a fixed number of points, which keeps the spacing right even
+    after tight_layout() or subplots_adjust() resize the axes.
+    """
+
+    def __init__(self, fontname=CAPTION_FONT, font_size=11):
+        self.fontname = fontname
+        self.font_size = font_size
+
+    def text_width(self, text, fontstyle='normal'):
+        """Return the width of text in points."""
+        # findfont resolves fallbacks under the current rcParams and is cached by Matplotlib
+        font_path = findfont(FontProperties(family=self.fontname, style=fontstyle, size=self.font_size))
+        return _fragment_width(text, font_path, fontstyle, self.font_size)
+
+    def fragments(self, genus, subgenus, species, show_subgenus):
+        """Return the caption as (text, fontstyle) pairs: italic names, roman parentheses."""
+        parts = [(f"{genus}", 'italic')]
+        if show_subgenus and has_subgenus(subgenus):
+            parts += [(" (", 'normal'), (f"{subgenus}", 'italic'), (")", 'normal')]
+        parts.append((f" {species}", 'italic'))
+        return parts
+
+    def draw(self, ax, genus, subgenus, species, x, y, show_subgenus):
+        """
+        Draw the caption on ax starting at (x, y) in axes coordinates.
+
+        The fragments are left out of tight_layout(): their point offsets
+        reach further across the small pre-layout axes than across the laid
+        out ones, and would otherwise widen the margins and shrink every map.
+        """
+        offset = 0.0
+        for text, fontstyle in self.fragments(genus, subgenus, species, show_subgenus):
+            transform = ax.transAxes + ScaledTranslation(offset / 72, 0, ax.figure.dpi_scale_trans)
+            artist = ax.text(x, y, text, ha='left', va='bottom', fontsize=self.font_size, fontname=self.fontname,
+                             fontstyle=fontstyle, transform=transform)
+            artist.set_in_layout(False)
+            offset += self.text_width(text, fontstyle)
+
+
+caption_layout = CaptionLayout()
+
+
+def simplify_levels(gdf, tolerances=LOD_TOLERANCES):
+    """
+    Simplify the county coverage at each level of detail.
+
+    Args:
+        gdf: County GeoDataFrame
+        tolerances: Fractions of the state's width, see LOD_TOLERANCES
+
+    Returns:
+        list: (tolerance in map units, array of geometries) per level, finest first
+    """
+    import shapely
+
+    minx, _, maxx, _ = gdf.total_bounds
+    levels = []
+    geoms = gdf.geometry.values
+    for fraction in sorted(tolerances):
+        tolerance = fraction * (maxx - minx)
+        if tolerance > 0:
+            # Simplify from the previous level; far fewer vertices to walk
+            geoms = shapely.coverage_simplify(geoms, tolerance)
+        levels.append((tolerance, np.asarray(geoms)))
+    return levels
+
+
+def _shapefile_signature(shapefile_path):
+    """Return [suffix, size, mtime_ns] for each shapefile part on disk."""
+    stem = os.path.splitext(shapefile_path)[0]
+    signature = []
+    for suffix in SHAPEFILE_PARTS:
+        part = stem + suffix
+        if os.path.exists(part):
+            stat = os.stat(part)
+            signature.append([suffix, stat.st_size, stat.st_mtime_ns])
+    return signature
+
+
+def _geometry_cache_paths(cache_dir):
+    return (os.path.join(cache_dir, "county_geometry.json"),
+            os.path.join(cache_dir, "county_geometry_wkb.npy"),
+            os.path.join(cache_dir, "county_geometry_offsets.npy"))
+
+
+def read_geometry_cache(cache_dir, signature, tolerances=LOD_TOLERANCES):
+    """
+    Read county geometry from the binary cache if it matches the shapefile.
+
+    The WKB blob is memory-mapped, so only the bytes of each geometry are
+    touched while decoding.
+
+    Returns:
+        tuple: (GeoDataFrame, level geometries), or None if the cache is
+        missing, stale or unreadable
+    """
+    import geopandas as gpd
+    import shapely
+
+    meta_path, wkb_path, offsets_path = _geometry_cache_paths(cache_dir)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta.get("version") != GEOMETRY_CACHE_VERSION or meta.get("signature") != signature
+                or meta.get("fractions") != sorted(tolerances)):
+            return None
+        blob = np.load(wkb_path, mmap_mode="r")
+        offsets = np.load(offsets_path)
+        names = meta["names"]
+        count = len(names)
+        if len(offsets) != count * len(meta["tolerances"]) + 1 or offsets[-1] != len(blob):
+            return None
+        geoms = shapely.from_wkb([blob[start:end].tobytes() for start, end in zip(offsets[:-1], offsets[1:])])
+        del blob
+    except (OSError, ValueError, KeyError, shapely.errors.GEOSException) as e:
+        print(f"Warning: Ignoring unreadable geometry cache: {e}")
+        return None
+
+    levels = [(tolerance, geoms[i * count:(i + 1) * count]) for i, tolerance in enumerate(meta["tolerances"])]
+    gdf = gpd.GeoDataFrame({"NAME": names}, geometry=levels[0][1], crs=meta["crs"])
+    gdf["County"] = gdf["NAME"].str.strip().str.lower()
+    gdf["Color"] = "white"
+    return gdf, levels
+
+
+def write_geometry_cache(cache_dir, signature, gdf, levels, tolerances=LOD_TOLERANCES):
+    """
+    Save county names and every level of detail as one WKB blob plus offsets.
+
+    The metadata file is written last, so an interrupted write leaves a cache
+    that read_geometry_cache() rejects instead of a half-written one.
+    """
+    import shapely
+
+    meta_path, wkb_path, offsets_path = _geometry_cache_paths(cache_dir)
+    wkb = shapely.to_wkb(np.concatenate([geoms for _, geoms in levels]))
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in wkb], out=offsets[1:])
+    blob = np.frombuffer(b"".join(wkb), dtype=np.uint8)
+    meta = {
+        "version": GEOMETRY_CACHE_VERSION,
+        "signature": signature,
+        "fractions": sorted(tolerances),
+        "tolerances": [tolerance for tolerance, _ in levels],
+        "names": list(gdf["NAME"].str.strip()),
+        "crs": gdf.crs.to_wkt() if gdf.crs is not None else None,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    for path, array in ((wkb_path, blob), (offsets_path, offsets)):
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+
+
+def load_county_geometry(shapefile_path=None, cache_dir=None, tolerances=LOD_TOLERANCES):
+    """
+    Load the counties and their drawing template, using the geometry cache.
+
+    The first run reads the shapefile, simplifies every level of detail and
+    writes the cache; later runs read the cache as long as the shapefile's
+    size and modification time are unchanged.
+
+    Returns:
+        tuple: (GeoDataFrame, CountyTemplate)
+    """
+    if shapefile_path is None:
+        shapefile_path = get_shapefile_path()
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+
+    signature = _shapefile_signature(shapefile_path)
+    cached = read_geometry_cache(cache_dir, signature, tolerances) if signature else None
+    if cached is not None:
+        gdf, levels = cached
+    else:
+        gdf = load_counties(shapefile_path)
+        levels = simplify_levels(gdf, tolerances)
+        try:
+            write_geometry_cache(cache_dir, signature, gdf, levels, tolerances)
+            print(f"✅ Saved county geometry cache to {cache_dir}")
+        except OSError as e:
+            print(f"Warning: Could not save geometry cache: {e}")
+    return gdf, CountyTemplate(gdf, tolerances, level_geometries=levels)
+
+
+class CountyTemplate:
+    """
+    County geometry converted once into reusable Matplotlib paths.
+
+    Converting 56 shapely geometries (about 200,000 vertices) into Path
+    objects and boundary lines is the expensive part of drawing a map, so it
+    is done once here. Each map then only wraps the cached paths in new
+    collections with its own fill colors.
+
+    Besides the full-resolution geometry, coarser levels of detail are kept
+    (see LOD_TOLERANCES). They are simplified as one coverage, so borders
+    shared by two counties stay matched, and draw() picks the coarsest level
+    whose error stays under LOD_MAX_PIXEL_ERROR at the output resolution.
+    level_geometries takes precomputed simplify_levels() output, such as the
+    levels read from the geometry cache.
+    """
+
+    def __init__(self, gdf, tolerances=LOD_TOLERANCES, level_geometries=None):
+        self.county_names = list(standardize_county_names(gdf["County"]))
+        minx, miny, maxx, maxy = gdf.total_bounds
+        self.corners = np.array([[minx, miny], [maxx, maxy]])
+
+        if level_geometries is None:
+            level_geometries = simplify_levels(gdf, tolerances)
+        # Each level is (tolerance, paths, boundary_segments), finest first
+        self.levels = [(tolerance, *self._build_paths(geoms)) for tolerance, geoms in level_geometries]
+        _, self.paths, self.boundary_segments = self.levels[0]
+        # LabelRaster per preview size, most recently used last
+        self._label_rasters = collections.OrderedDict()
+
+    def __getstate__(self):
+        # Render workers only draw vector figures; leave the label images behind
+        state = self.__dict__.copy()
+        state["_label_rasters"] = collections.OrderedDict()
+        return state
+
+    @staticmethod
+    def _build_paths(geoms):
+        paths = []
+        boundary_segments = []
+        for geom in geoms:
+            polygons = list(geom.geoms) if geom.geom_type == 'MultiPolygon' else [geom]
+            rings = []
+            for polygon in polygons:
+                if polygon.is_empty:
+                    continue
+                rings.append(np.asarray(polygon.exterior.coords)[:, :2])
+                rings.extend(np.asarray(ring.coords)[:, :2] for ring in polygon.interiors)
+            paths.append(Path.make_compound_path(*[Path(ring) for ring in rings]))
+            boundary_segments.extend(rings)
+        return paths, boundary_segments
+
+    def vertex_counts(self):
+        """Return the number of boundary vertices at each level of detail."""
+        return [sum(len(ring) for ring in segments) for _, _, segments in self.levels]
+
+    def level_for(self, ax, dpi):
+        """
+        Pick the level of detail for drawing on ax at the given output DPI.
+
+        Args:
+            ax: Axes the map will fill (its current size is used)
+            dpi: Output resolution, or None for full detail
+
+        Returns:
+            int: Index into self.levels
+        """
+        if dpi is None:
+            return 0
+        pos = ax.get_position()
+        width_px = pos.width * ax.figure.get_figwidth() * dpi
+        height_px = pos.height * ax.figure.get_figheight() * dpi
+        (minx, miny), (maxx, maxy) = self.corners
+        # With an equal aspect the map is scaled to fit the tighter direction
+        units_per_pixel = max((maxx - minx) / width_px, (maxy - miny) / height_px)
+        max_error = LOD_MAX_PIXEL_ERROR * units_per_pixel
+        level = 0
+        for index, (tolerance, _, _) in enumerate(self.levels):
+            if tolerance <= max_error:
+                level = index
+        return level
+
+    def draw(self, ax, county_colors, linewidth, dpi=None):
+        """
+        Add filled counties and black boundaries to ax.
+
+        Args:
+            ax: Axes to draw on
+            county_colors: One fill color per county
+            linewidth: Boundary line width in points
+            dpi: Output resolution used to pick the level of detail; None
+                draws the full-resolution geometry
+
+        Returns:
+            PathCollection: The county fill
+        """
+        _, paths, boundary_segments = self.levels[self.level_for(ax, dpi)]
+        fill = PathCollection(paths, facecolors=county_colors, edgecolors="none", alpha=0.6, zorder=1)
+        lines = LineCollection(boundary_segments, colors="black", linewidths=linewidth, zorder=2)
+        ax.add_collection(fill, autolim=False)
+        ax.add_collection(lines, autolim=False)
+        ax.update_datalim(self.corners)
+        ax.set_aspect('equal')
+        ax.autoscale_view()
+        ax.axis("off")
+        return fill
+
+    def label_raster(self, size):
+        """Return the LabelRaster for previews of size (width, height) pixels, building it once."""
+        size = tuple(size)
+        raster = self._label_rasters.get(size)
+        if raster is None:
+            with span("label_raster"), _mpl_lock:
+                raster = LabelRaster(self, size)
+            self._label_rasters[size] = raster
+            while len(self._label_rasters) > LABEL_RASTER_SIZES:
+                self._label_rasters.popitem(last=False)
+        self._label_rasters.move_to_end(size)
+        return raster
+
+
+class LabelRaster:
+    """
+    The county map of a preview as a county-ID image, for palette lookups.
+
+    The counties are rasterized once per preview size: labels holds 0
+    outside Montana and i + 1 inside county i (without antialiasing, so every
+    pixel belongs to exactly one county), and the boundary lines are kept
+    separately as an antialiased coverage mask. paint() then turns a
+    species' county colors into an image with a palette lookup over labels
+    and a blend with the boundary mask, both done by PIL in C, which takes
+    well under a millisecond instead of a full figure render and PNG encode.
+
+    Layout, as fractions of the preview height: title band at the top, map in
+    MAP_BOX, two caption lines below it.
+    """
+
+    MAP_BOX = (0.02, 0.09, 0.98, 0.80)  # left, top, right, bottom
+    DPI = 100
+    LINEWIDTH = 0.5
+
+    def __init__(self, template, size):
+        from PIL import Image
+
+        width, height = self.size = size
+        left, top, right, bottom = self.MAP_BOX
+        fig = new_figure((width / self.DPI, height / self.DPI))
+        fig.set_dpi(self.DPI)
+        fig.patch.set_facecolor("black")
+        ax = fig.add_axes([left, 1 - bottom, right - left, bottom - top])
+        _, paths, boundary_segments = template.levels[template.level_for(ax, self.DPI)]
+
+        # County i is filled with red value i + 1; the black background stays 0
+        codes = [(i / 255, 0, 0) for i in range(1, len(paths) + 1)]
+        fill = PathCollection(paths, facecolors=codes, edgecolors="none", antialiased=False)
+        ax.add_collection(fill, autolim=False)
+        ax.update_datalim(template.corners)
+        ax.set_aspect('equal')
+        ax.autoscale_view()
+        ax.axis("off")
+        fig.canvas.draw()
+        self.labels = np.array(fig.canvas.buffer_rgba())[:, :, 0]
+        self._label_image = Image.fromarray(self.labels, mode="P")
+
+        # Then the boundaries alone, white on black, as line coverage
+        fill.remove()
+        ax.add_collection(LineCollection(boundary_segments, colors="white", linewidths=self.LINEWIDTH),
+                          autolim=False)
+        fig.canvas.draw()
+        self._line_mask = Image.fromarray(np.array(fig.canvas.buffer_rgba())[:, :, 0], mode="L")
+        self._lines = Image.new("RGB", size, "black")
+
+        bbox = ax.get_window_extent()
+        self.map_bottom = int(round(height - bbox.y0))
+
+    def paint(self, county_rgb):
+        """
+        Return the map as an RGB PIL image.
+
+        Args:
+            county_rgb: (counties, 3) uint8 fill colors, in template county order
+        """
+        from PIL import Image
+
+        lookup = np.full((256, 3), 255, dtype=np.uint8)
+        lookup[1:len(county_rgb) + 1] = county_rgb
+        image = self._label_image.copy()
+        image.putpalette(lookup.tobytes())
+        return Image.composite(self._lines, image.convert("RGB"), self._line_mask)
+
+
+@functools.lru_cache(maxsize=None)
+def _preview_font(family, fontstyle, size_px):
+    from PIL import ImageFont
+    return ImageFont.truetype(findfont(FontProperties(family=family, style=fontstyle)), size_px)
+
+
+def preview_palette(colors):
+    """Return the COLOR_* codes' fill colors as a (4, 3) uint8 array, as drawn at 60% opacity on white."""
+    rgb = np.array([mpl.colors.to_rgb(color) for color in colors.palette()])
+    return np.round((0.6 * rgb + 0.4) * 255).astype(np.uint8)
+
+
+def render_species_thumbnail(species_map, template, family, genus, colors, map_index, show_subgenus, size):
+    """
+    Draw a species preview of size (width, height) pixels from the label raster.
+
+    The map is a palette lookup over template.label_raster(size); the title
+    and caption are drawn with PIL in the caption fonts. Exports keep using
+    the vector figures.
+
+    Returns:
+        PIL.Image.Image: The RGB preview
+    """
+    from PIL import ImageDraw
+
+    raster = template.label_raster(size)
+    with span("paint"):
+        image = raster.paint(preview_palette(colors)[species_map.color_codes])
+    # The caption fonts are looked up under the current rcParams
+    with span("caption"), _mpl_lock:
+        width, height = raster.size
+        draw = ImageDraw.Draw(image)
+        title_font = _preview_font(mpl.rcParams['font.family'][0], 'normal', max(7, round(height * 0.034)))
+        title = f"{family.title()} > {genus.title()} > {species_map.species.title()}"
+        draw.text((width / 2, height * 0.05), title, fill="black", font=title_font, anchor="mm")
+
+        font_px = max(7, round(height * 0.038))
+        x = width * 0.12
+        y = raster.map_bottom + height * 0.02
+        fragments = [(get_figure_number(map_index) + " ", 'normal')]
+        fragments += caption_layout.fragments(species_map.genus, species_map.subgenus, species_map.sp_epithet,
+                                              show_subgenus)
+        for text, fontstyle in fragments:
+            font = _preview_font(CAPTION_FONT, fontstyle, font_px)
+            draw.text((x, y), text, fill="black", font=font)
+            x += draw.textlength(text, font=font)
+        draw.text((width * 0.12, y + font_px * 1.4), species_map.summary(), fill="black",
+                  font=_preview_font(CAPTION_FONT, 'normal', font_px))
+    return image
+
+
+def render_species_figure(species_map, template, family, genus, colors, map_index, show_subgenus, dpi=THUMBNAIL_DPI):
+    """
+    Build the on-screen figure for one species.
+
+    dpi is the resolution the figure will be saved at; it picks the county
+    geometry level of detail.
+
+    Returns:
+        Figure: An 8x6 inch figure with map, title and caption
+    """
+    fig = new_figure(SPECIES_FIGSIZE)
+    ax = fig.add_axes([0.1, 0.2, 0.8, 0.6])
+    template.draw(ax, colors.code_colors(species_map.color_codes), linewidth=0.5, dpi=dpi)
+    title = f"{family.title()} > {genus.title()} > {species_map.species.title()}"
+    ax.set_title(title, fontsize=10, pad=15, wrap=True)
+
+    with span("caption"):
+        # Figure number (normal)
+        ax.text(0.15, -0.10, get_figure_number(map_index), ha='center', va='bottom', fontsize=11, fontname=CAPTION_FONT, fontstyle='normal', transform=ax.transAxes)
+        caption_layout.draw(ax, species_map.genus, species_map.subgenus, species_map.sp_epithet, x=0.21, y=-0.10, show_subgenus=show_subgenus)
+        ax.text(0.25, -0.16, species_map.summary(), ha='center', va='bottom', fontsize=11, fontname=CAPTION_FONT, transform=ax.transAxes)
+
+    fig.subplots_adjust(bottom=0.15, top=0.85)
+    return fig
+
+
+def render_species_image(species_map, template, family, genus, colors, map_index, show_subgenus, size):
+    """
+    Render the on-screen figure for one species straight at size (width, height) pixels.
+
+    The 8x6 inch figure is drawn at the DPI that makes it size pixels wide,
+    so nothing is scaled afterwards and no PNG is encoded or decoded; the
+    returned PIL image wraps the Agg canvas's RGBA buffer without copying it.
+
+    Returns:
+        PIL.Image.Image: The RGBA preview
+    """
+    from PIL import Image
+
+    dpi = size[0] / SPECIES_FIGSIZE[0]
+    with _mpl_lock:
+        with span("figure"):
+            fig = render_species_figure(species_map, template, family, genus, colors, map_index, show_subgenus, dpi)
+            fig.set_dpi(dpi)
+        # Hinted glyphs grow at low DPI and would overrun the caption fragments' measured widths
+        with span("draw"), mpl.rc_context({'text.hinting': 'no_hinting'}):
+            fig.canvas.draw()
+    buf = fig.canvas.buffer_rgba()
+    return Image.frombuffer("RGBA", (buf.shape[1], buf.shape[0]), buf, "raw", "RGBA", 0, 1)
+
+
+# County template of a render worker process, set once by _init_render_worker
+_worker_template = None
+
+
+def _init_render_worker(template):
+    global _worker_template
+    _worker_template = template
+
+
+class RenderPool:
+    """
+    Render worker processes kept across render calls.
+
+    Starting a ProcessPoolExecutor pickles the county template to every
+    worker, which costs more than rendering a screenful of previews, so a
+    long-lived caller such as the GUI keeps one RenderPool: the template is
+    shipped once when the workers start, and later calls only send tasks.
+    The workers are started on first use and restarted only when a different
+    number is asked for; the owner calls shutdown() when it is done.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.workers = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self, workers):
+        """Return the executor with workers processes, starting or resizing it if needed."""
+        with self._lock:
+            if self._executor is None or workers != self.workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                                                     initargs=(self.template,))
+                self.workers = workers
+            return self._executor
+
+    def shutdown(self):
+        """Stop the worker processes; the next executor() call starts new ones."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.workers = 0
+
+
+@contextlib.contextmanager
+def _render_executor(template, workers, pool):
+    """Yield pool's executor, or one started for this call and shut down after it."""
+    if pool is not None:
+        yield pool.executor(workers)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=(template,)) as executor:
+        yield executor
+
+
+def _render_species_task(task):
+    species_map, family, genus, colors, map_index, show_subgenus, size = task
+    image = render_species_image(species_map, _worker_template, family, genus, colors, map_index, show_subgenus, size)
+    # Raw RGBA bytes cross the process boundary; the parent wraps them again
+    return image.size, image.tobytes()
+
+
+def render_species_images(species_maps, template, family, genus, colors, show_subgenus, size, workers=1,
+                          progress=None, map_indices=None, pool=None):
+    """
+    Render the on-screen figure of every species at size pixels, optionally in worker processes.
+
+    With workers > 1 the maps are rendered by worker processes that hold the
+    county template; each task only carries one SpeciesMap (color codes and
+    caption parts) and returns raw RGBA pixels. Results come back in
+    submission order, so map_index, and with it the figure number, matches
+    the species order.
+
+    Args:
+        size: (width, height) of each image in pixels
+        workers: Number of render processes; 1 renders in this process
+        progress: Optional callable(index, total, species) called as each map finishes
+        map_indices: Figure-number index of each map; defaults to 0, 1, 2, ...
+        pool: Optional RenderPool whose workers are reused; without one a
+            pool is started for this call only
+
+    Returns:
+        list: RGBA PIL images per species, in species_maps order
+    """
+    from PIL import Image
+
+    if map_indices is None:
+        map_indices = range(len(species_maps))
+    size = tuple(size)
+    tasks = [(species_map, family, genus, colors, i, show_subgenus, size)
+             for species_map, i in zip(species_maps, map_indices)]
+    images = []
+
+    def collect(results):
+        for i, image in enumerate(results):
+            images.append(image)
+            if progress is not None:
+                progress(i, len(tasks), species_maps[i].species)
+
+    if workers <= 1 or len(tasks) <= 1:
+        collect(render_species_image(species_map, template, *task[1:]) for species_map, task in zip(species_maps, tasks))
+        return images
+
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with span("render_pool", maps=len(tasks), workers=workers):
+        with _render_executor(template, workers, pool) as executor:
+            collect(Image.frombuffer("RGBA", image_size, data, "raw", "RGBA", 0, 1)
+                    for image_size, data in executor.map(_render_species_task, tasks, chunksize=chunksize))
+    return images
+
+
+class ThumbnailCache:
+    """
+    Least-recently-used cache of preview images with a memory cap.
+
+    Values are PIL images or encoded bytes; their size is counted in bytes and
+    the least recently used entries leave memory once the total goes over
+    max_bytes. They are dropped, or, when spill_dir is given, written there
+    and read back on the next get().
+    """
+
+    def __init__(self, max_bytes=THUMBNAIL_CACHE_BYTES, spill_dir=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = collections.OrderedDict()
+        self._spilled = {}
+
+    @staticmethod
+    def _nbytes(value):
+        if hasattr(value, 'getbands'):
+            return value.width * value.height * len(value.getbands())
+        return len(value)
+
+    def get(self, key):
+        """Return the cached value for key, or None."""
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+        spilled = self._spilled.pop(key, None)
+        if spilled is None:
+            self.misses += 1
+            return None
+        value = self._read_spilled(spilled)
+        os.remove(spilled[0])
+        self.hits += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store value under key, evicting least recently used entries as needed."""
+        nbytes = self._nbytes(value)
+        self.discard(key)
+        if nbytes > self.max_bytes:
+            return
+        self._items[key] = (value, nbytes)
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            evicted_key, (evicted, evicted_bytes) = self._items.popitem(last=False)
+            self.current_bytes -= evicted_bytes
+            if self.spill_dir is not None:
+                self._spilled[evicted_key] = self._write_spilled(evicted)
+
+    def discard(self, key):
+        """Remove key from memory and from the spill directory."""
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.current_bytes -= item[1]
+        spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            os.remove(spilled[0])
+
+    def _write_spilled(self, value):
+        fd, path = tempfile.mkstemp(suffix='.png', dir=self.spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            if hasattr(value, 'getbands'):
+                # Uncompressed PNG keeps reads and writes fast
+                value.save(f, format='PNG', compress_level=0)
+                return (path, True)
+            f.write(value)
+        return (path, False)
+
+    @staticmethod
+    def _read_spilled(spilled):
+        path, is_image = spilled
+        if not is_image:
+            with open(path, 'rb') as f:
+                return f.read()
+        from PIL import Image
+        with Image.open(path) as img:
+            img.load()
+            return img
+
+    def clear(self):
+        """Drop every cached entry, including spilled files."""
+        for path, _ in self._spilled.values():
+            os.remove(path)
+        self._spilled.clear()
+        self._items.clear()
+        self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._items) + len(self._spilled)
+
+
+def default_thumbnail_cache():
+    """
+    Return a ThumbnailCache configured from the environment.
+
+    MSDM_THUMBNAIL_CACHE_MB sets the memory cap; setting MSDM_THUMBNAIL_SPILL
+    spills entries over the cap to a temporary directory removed at exit.
+    """
+    spill_dir = None
+    if os.environ.get("MSDM_THUMBNAIL_SPILL"):
+        spill_dir = tempfile.mkdtemp(prefix="msdm_thumbnails_")
+        atexit.register(shutil.rmtree, spill_dir, ignore_errors=True)
+    return ThumbnailCache(spill_dir=spill_dir)
+
+
+def thumbnail_key(species_map, map_index, family, genus, colors, show_subgenus, size):
+    """
+    Return the cache key of a species preview.
+
+    Everything that changes the picture is part of the key: the species and
+    its figure number, the title, the county color codes and the colors they
+    use, whether a subgenus is shown and the target pixel size. Settings that
+    do not show on a map, such as a color it never uses or the subgenus toggle
+    for a species without one, leave its key (and cached preview) unchanged.
+    """
+    codes = species_map.color_codes
+    palette = colors.palette()
+    used_colors = tuple(palette[code] for code in np.unique(codes))
+    show_subgenus = bool(show_subgenus) and has_subgenus(species_map.subgenus)
+    return (species_map.species, map_index, family, genus, codes.tobytes(), used_colors,
+            show_subgenus, None if size is None else tuple(size))
+
+
+def page_count(num_maps, maps_per_page=MAPS_PER_PAGE):
+    """Return the number of export pages needed for num_maps maps."""
+    return (num_maps + maps_per_page - 1) // maps_per_page
+
+
+def page_filename(family, genus, timestamp, page_index, fmt):
+    """Return the file name of an export page (page_index is 0-based)."""
+    return f"{family}-{genus}-{timestamp}_page{page_index + 1}.{fmt}"
+
+
+def export_timestamp():
+    """Return the timestamp used in export file names."""
+    return datetime.datetime.now().strftime("%Y%m%d_%H%M")
+
+
+def page_maps(species_maps, page_index, maps_per_page=MAPS_PER_PAGE):
+    """Return the species maps shown on one page (page_index is 0-based)."""
+    start = page_index * maps_per_page
+    return species_maps[start:start + maps_per_page]
+
+
+def compose_page(maps_to_save, page_index, template, family, genus, colors, fmt, show_subgenus, maps_per_page=MAPS_PER_PAGE):
+    """
+    Lay out one export page: a 3x5 grid of maps with captions.
+
+    maps_to_save holds only this page's maps (see page_maps); page_index sets
+    their figure numbers. Must be called inside mpl.rc_context(EXPORT_RC) so
+    fonts match the export, holding _mpl_lock when other threads render.
+    """
+    start = page_index * maps_per_page
+    fig = new_figure(PAGE_FIGSIZE)
+    fig.suptitle(f"{family} > {genus}", fontsize=18, fontweight='bold', y=0.99)
+    # Legend text below the main title
+    fig.text(0.5, 0.95, colors.legend_text(), ha='center', va='top', fontsize=12,
+             fontname=CAPTION_FONT, transform=fig.transFigure)
+
+    for idx in range(PAGE_ROWS * PAGE_COLS):
+        ax = fig.add_subplot(PAGE_ROWS, PAGE_COLS, idx + 1)
+        if idx >= len(maps_to_save):
+            ax.axis("off")
+            continue
+        species_map = maps_to_save[idx]
+        template.draw(ax, colors.code_colors(species_map.color_codes), linewidth=0.7, dpi=EXPORT_LOD_DPI[fmt])
+
+        # --- Caption formatting ---
+        with span("caption"):
+            fig_number = get_figure_number(start + idx)
+            ax.text(0.15, -0.10, f"{fig_number}", ha='center', va='bottom', fontsize=11, fontname=CAPTION_FONT, fontstyle='normal', transform=ax.transAxes)
+            caption_layout.draw(ax, species_map.genus, species_map.subgenus, species_map.sp_epithet,
+                                x=0.235, y=-0.10, show_subgenus=show_subgenus)
+            ax.text(0.29, -0.16, species_map.summary(), ha='center', va='bottom', fontsize=11, fontname=CAPTION_FONT, transform=ax.transAxes)
+
+    with span("layout"):
+        fig.tight_layout(pad=0.01)
+    fig.subplots_adjust(hspace=-0.4, wspace=0.0, bottom=0.04, top=0.98)
+    return fig
+
+
+def render_page(maps_to_save, page_index, template, family, genus, colors, fmt, show_subgenus):
+    """Compose one export page and return its encoded bytes."""
+    with _mpl_lock, mpl.rc_context(EXPORT_RC):
+        with span("compose", page=page_index):
+            fig = compose_page(maps_to_save, page_index, template, family, genus, colors, fmt, show_subgenus)
+        with span("encode", format=fmt, page=page_index):
+            buf = io.BytesIO()
+            fig.savefig(buf, format=fmt, bbox_inches='tight')
+    return buf.getvalue()
+
+
+def export_page(file_path, maps_to_save, page_index, template, family, genus, colors, fmt, show_subgenus):
+    """Write one export page to file_path."""
+    with _mpl_lock, mpl.rc_context(EXPORT_RC):
+        with span("compose", page=page_index):
+            fig = compose_page(maps_to_save, page_index, template, family, genus, colors, fmt, show_subgenus)
+        with span("encode", format=fmt, page=page_index):
+            fig.savefig(file_path, format=fmt, bbox_inches='tight')
+    return file_path
+
+
+def _render_page_task(task):
+    maps_to_save, page_index, family, genus, colors, fmt, show_subgenus = task
+    return render_page(maps_to_save, page_index, _worker_template, family, genus, colors, fmt, show_subgenus)
+
+
+def iter_rendered_pages(species_maps, template, family, genus, colors, fmt, show_subgenus, workers=1, pool=None):
+    """
+    Compose and encode every page, yielding (page_index, bytes) in page order.
+
+    With workers > 1 pages are rendered concurrently in a process pool (the
+    workers of pool, a RenderPool, when given). At most two pages per worker
+    are in flight or waiting to be consumed, so memory stays bounded however
+    many pages there are.
+    """
+    pages = page_count(len(species_maps))
+    tasks = ((page_maps(species_maps, page), page, family, genus, colors, fmt, show_subgenus) for page in range(pages))
+    if workers <= 1 or pages <= 1:
+        for task in tasks:
+            yield task[1], render_page(task[0], task[1], template, *task[2:])
+        return
+
+    with _render_executor(template, workers, pool) as executor:
+        pending = collections.deque()
+        try:
+            for task in tasks:
+                pending.append((task[1], executor.submit(_render_page_task, task)))
+                if len(pending) >= workers * 2:
+                    page, future = pending.popleft()
+                    with span("render_wait", page=page):
+                        data = future.result()
+                    yield page, data
+            while pending:
+                page, future = pending.popleft()
+                with span("render_wait", page=page):
+                    data = future.result()
+                yield page, data
+        finally:
+            # When the consumer stops early, drop pages that have not started
+            for _, future in pending:
+                future.cancel()
+
+
+def export_pages(output_dir, species_maps, template, family, genus, colors, fmt, show_subgenus,
+                 timestamp=None, progress=None, workers=1, cancel=None, pool=None):
+    """
+    Write every page of species_maps as a separate file in output_dir.
+
+    Args:
+        progress: Optional callable(page_index, total_pages) called as each page is saved
+        workers: Number of page render processes; 1 renders in this process
+        pool: Optional RenderPool whose workers are reused
+        cancel: Optional threading.Event; once set, OperationCancelled is
+            raised after the page being saved, keeping the pages written so far
+
+    Returns:
+        list: The paths written, in page order
+    """
+    if timestamp is None:
+        timestamp = export_timestamp()
+    pages = page_count(len(species_maps))
+    paths = []
+    for page, data in iter_rendered_pages(species_maps, template, family, genus, colors, fmt, show_subgenus, workers, pool):
+        path = os.path.join(output_dir, page_filename(family, genus, timestamp, page, fmt))
+        with span("write", page=page):
+            with open(path, 'wb') as f:
+                f.write(data)
+        paths.append(path)
+        if progress is not None:
+            progress(page, pages)
+        check_cancelled(cancel)
+    return paths
+
+
+def export_all_zip(zip_path, species_maps, template, family, genus, colors, fmt, show_subgenus,
+                   timestamp=None, progress=None, compression="stored", workers=1, cancel=None, pool=None):
+    """
+    Write every page of species_maps into a ZIP archive.
+
+    Each page is added to the archive as soon as it is rendered, so only a
+    few encoded pages are held in memory at a time and the pages finished so
+    far are on disk even if the run stops early.
+
+    Args:
+        progress: Optional callable(page_index, total_pages) called as each page is saved
+        compression: One of ZIP_COMPRESSION's keys
+        workers: Number of page render processes; 1 renders in this process
+        pool: Optional RenderPool whose workers are reused
+        cancel: Optional threading.Event; once set, the partial archive is
+            deleted and OperationCancelled is raised
+
+    Returns:
+        list: The page file names written to the archive
+    """
+    if timestamp is None:
+        timestamp = export_timestamp()
+    pages = page_count(len(species_maps))
+    names = []
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=ZIP_COMPRESSION[compression]) as zf:
+            for page, data in iter_rendered_pages(species_maps, template, family, genus, colors, fmt, show_subgenus, workers, pool):
+                check_cancelled(cancel)
+                name = page_filename(family, genus, timestamp, page, fmt)
+                with span("zip_write", page=page):
+                    zf.writestr(name, data)
+                names.append(name)
+                if progress is not None:
+                    progress(page, pages)
+    except OperationCancelled:
+        os.remove(zip_path)
+        raise
+    return names
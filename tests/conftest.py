@@ -0,0 +1,52 @@
+import os
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import species_map_engine as engine
+
+
+@pytest.fixture(scope="session")
+def county_geometry(tmp_path_factory):
+    """(GeoDataFrame, CountyTemplate) of the bundled shapefile, cached in a temporary folder."""
+    return engine.load_county_geometry(cache_dir=str(tmp_path_factory.mktemp("geometry")))
+
+
+@pytest.fixture(scope="session")
+def valid_counties(county_geometry):
+    return engine.valid_county_names(county_geometry[0])
+
+
+@pytest.fixture
+def occurrences():
+    """A small occurrence table with mixed case, padding, missing years and a non-Montana county."""
+    return pd.DataFrame({
+        "county": ["Gallatin", " MISSOULA ", "Lewis & Clark", "Gallatin", "Yellowstone", "Outside County", "Park"],
+        "family": ["Apidae", "apidae ", "Apidae", "Andrenidae", "Andrenidae", "Apidae", "Apidae"],
+        "genus": ["Bombus", "Bombus", "Bombus", "Andrena", "Andrena", "Bombus", "Bombus"],
+        "subgenus": ["Pyrobombus", "Pyrobombus", None, None, None, None, "Thoracobombus"],
+        "species": ["Huntii", "huntii", "Huntii", "prunorum", "prunorum", "huntii", "fervidus"],
+        "year": [1995, 2010, None, 2001, 1980, 2005, 2020],
+    })
+
+
+def write_occurrences(df, path):
+    """Write df in the format given by the extension of path and return path."""
+    kind = engine.INPUT_FORMATS[os.path.splitext(str(path))[1].lower()]
+    if kind == "excel":
+        df.to_excel(path, index=False)
+    elif kind == "csv":
+        df.to_csv(path, index=False)
+    elif kind == "tsv":
+        df.to_csv(path, index=False, sep="\t")
+    elif kind == "parquet":
+        df.to_parquet(path, index=False)
+    elif kind == "arrow":
+        df.to_feather(path)
+    return str(path)
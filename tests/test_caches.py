@@ -0,0 +1,90 @@
+import json
+import os
+
+import pandas as pd
+from PIL import Image
+
+import species_map_engine as engine
+from conftest import write_occurrences
+
+
+def test_ingest_cache_returns_the_loaded_frame(tmp_path, occurrences, valid_counties):
+    path = write_occurrences(occurrences, tmp_path / "records.csv")
+    cache = engine.IngestCache(str(tmp_path / "ingest"))
+    loaded = engine.load_occurrences(path, valid_counties, cache=cache)
+    assert len(cache.entries()) == 1
+    cached = engine.load_occurrences(path, valid_counties, cache=cache)
+    pd.testing.assert_frame_equal(cached, loaded)
+
+
+def test_ingest_cache_key_follows_content_and_counties(tmp_path, occurrences, valid_counties):
+    path = write_occurrences(occurrences, tmp_path / "records.csv")
+    key = engine.IngestCache.key_for(path, valid_counties)
+    assert engine.IngestCache.key_for(path, set(valid_counties) - {"park"}) != key
+    occurrences.loc[0, "year"] = 1900
+    write_occurrences(occurrences, tmp_path / "records.csv")
+    assert engine.IngestCache.key_for(path, valid_counties) != key
+
+
+def test_ingest_cache_evicts_least_recently_used(tmp_path, occurrences):
+    cache = engine.IngestCache(str(tmp_path / "ingest"))
+    cache.put("a", occurrences)
+    cache.put("b", occurrences)
+    size = cache.entries()[0][1]
+    os.utime(cache._path("a"), (1, 1))
+    cache.max_bytes = size
+    cache.evict()
+    assert [os.path.basename(path) for _, _, path in cache.entries()] == ["b.parquet"]
+    assert cache.clear() == size
+    assert cache.entries() == []
+
+
+def test_thumbnail_cache_is_lru_with_a_byte_cap():
+    cache = engine.ThumbnailCache(max_bytes=2 * 10 * 10 * 3)
+    images = {key: Image.new("RGB", (10, 10)) for key in "abc"}
+    cache.put("a", images["a"])
+    cache.put("b", images["b"])
+    assert cache.get("a") is images["a"]
+    cache.put("c", images["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") is images["a"] and cache.get("c") is images["c"]
+    cache.put("big", Image.new("RGB", (100, 100)))
+    assert cache.get("big") is None
+    assert len(cache) == 2
+
+
+def test_thumbnail_cache_spills_and_reads_back(tmp_path):
+    cache = engine.ThumbnailCache(max_bytes=10 * 10 * 3, spill_dir=str(tmp_path))
+    image = Image.new("RGB", (10, 10), "red")
+    cache.put("image", image)
+    cache.put("bytes", b"x" * 100)
+    assert len(os.listdir(tmp_path)) == 1
+    assert cache.get("image").tobytes() == image.tobytes()
+    assert cache.get("bytes") == b"x" * 100
+    cache.clear()
+    assert os.listdir(tmp_path) == []
+
+
+def test_geometry_cache_round_trip_and_invalidation(tmp_path):
+    shapefile = engine.get_shapefile_path()
+    cache_dir = str(tmp_path)
+    gdf, template = engine.load_county_geometry(cache_dir=cache_dir)
+    signature = engine._shapefile_signature(shapefile)
+
+    cached = engine.read_geometry_cache(cache_dir, signature)
+    assert cached is not None
+    cached_gdf, levels = cached
+    assert list(cached_gdf["County"]) == list(gdf["County"])
+    assert len(levels) == len(engine.LOD_TOLERANCES)
+    assert cached_gdf.geometry.geom_equals_exact(gdf.geometry, tolerance=1e-9).all()
+
+    # A changed shapefile or an unreadable cache falls back to the shapefile
+    stale = [[suffix, size + 1, mtime] for suffix, size, mtime in signature]
+    assert engine.read_geometry_cache(cache_dir, stale) is None
+    meta_path = engine._geometry_cache_paths(cache_dir)[0]
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"version": engine.GEOMETRY_CACHE_VERSION, "signature": signature,
+                   "fractions": sorted(engine.LOD_TOLERANCES), "names": []}, f)
+    assert engine.read_geometry_cache(cache_dir, signature) is None
+    gdf_again, _ = engine.load_county_geometry(cache_dir=cache_dir)
+    assert list(gdf_again["County"]) == list(gdf["County"])
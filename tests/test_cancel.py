@@ -0,0 +1,105 @@
+import os
+import queue
+import threading
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Montana_Multiple_Species_Distribution_Mapper as mapper
+import species_map_engine as engine
+
+
+@pytest.fixture
+def species_maps(county_geometry):
+    counties = list(county_geometry[0]["County"])
+    records = pd.DataFrame({
+        "county": counties[:4],
+        "family": "apidae",
+        "genus": "bombus",
+        "species": ["huntii", "huntii", "fervidus", "mixtus"],
+        "subgenus": "pyrobombus",
+        "year": [1990, 2010, np.nan, 2005],
+    })
+    # Three pages of maps
+    return engine.build_species_maps(records, county_geometry[0], engine.ColorSettings())[0] * 10
+
+
+def cancel_after_first(cancel):
+    """A progress callback that cancels once the first step is reported."""
+    return lambda done, total: cancel.set()
+
+
+def test_cancelled_load_stops_between_chunks(tmp_path, occurrences, valid_counties):
+    path = tmp_path / "records.csv"
+    occurrences.to_csv(path, index=False)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(engine.OperationCancelled):
+        engine.load_occurrences(str(path), valid_counties, cancel=cancel)
+
+
+def test_cancelled_generation_stops_between_species(tmp_path, occurrences, valid_counties):
+    path = tmp_path / "records.csv"
+    occurrences.to_csv(path, index=False)
+    records = engine.load_occurrences(str(path), valid_counties)
+    matrix, _ = engine.build_species_matrix(records, sorted(valid_counties))
+    assert len(matrix.species) > 1
+    cancel = threading.Event()
+    done = []
+
+    def progress(index, total):
+        done.append(index)
+        cancel.set()
+
+    with pytest.raises(engine.OperationCancelled):
+        engine.species_maps_from_matrix(matrix, engine.ColorSettings(), progress=progress, cancel=cancel)
+    assert len(done) == 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cancelled_download_all_leaves_no_partial_zip(tmp_path, county_geometry, species_maps, workers):
+    zip_path = tmp_path / "all.zip"
+    cancel = threading.Event()
+    with pytest.raises(engine.OperationCancelled):
+        engine.export_all_zip(str(zip_path), species_maps, county_geometry[1], "Apidae", "Bombus",
+                              engine.ColorSettings(), "jpg", True, progress=cancel_after_first(cancel),
+                              workers=workers, cancel=cancel)
+    assert not zip_path.exists()
+    assert os.listdir(tmp_path) == []
+
+
+def test_cancelled_page_export_keeps_the_pages_written(tmp_path, county_geometry, species_maps):
+    cancel = threading.Event()
+    with pytest.raises(engine.OperationCancelled):
+        engine.export_pages(str(tmp_path), species_maps, county_geometry[1], "Apidae", "Bombus",
+                            engine.ColorSettings(), "jpg", True, timestamp="t",
+                            progress=cancel_after_first(cancel), cancel=cancel)
+    assert os.listdir(tmp_path) == [engine.page_filename("Apidae", "Bombus", "t", 0, "jpg")]
+
+
+def test_cancelled_task_saves_its_trace_and_calls_on_cancel(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapper, "engine", engine)
+    monkeypatch.setenv("MSDM_TRACE_DIR", str(tmp_path))
+    outcomes = []
+
+    def work(progress, cancel):
+        progress(1, 2)
+        cancel.set()
+        engine.check_cancelled(cancel)
+
+    widget = types.SimpleNamespace(stop=lambda: None, grab_release=lambda: None, destroy=lambda: None)
+    task = types.SimpleNamespace(
+        title="Download", work=work, trace=engine.Trace("Download"), cancel_event=threading.Event(),
+        updates=queue.Queue(), progress=widget, window=widget, on_trace=outcomes.append,
+        on_success=lambda result: outcomes.append("done"), on_cancel=lambda: outcomes.append("cancelled"),
+    )
+    task.report = lambda done, total: task.updates.put(("progress", (done, total)))
+    mapper.BackgroundTask.run(task)
+    updates = [task.updates.get_nowait() for _ in range(task.updates.qsize())]
+    assert updates == [("progress", (1, 2)), ("cancelled", None)]
+    assert task.trace.outcome == "cancelled"
+    assert len(os.listdir(tmp_path)) == 1
+    mapper.BackgroundTask.finish(task, *updates[-1])
+    assert outcomes == [task.trace, "cancelled"]
@@ -0,0 +1,43 @@
+import os
+import zipfile
+
+import pytest
+
+import Montana_Multiple_Species_Distribution_Mapper as mapper
+from conftest import write_occurrences
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("MSDM_CACHE_DIR", str(tmp_path / "cache"))
+
+
+def test_cli_writes_pages(tmp_path, occurrences):
+    path = write_occurrences(occurrences, tmp_path / "records.csv")
+    output = tmp_path / "out"
+    status = mapper.run_cli([path, "--output", str(output), "--format", "jpg", "--split-year", "2000", "--no-cache"])
+    assert status == 0
+    pages = os.listdir(output)
+    assert len(pages) == 1 and pages[0].startswith("All-All-") and pages[0].endswith("_page1.jpg")
+
+
+def test_cli_writes_a_zip_for_one_genus(tmp_path, occurrences):
+    path = write_occurrences(occurrences, tmp_path / "records.parquet")
+    output = tmp_path / "out"
+    status = mapper.run_cli([path, "--genus", "bombus", "--output", str(output), "--format", "svg", "--zip"])
+    assert status == 0
+    [archive] = os.listdir(output)
+    with zipfile.ZipFile(output / archive) as zf:
+        assert [name.endswith("_page1.svg") for name in zf.namelist()] == [True]
+
+
+def test_cli_reports_bad_input(tmp_path, occurrences, capsys):
+    path = write_occurrences(occurrences.drop(columns="species"), tmp_path / "records.csv")
+    assert mapper.run_cli([path, "--output", str(tmp_path / "out"), "--no-cache"]) == 1
+    assert "species" in capsys.readouterr().err
+
+
+def test_cli_rejects_invalid_colors(tmp_path, occurrences, capsys):
+    path = write_occurrences(occurrences, tmp_path / "records.csv")
+    assert mapper.run_cli([path, "--pre-year-color", "notacolor", "--output", str(tmp_path / "out")]) == 2
+    assert "notacolor" in capsys.readouterr().err
@@ -0,0 +1,305 @@
+import types
+
+import numpy as np
+import pandas as pd
+import PIL.Image
+import PIL.ImageTk
+import pytest
+
+import Montana_Multiple_Species_Distribution_Mapper as mapper
+import species_map_engine as engine
+
+
+# The GUI classes are exercised without a display: Tk objects are replaced
+# by the small stand-ins below and methods are bound to plain namespaces.
+
+class FakeRoot:
+    """Stands in for a Tk widget's after() queue; jobs run only in run_jobs()."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_job = 0
+
+    def after(self, delay, func):
+        self.next_job += 1
+        self.jobs[self.next_job] = func
+        return self.next_job
+
+    def after_idle(self, func):
+        return self.after(0, func)
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run_jobs(self):
+        while self.jobs:
+            jobs, self.jobs = self.jobs, {}
+            for func in jobs.values():
+                func()
+
+
+class Var:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class FakeWidget:
+    """Accepts the geometry-manager calls made on frames and scrollbars."""
+
+    def __init__(self, *args, **options):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeCanvas(FakeRoot):
+    """A canvas of fixed size: keeps item state and a scroll position clamped to the scroll region."""
+
+    def __init__(self, parent=None, width=1000, height=600, **options):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.top = 0
+        self.scrollregion = (0, 0, 0, 0)
+        self.yscrollcommand = None
+        self.items = {}
+
+    def grid(self, **options):
+        pass
+
+    def bind(self, sequence, func):
+        pass
+
+    def configure(self, scrollregion=None, yscrollcommand=None, **options):
+        if yscrollcommand is not None:
+            self.yscrollcommand = yscrollcommand
+        if scrollregion is not None:
+            self.scrollregion = scrollregion
+            self.yview_moveto(self.top / max(1, scrollregion[3]))
+
+    def yview(self, *args):
+        pass
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def canvasy(self, y):
+        return self.top + y
+
+    def yview_moveto(self, fraction):
+        region = self.scrollregion[3]
+        self.top = max(0, min(round(fraction * region), region - self.height))
+        if self.yscrollcommand is not None:
+            self.yscrollcommand(self.top / max(1, region), (self.top + self.height) / max(1, region))
+
+    def create_item(self, *args, **options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options)
+        return item
+
+    create_text = create_image = create_rectangle = create_item
+
+    def itemconfigure(self, item, **options):
+        self.items[item].update(options)
+
+    def coords(self, item, *xy):
+        self.items[item]["coords"] = xy
+
+    def delete(self, *items):
+        for item in items:
+            del self.items[item]
+
+
+class FakePhoto:
+    def __init__(self, mode, size):
+        self.size = size
+        self.pasted = []
+
+    def paste(self, image):
+        assert image.size == self.size
+        self.pasted.append(image)
+
+
+def bind(obj, cls, *names):
+    """Give obj the methods names of cls, as if it were an instance."""
+    for name in names:
+        setattr(obj, name, getattr(cls, name).__get__(obj))
+    return obj
+
+
+@pytest.fixture(autouse=True)
+def loaded_engine(monkeypatch):
+    monkeypatch.setattr(mapper, "engine", engine)
+
+
+@pytest.fixture
+def tasks(monkeypatch):
+    """BackgroundTasks started meanwhile; their work is run by the test."""
+    started = []
+
+    def start(parent, title, unit, work, on_success, **kwargs):
+        started.append(types.SimpleNamespace(title=title, work=work, on_success=on_success, **kwargs))
+
+    monkeypatch.setattr(mapper, "BackgroundTask", start)
+    return started
+
+
+@pytest.fixture
+def screen(county_geometry):
+    gdf, template = county_geometry
+    county_names = list(engine.standardize_county_names(gdf["County"]))
+    rng = np.random.default_rng(3)
+    n = 200
+    records = pd.DataFrame({
+        "county": rng.choice(county_names[:20], size=n),
+        "family": "apidae",
+        "genus": "bombus",
+        "species": rng.choice(["huntii", "fervidus", "mixtus", "rufocinctus"], size=n),
+        "subgenus": "pyrobombus",
+        "year": rng.uniform(1950, 2024, size=n).round(),
+    })
+    colors = engine.ColorSettings(split_year="2000")
+    matrix, _ = engine.build_species_matrix(records, county_names)
+    screen = types.SimpleNamespace(
+        root=FakeRoot(), restyle_job=None, generated_matrix=matrix,
+        generated_maps=engine.species_maps_from_matrix(matrix, colors), generated_colors=colors,
+        generated_family="apidae", generated_genus="bombus", generated_show_subgenus=True,
+        county_template=template, render_pool=None, current_page=0, maps_per_page=15,
+        export_format_var=Var("jpg"), zip_compression_var=Var("deflated"),
+        gallery=types.SimpleNamespace(refresh=lambda: None), entered_colors=colors,
+    )
+    screen.get_color_settings = lambda: screen.entered_colors
+    screen.get_render_workers = lambda: 1
+    screen.report_trace = lambda trace: None
+    return bind(screen, mapper.AnalysisScreen, "schedule_restyle", "flush_restyle", "restyle_maps",
+                "export_snapshot", "profiled", "download_current_page", "download_all_maps")
+
+
+def codes_of(species_maps):
+    return [species_map.color_codes.copy() for species_map in species_maps]
+
+
+def test_download_applies_a_pending_restyle_first(screen, tasks, monkeypatch):
+    exported = []
+    monkeypatch.setattr(engine, "export_page", lambda path, maps, page, template, fam, gen, colors, *args:
+                        exported.append((codes_of(maps), colors)))
+    screen.entered_colors = engine.ColorSettings(split_year="1960")
+    screen.schedule_restyle()
+    screen.download_current_page()
+    assert screen.restyle_job is None and screen.root.jobs == {}
+    tasks[0].work(None, None)
+    codes, colors = exported[0]
+    assert colors is screen.entered_colors
+    expected = engine.species_maps_from_matrix(screen.generated_matrix, colors)
+    assert all(np.array_equal(a, b.color_codes) for a, b in zip(codes, expected))
+
+
+def test_restyle_during_a_download_does_not_reach_it(screen, tasks, monkeypatch):
+    exported = []
+    monkeypatch.setattr(engine, "export_all_zip", lambda path, maps, template, fam, gen, colors, *args, **kwargs:
+                        exported.append((codes_of(maps), colors)))
+    before = codes_of(screen.generated_maps)
+    screen.download_all_maps()
+    screen.entered_colors = engine.ColorSettings(split_year="1960")
+    screen.schedule_restyle()
+    screen.root.run_jobs()
+    after = codes_of(screen.generated_maps)
+    assert any(not np.array_equal(a, b) for a, b in zip(before, after))
+    tasks[0].work(None, None)
+    codes, colors = exported[0]
+    assert colors.split_year == "2000"
+    assert all(np.array_equal(a, b) for a, b in zip(codes, before))
+
+
+@pytest.fixture
+def gallery_factory(monkeypatch):
+    """Build MapGalleries on FakeCanvases; their render calls are recorded in gallery.rendered."""
+    monkeypatch.setattr(mapper.tk, "Canvas", FakeCanvas)
+    monkeypatch.setattr(mapper.ttk, "Frame", FakeWidget)
+    monkeypatch.setattr(mapper.ttk, "Scrollbar", FakeWidget)
+    monkeypatch.setattr(PIL.ImageTk, "PhotoImage", FakePhoto)
+
+    def make(count, **options):
+        rendered = []
+
+        def render(indices, size):
+            rendered.append(list(indices))
+            return [PIL.Image.new("RGB", size, (index % 256, 0, 0)) for index in indices]
+
+        gallery = mapper.MapGallery(None, render, **options)
+        gallery.rendered = rendered
+        gallery.set_count(count)
+        gallery.canvas.run_jobs()
+        return gallery
+
+    return make
+
+
+def shown(gallery):
+    """Map index -> photo of every slot in use."""
+    return {slot[3]: slot[2] for slot in gallery.slots if slot[3] is not None}
+
+
+def test_gallery_keeps_slots_to_the_rows_near_the_view(gallery_factory):
+    gallery = gallery_factory(3000)
+    cell_height = gallery.cell[1]
+    visible_rows = gallery.canvas.height // cell_height + 1
+    assert sorted(shown(gallery)) == list(range((visible_rows + gallery.OVERSCAN_ROWS) * gallery.COLS))
+    slot_count = len(gallery.slots)
+    for index in (1500, 2997, 30, 1200):
+        gallery.scroll_to(index)
+        gallery.canvas.run_jobs()
+        first_row = index // gallery.COLS
+        assert min(shown(gallery)) == (first_row - gallery.OVERSCAN_ROWS) * gallery.COLS
+        assert len(gallery.slots) <= slot_count + gallery.COLS
+    # Only the maps around each view were rendered, never the ones scrolled past
+    assert len(sum(gallery.rendered, [])) <= 5 * len(gallery.slots)
+
+
+def test_next_reaches_the_last_page(gallery_factory):
+    buttons = {name: types.SimpleNamespace(state=None) for name in ("prev", "next")}
+    for button in buttons.values():
+        button.config = lambda state, button=button: setattr(button, "state", state)
+    screen = types.SimpleNamespace(generated_maps=[None] * 50, maps_per_page=15, current_page=0,
+                                   prev_button=buttons["prev"], next_button=buttons["next"],
+                                   page_info=types.SimpleNamespace(config=lambda text: None))
+    bind(screen, mapper.AnalysisScreen, "on_gallery_scroll", "show_next_page", "show_prev_page")
+    screen.gallery = gallery_factory(50, on_view_change=screen.on_gallery_scroll)
+    pages = [screen.current_page]
+    for _ in range(4):
+        if buttons["next"].state != "normal":
+            break
+        screen.show_next_page()
+        screen.gallery.canvas.run_jobs()
+        pages.append(screen.current_page)
+    assert pages == [0, 1, 2, 3] and buttons["next"].state == "disabled"
+    assert buttons["prev"].state == "normal"
+    screen.show_prev_page()
+    screen.gallery.canvas.run_jobs()
+    assert screen.current_page == 2
+
+
+@pytest.mark.parametrize("redraw", [True, False])
+def test_resize_shows_rescaled_previews_at_once(gallery_factory, redraw):
+    gallery = gallery_factory(12, redraw_on_resize=redraw)
+    before = {index: photo.pasted[-1] for index, photo in shown(gallery).items()}
+    gallery.rendered.clear()
+    gallery.canvas.width = 1300
+    gallery.relayout()
+    gallery.canvas.run_jobs()
+    new_size = gallery.size_for_width(1300)
+    for index, photo in shown(gallery).items():
+        assert photo.size == new_size
+        # The first image in a new slot is the old preview scaled, not the blank placeholder
+        assert photo.pasted[0].getpixel((0, 0)) == before[index].getpixel((0, 0))
+    if redraw:
+        assert sorted(sum(gallery.rendered, [])) == sorted(shown(gallery))
+    else:
+        assert gallery.rendered == []
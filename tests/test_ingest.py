@@ -0,0 +1,147 @@
+import re
+import zipfile
+
+import pandas as pd
+import pytest
+
+import species_map_engine as engine
+from conftest import write_occurrences
+
+
+FORMATS = [".xlsx", ".csv", ".tsv", ".parquet", ".feather"]
+
+
+@pytest.mark.parametrize("suffix", FORMATS)
+def test_load_occurrences_normalizes_every_format(tmp_path, occurrences, valid_counties, suffix):
+    path = write_occurrences(occurrences, tmp_path / f"records{suffix}")
+    df = engine.load_occurrences(path, valid_counties)
+
+    # The non-Montana record is dropped, everything else is kept in file order
+    assert list(df.index) == [0, 1, 2, 3, 4, 6]
+    assert list(df["county"]) == ["gallatin", "missoula", "lewis and clark", "gallatin", "yellowstone", "park"]
+    assert list(df["family"]) == ["apidae", "apidae", "apidae", "andrenidae", "andrenidae", "apidae"]
+    assert list(df["species"]) == ["huntii", "huntii", "huntii", "prunorum", "prunorum", "fervidus"]
+    assert df["year"].isna().tolist() == [False, False, True, False, False, False]
+    for col in engine.TAXONOMY_COLUMNS:
+        assert isinstance(df[col].dtype, pd.CategoricalDtype)
+
+
+def test_load_occurrences_reads_workbooks_in_one_pass(tmp_path, occurrences, valid_counties):
+    path = write_occurrences(occurrences, tmp_path / "records.xlsx")
+    streamed = engine.load_occurrences(path, valid_counties)
+    whole = engine.load_occurrences(path, valid_counties, streaming=False)
+    pd.testing.assert_frame_equal(whole, streamed, check_dtype=False, check_categorical=False)
+
+
+@pytest.mark.parametrize("suffix", FORMATS)
+def test_load_occurrences_reads_only_ingest_columns(tmp_path, occurrences, valid_counties, suffix):
+    occurrences["notes"] = "collected by net"
+    path = write_occurrences(occurrences, tmp_path / f"records{suffix}")
+    df = engine.load_occurrences(path, valid_counties)
+    assert "notes" not in df.columns
+
+
+def test_load_occurrences_without_year_column(tmp_path, occurrences, valid_counties):
+    path = write_occurrences(occurrences.drop(columns="year"), tmp_path / "records.csv")
+    df = engine.load_occurrences(path, valid_counties)
+    assert df["year"].isna().all()
+
+
+@pytest.mark.parametrize("suffix", FORMATS)
+def test_load_occurrences_reports_missing_columns(tmp_path, occurrences, valid_counties, suffix):
+    path = write_occurrences(occurrences.drop(columns="genus"), tmp_path / f"records{suffix}")
+    with pytest.raises(engine.DataValidationError, match="genus"):
+        engine.load_occurrences(path, valid_counties)
+
+
+def test_load_occurrences_rejects_files_without_montana_records(tmp_path, occurrences, valid_counties):
+    occurrences["county"] = "Outside County"
+    path = write_occurrences(occurrences, tmp_path / "records.csv")
+    with pytest.raises(engine.DataValidationError, match="No valid Montana county records"):
+        engine.load_occurrences(path, valid_counties)
+
+
+def test_load_occurrences_rejects_unsupported_file_types(tmp_path, valid_counties):
+    path = tmp_path / "records.txt"
+    path.write_text("county,family,genus,species\n")
+    with pytest.raises(engine.DataValidationError, match="Unsupported file type"):
+        engine.load_occurrences(str(path), valid_counties)
+
+
+def test_load_occurrences_streams_workbooks_in_chunks(tmp_path, occurrences, valid_counties, monkeypatch):
+    monkeypatch.setattr(engine, "INGEST_CHUNK_ROWS", 2)
+    path = write_occurrences(occurrences, tmp_path / "records.xlsx")
+    calls = []
+    chunks = list(engine._iter_workbook_chunks(path, chunk_rows=2, progress=lambda read, total: calls.append(read)))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2, 1]
+    assert calls == [2, 4, 6, 7]
+    assert list(pd.concat(chunks).index) == list(range(7))
+
+
+def test_load_occurrences_ignores_a_stale_sheet_dimension(tmp_path, occurrences, valid_counties):
+    path = write_occurrences(occurrences, tmp_path / "written.xlsx")
+    stale = tmp_path / "records.xlsx"
+    # Record the sheet as A1:D3, leaving out most rows and the year column
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(stale, "w") as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data, count = re.subn(rb'<dimension ref="[^"]*"', b'<dimension ref="A1:D3"', data)
+                assert count == 1
+            dst.writestr(item, data)
+    calls = []
+    df = engine.load_occurrences(str(stale), valid_counties, progress=lambda read, total: calls.append((read, total)))
+    expected = engine.load_occurrences(str(stale), valid_counties, streaming=False)
+    pd.testing.assert_frame_equal(df, expected)
+    assert len(df) == 6 and df["year"].notna().sum() == 5
+    assert calls[-1] == (7, 7)
+
+
+def test_normalize_keeps_blank_taxonomy_missing():
+    df = pd.DataFrame({
+        "county": ["Gallatin", "Park", "Park"],
+        "family": pd.Series(["Apidae", None, "Apidae"], dtype=object),
+        "genus": pd.Series([None, "Bombus", float("nan")], dtype=object),
+        "species": pd.Series(["Huntii ", None, "fervidus"], dtype=object),
+    })
+    df = engine._normalize_occurrences(df)
+    assert df["family"].isna().tolist() == [False, True, False]
+    assert df["genus"].isna().tolist() == [True, False, True]
+    assert df["species"].tolist()[0] == "huntii" and pd.isna(df["species"].tolist()[1])
+    for col in engine.TAXONOMY_COLUMNS:
+        assert "none" not in set(df[col].dropna()) and "nan" not in set(df[col].dropna())
+
+
+def test_blank_taxonomy_cells_never_become_names(tmp_path, occurrences, valid_counties):
+    occurrences["family"] = occurrences["family"].astype(object)
+    occurrences.loc[0, "family"] = None
+    occurrences.loc[1, "genus"] = None
+    occurrences.loc[2, "species"] = None
+    path = write_occurrences(occurrences, tmp_path / "records.xlsx")
+    taxonomy = engine.TaxonomyIndex(engine.load_occurrences(path, valid_counties))
+    assert taxonomy.families() == ["andrenidae", "apidae"]
+    assert taxonomy.genera("apidae") == ["bombus"]
+    assert taxonomy.species("All", "All") == ["fervidus", "prunorum"]
+    assert taxonomy.species("apidae", "Not Specified") == ["huntii"]
+    assert list(taxonomy.rows("Not Specified", "All")) == [0]
+
+
+@pytest.mark.parametrize("suffix,pyarrow", [(suffix, True) for suffix in FORMATS] + [(".csv", False)])
+def test_blank_cells_round_trip_through_every_reader_and_the_cache(tmp_path, occurrences, valid_counties,
+                                                                     monkeypatch, suffix, pyarrow):
+    if not pyarrow:
+        monkeypatch.setattr(engine, "_has_pyarrow", lambda: False)
+    for col in engine.TAXONOMY_COLUMNS:
+        occurrences[col] = occurrences[col].astype(object)
+    occurrences.loc[0, "family"] = None
+    occurrences.loc[3, "genus"] = None
+    occurrences.loc[4, "species"] = None
+    path = write_occurrences(occurrences, tmp_path / f"records{suffix}")
+    cache = engine.IngestCache(str(tmp_path / "ingest"))
+    loaded = engine.load_occurrences(path, valid_counties, cache=cache)
+    if pyarrow:
+        cached = engine.load_occurrences(path, valid_counties, cache=cache)
+        pd.testing.assert_frame_equal(cached, loaded)
+    for col, row in (("family", 0), ("genus", 3), ("species", 4)):
+        assert pd.isna(loaded.loc[row, col])
+        assert set(loaded[col].cat.categories).isdisjoint({"none", "nan", ""})
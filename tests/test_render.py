@@ -0,0 +1,193 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import species_map_engine as engine
+
+
+@pytest.fixture
+def species_maps(county_geometry):
+    counties = list(county_geometry[0]["County"])
+    records = pd.DataFrame({
+        "county": counties[:4],
+        "family": "apidae",
+        "genus": "bombus",
+        "species": ["huntii", "huntii", "fervidus", "mixtus"],
+        "subgenus": "pyrobombus",
+        "year": [1990, 2010, np.nan, 2005],
+    })
+    return engine.build_species_maps(records, county_geometry[0], engine.ColorSettings(split_year="2000"))[0]
+
+
+def test_render_pool_is_reused_across_calls(county_geometry, species_maps):
+    template = county_geometry[1]
+    colors = engine.ColorSettings(split_year="2000")
+    size = (160, 120)
+    expected = engine.render_species_images(species_maps, template, "Apidae", "Bombus", colors, True, size)
+    pool = engine.RenderPool(template)
+    try:
+        first = engine.render_species_images(species_maps, template, "Apidae", "Bombus", colors, True, size,
+                                             workers=2, pool=pool)
+        executor = pool.executor(2)
+        again = engine.render_species_images(species_maps, template, "Apidae", "Bombus", colors, True, size,
+                                             workers=2, pool=pool)
+        assert pool.executor(2) is executor
+        assert pool.executor(3) is not executor and pool.workers == 3
+    finally:
+        pool.shutdown()
+    for images in (first, again):
+        assert [image.tobytes() for image in images] == [image.tobytes() for image in expected]
+
+
+def test_pages_render_in_a_kept_pool(tmp_path, county_geometry, species_maps):
+    template = county_geometry[1]
+    colors = engine.ColorSettings()
+    many = species_maps * 6
+    pool = engine.RenderPool(template)
+    try:
+        names = engine.export_all_zip(str(tmp_path / "all.zip"), many, template, "Apidae", "Bombus", colors,
+                                      "jpg", True, timestamp="t", workers=2, pool=pool)
+    finally:
+        pool.shutdown()
+    assert names == [engine.page_filename("Apidae", "Bombus", "t", page, "jpg") for page in range(2)]
+
+
+def test_caption_length_does_not_shrink_export_maps(county_geometry, species_maps):
+    template = county_geometry[1]
+    colors = engine.ColorSettings()
+
+    def map_widths(subgenus):
+        for species_map in species_maps:
+            species_map.subgenus = subgenus
+        with engine.mpl.rc_context(engine.EXPORT_RC):
+            fig = engine.compose_page(species_maps, 0, template, "Apidae", "Bombus", colors, "jpg", True)
+        widths = [ax.get_position().width for ax in fig.axes[:len(species_maps)]]
+        return widths
+
+    assert map_widths("Subterraneobombus") == pytest.approx(map_widths(""))
+
+
+def test_exports_wait_for_other_threads_rendering(tmp_path, county_geometry, species_maps):
+    path = tmp_path / "page.svg"
+    export = threading.Thread(target=engine.export_page, args=(
+        str(path), species_maps, 0, county_geometry[1], "Apidae", "Bombus", engine.ColorSettings(), "svg", True))
+    with engine._mpl_lock:
+        export.start()
+        export.join(0.3)
+        assert export.is_alive() and not path.exists()
+    export.join()
+    assert path.exists()
+
+
+def test_previews_during_an_export_keep_their_fonts(tmp_path, county_geometry, species_maps):
+    template = county_geometry[1]
+    colors = engine.ColorSettings(split_year="2000")
+    rc = {key: engine.mpl.rcParams[key] for key in ("font.family", "text.hinting", "svg.fonttype")}
+
+    def previews():
+        return [(engine.render_species_image(m, template, "Apidae", "Bombus", colors, i, True, (240, 180)).tobytes(),
+                 engine.render_species_thumbnail(m, template, "Apidae", "Bombus", colors, i, True, (240, 180)).tobytes())
+                for i, m in enumerate(species_maps)]
+
+    expected = previews()
+    done = threading.Event()
+
+    def export():
+        for page in range(3):
+            engine.export_page(str(tmp_path / f"page{page}.svg"), species_maps, page, template, "Apidae", "Bombus",
+                               colors, "svg", True)
+        done.set()
+
+    exporter = threading.Thread(target=export)
+    exporter.start()
+    while not done.is_set():
+        assert previews() == expected
+    exporter.join()
+    assert {key: engine.mpl.rcParams[key] for key in rc} == rc
+
+
+def test_coarser_levels_keep_fewer_vertices_and_shared_borders(county_geometry):
+    import shapely
+
+    gdf, template = county_geometry
+    counts = template.vertex_counts()
+    assert len(counts) == len(engine.LOD_TOLERANCES)
+    assert all(finer > coarser for finer, coarser in zip(counts, counts[1:]))
+    state = shapely.union_all(gdf.geometry.values).area
+    for tolerance, geoms in engine.simplify_levels(gdf):
+        # Simplified as one coverage: neighbours neither overlap nor pull apart
+        union = shapely.union_all(geoms).area
+        assert shapely.area(geoms).sum() - union < 1e-5 * state
+        assert abs(union - state) < 1e-4 * state
+
+
+def test_level_of_detail_follows_output_resolution(county_geometry):
+    template = county_geometry[1]
+    fig = engine.new_figure(engine.SPECIES_FIGSIZE)
+    ax = fig.add_axes([0.1, 0.2, 0.8, 0.6])
+    (minx, miny), (maxx, maxy) = template.corners
+    assert template.level_for(ax, None) == 0
+    assert template.level_for(ax, 100000) == 0
+    assert template.level_for(ax, 5) == len(template.levels) - 1
+    chosen = [template.level_for(ax, dpi) for dpi in (10, 50, 100, 300, 1000)]
+    assert chosen == sorted(chosen, reverse=True)
+    for dpi, level in zip((10, 50, 100, 300, 1000), chosen):
+        pixel = max((maxx - minx) / (0.8 * fig.get_figwidth() * dpi),
+                    (maxy - miny) / (0.6 * fig.get_figheight() * dpi))
+        # The coarsest level whose error stays under half a pixel
+        assert template.levels[level][0] <= engine.LOD_MAX_PIXEL_ERROR * pixel
+        if level + 1 < len(template.levels):
+            assert template.levels[level + 1][0] > engine.LOD_MAX_PIXEL_ERROR * pixel
+
+
+def test_label_raster_paints_each_county_its_color(county_geometry):
+    template = county_geometry[1]
+    raster = engine.LabelRaster(template, (400, 300))
+    counties = len(template.paths)
+    assert raster.labels.shape == (300, 400)
+    # Every county has pixels, even the smallest, and nothing is drawn below the map
+    assert set(np.unique(raster.labels)) == set(range(counties + 1))
+    assert not raster.labels[raster.map_bottom:].any()
+    county_rgb = np.random.default_rng(0).integers(0, 256, size=(counties, 3), dtype=np.uint8)
+    painted = np.asarray(raster.paint(county_rgb))
+    expected = np.vstack([[255, 255, 255], county_rgb])[raster.labels]
+    lines = np.asarray(raster._line_mask)
+    assert (lines == 0).mean() > 0.8
+    assert np.array_equal(painted[lines == 0], expected[lines == 0])
+    # Boundaries are drawn over the fills in black
+    assert (lines == 255).any() and not painted[lines == 255].any()
+
+
+def test_thumbnail_matches_its_label_raster(county_geometry, species_maps):
+    template = county_geometry[1]
+    colors = engine.ColorSettings(split_year="2000")
+    size = (320, 240)
+    image = engine.render_species_thumbnail(species_maps[0], template, "Apidae", "Bombus", colors, 0, True, size)
+    assert image.size == size and image.mode == "RGB"
+    raster = template.label_raster(size)
+    fills = engine.preview_palette(colors)[species_maps[0].color_codes]
+    map_top = int(size[1] * raster.MAP_BOX[1])
+    pixels = np.asarray(image)
+    assert np.array_equal(pixels[map_top:raster.map_bottom], np.asarray(raster.paint(fills))[map_top:raster.map_bottom])
+    # The title and caption are drawn above and below the map
+    assert (pixels[:map_top] < 128).any()
+    assert (pixels[raster.map_bottom:] < 128).any()
+
+def test_label_rasters_are_cached_per_size(county_geometry, monkeypatch):
+    import pickle
+
+    monkeypatch.setattr(engine, "LABEL_RASTER_SIZES", 2)
+    template = engine.CountyTemplate(county_geometry[0])
+    first = template.label_raster((120, 90))
+    assert template.label_raster([120, 90]) is first
+    template.label_raster((160, 120))
+    assert template.label_raster((120, 90)) is first
+    # The least recently used size is dropped once more are kept than allowed
+    template.label_raster((200, 150))
+    assert list(template._label_rasters) == [(120, 90), (200, 150)]
+    assert template.label_raster((160, 120)) is not None and (120, 90) not in template._label_rasters
+    # Render workers receive the template without them
+    copy = pickle.loads(pickle.dumps(template))
+    assert len(copy._label_rasters) == 0 and len(template._label_rasters) == 2
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import species_map_engine as engine
+
+
+def baseline_county_color(county_records, colors):
+    """The per-county rule of the original GUI loop: any pre-year record wins, then post-year, else single."""
+    split_year_str = str(colors.split_year or "").strip()
+    if not split_year_str:
+        return colors.single_color
+    try:
+        split_year = int(split_year_str)
+    except ValueError:
+        return colors.single_color
+    has_pre = has_post = False
+    for record_year in county_records["year"]:
+        if record_year is None or pd.isna(record_year):
+            continue
+        if int(record_year) > split_year:
+            has_post = True
+        else:
+            has_pre = True
+    if has_pre:
+        return colors.pre_year_color
+    if has_post:
+        return colors.post_year_color
+    return colors.single_color
+
+
+@pytest.fixture
+def records(county_geometry):
+    rng = np.random.default_rng(7)
+    counties = list(county_geometry[0]["County"])
+    n = 400
+    years = rng.uniform(1950, 2024, size=n)
+    years[rng.random(n) < 0.3] = np.nan
+    return pd.DataFrame({
+        "county": rng.choice(counties[:12], size=n),
+        "family": "apidae",
+        "genus": "bombus",
+        "species": rng.choice(["huntii", "fervidus", "mixtus", "rufocinctus", "sylvicola"], size=n),
+        "subgenus": "pyrobombus",
+        "year": years,
+    })
+
+
+@pytest.mark.parametrize("split_year", [None, "", "2000", "1990", "not a year"])
+def test_colors_match_the_baseline_rule(county_geometry, records, split_year):
+    gdf = county_geometry[0]
+    colors = engine.ColorSettings(split_year=split_year)
+    species_maps, unmatched = engine.build_species_maps(records, gdf, colors)
+    assert unmatched == set()
+    assert [m.species for m in species_maps] == sorted(records["species"].unique())
+    county_names = list(engine.standardize_county_names(gdf["County"]))
+    for species_map in species_maps:
+        species_records = records[records["species"] == species_map.species]
+        expected = ["white"] * len(county_names)
+        for county, county_records in species_records.groupby("county"):
+            expected[county_names.index(county)] = baseline_county_color(county_records, colors)
+        assert colors.code_colors(species_map.color_codes) == expected
+        assert species_map.num_specimens == len(species_records)
+        assert species_map.num_counties == species_records["county"].nunique()
+
+
+# Names outside the county list must not trip pandas' Categorical deprecation
+@pytest.mark.filterwarnings("error")
+def test_unmatched_counties_are_reported(county_geometry, records):
+    records.loc[0, "county"] = "atlantis"
+    _, unmatched = engine.build_species_maps(records, county_geometry[0], engine.ColorSettings())
+    assert unmatched == {"atlantis"}
+
+
+def test_restyle_updates_only_changed_maps(county_geometry, records):
+    county_names = list(engine.standardize_county_names(county_geometry[0]["County"]))
+    matrix, _ = engine.build_species_matrix(records, county_names)
+    species_maps = engine.species_maps_from_matrix(matrix, engine.ColorSettings(split_year="2000"))
+    assert engine.restyle_species_maps(species_maps, matrix, engine.ColorSettings(split_year="2000")) == 0
+    changed = engine.restyle_species_maps(species_maps, matrix, engine.ColorSettings(split_year="1960"))
+    assert changed > 0
+    fresh = engine.species_maps_from_matrix(matrix, engine.ColorSettings(split_year="1960"))
+    for restyled, expected in zip(species_maps, fresh):
+        assert np.array_equal(restyled.color_codes, expected.color_codes)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import species_map_engine as engine
+
+
+@pytest.fixture
+def records():
+    df = pd.DataFrame({
+        "county": ["gallatin", "missoula", "park", "gallatin", "park", "carbon", "teton"],
+        "family": ["apidae", "andrenidae", "apidae", "apidae", "andrenidae", "apidae", None],
+        "genus": ["bombus", "andrena", "bombus", "apis", "andrena", None, "bombus"],
+        "species": ["huntii", "prunorum", "fervidus", "mellifera", "prunorum", "sp", "huntii"],
+        "year": [2001, 1999, 2010, 2015, 2003, np.nan, 2000],
+    })
+    return df.astype({col: "category" for col in engine.TAXONOMY_COLUMNS})
+
+
+def test_lists_follow_the_dropdowns(records):
+    index = engine.TaxonomyIndex(records)
+    assert index.families() == ["andrenidae", "apidae"]
+    assert index.genera("Apidae") == ["apis", "bombus"]
+    assert index.species("apidae", "bombus") == ["fervidus", "huntii"]
+    assert index.species("All", "All") == ["fervidus", "huntii", "mellifera", "prunorum"]
+
+
+def test_not_specified_selects_records_without_a_value(records):
+    index = engine.TaxonomyIndex(records)
+    assert index.species("apidae", "Not Specified") == ["sp"]
+    assert list(index.rows("Not Specified", "All")) == [6]
+
+
+def test_filter_keeps_file_order(records):
+    index = engine.TaxonomyIndex(records)
+    filtered = index.filter("Apidae", "All")
+    assert list(filtered.index) == [0, 2, 3]
+    assert list(index.filter("All", "All").index) == [0, 1, 2, 3, 4]
+
+
+def test_unknown_names_select_nothing(records):
+    index = engine.TaxonomyIndex(records)
+    assert len(index.filter("Vespidae", "All")) == 0
+    assert index.genera("Vespidae") == []
@@ -0,0 +1,96 @@
+import json
+import os
+import pstats
+import time
+import types
+
+import pytest
+
+import Montana_Multiple_Species_Distribution_Mapper as mapper
+import species_map_engine as engine
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_trace_records_nested_spans(tmp_path):
+    with engine.Trace("Generate maps", species=2) as trace:
+        with engine.span("figure"):
+            with engine.span("paint"):
+                time.sleep(0.01)
+    assert trace.outcome == "ok"
+    assert [(record["name"], record["depth"]) for record in trace.spans] == [("figure", 0), ("paint", 1)]
+    assert trace.seconds >= trace.spans[0]["seconds"] >= trace.spans[1]["seconds"] > 0
+    path = trace.save(str(tmp_path))
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["operation"] == "Generate maps" and saved["meta"] == {"species": 2}
+
+
+def test_trace_adds_up_entries():
+    trace = engine.Trace("Show maps")
+    for _ in range(3):
+        with trace:
+            with engine.span("paint"):
+                time.sleep(0.01)
+        time.sleep(0.02)
+    assert trace.stage_totals()[0][:2] == ("paint", 3)
+    assert trace.spans[2]["start"] > trace.spans[1]["start"] > trace.spans[0]["start"]
+    # Time between entries is not counted
+    assert 0.03 <= trace.seconds < trace.spans[2]["start"]
+
+
+
+def test_profiler_saves_pstats_and_collapsed_stacks(tmp_path):
+    with engine.Profiler("Generate maps", str(tmp_path / "profiles"), interval=0.002) as profiler:
+        spin(0.1)
+    paths = profiler.save()
+    assert [os.path.basename(path) for path in paths] == [
+        f"profile-generate-maps-{profiler.started_at:%Y%m%d-%H%M%S}.pstats",
+        f"profile-generate-maps-{profiler.started_at:%Y%m%d-%H%M%S}-stacks.txt",
+    ]
+    stats = pstats.Stats(paths[0])
+    assert any(name == "spin" for _, _, name in stats.stats)
+    with open(paths[1], encoding="utf-8") as f:
+        lines = [line.rsplit(" ", 1) for line in f.read().splitlines()]
+    assert sum(int(count) for _, count in lines) == sum(profiler.stacks.values()) > 10
+    # Root first, leaf last
+    assert lines[0][0].split(";")[-1].startswith("spin (test_trace.py:")
+
+
+def test_profiler_save_reports_an_unwritable_folder(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    with engine.Profiler("Export", str(blocker)) as profiler:
+        pass
+    assert profiler.save() == []
+
+
+@pytest.mark.parametrize("setting, enabled", [("", False), ("0", False), ("no", False), ("1", True), ("yes", True)])
+def test_profiling_is_switched_by_the_environment(monkeypatch, setting, enabled):
+    monkeypatch.setenv("MSDM_PROFILE", setting)
+    assert engine.profiling_enabled() is enabled
+
+
+def test_profiled_work_records_its_files_in_the_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapper, "engine", engine)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    screen = types.SimpleNamespace()
+    profiled = mapper.AnalysisScreen.profiled.__get__(screen)
+    trace = engine.Trace("Download")
+
+    def work(progress, cancel):
+        spin(0.01)
+        raise engine.OperationCancelled()
+
+    monkeypatch.delenv("MSDM_PROFILE", raising=False)
+    assert profiled("Download", work, trace) is work
+    monkeypatch.setenv("MSDM_PROFILE", "1")
+    with pytest.raises(engine.OperationCancelled):
+        profiled("Download", work, trace)(None, None)
+    # Saved even when the work does not finish
+    assert len(trace.meta["profile"]) == 2
+    assert all(os.path.dirname(path) == str(tmp_path / "Downloads") for path in trace.meta["profile"])